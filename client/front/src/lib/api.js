@@ -32,13 +32,17 @@ export async function infer(formData) {
   
   // Return the standardized format your App expects
   return {
-    class_id: data.class_id,
+    class_id: data.class_id, // null when the photo wasn't recognised (unknown)
+    label: data.label,
+    unknown: data.unknown ?? null, // true: not recognised; null: not checked (fallback tier), so no diagnosis
     confidence: data.confidence,
     captured_at: data.captured_at || new Date().toISOString(), // Fallback if missing
     crop_type: data.crop_type,
     crop_stage: data.crop_stage,
     lat: data.lat,
-    lon: data.lon
+    lon: data.lon,
+    scan_id: data.scan_id ?? null, // pass back to saveHistory() to link History to the scan embedding
+    gradcam_url: data.gradcam_url // only when the form had explain=true
   };
 }
 
@@ -125,13 +125,17 @@ async function infer(formData) {
   const data = await res.json();
   
   return {
-    class_id: data.class_id,
+    class_id: data.class_id, // null when the photo wasn't recognised
+    label: data.label,
+    // true: not a leaf the model knows; null: the server couldn't check (busy, fallback model)
+    unknown: data.unknown ?? null,
     confidence: data.confidence,
     captured_at: data.captured_at || new Date().toISOString(),
     crop_type: data.crop_type,
     crop_stage: data.crop_stage,
     lat: data.lat,
     lon: data.lon,
+    scan_id: data.scan_id ?? null, // links the saved History row to the scan's embedding
     visualization: data.visualization || null 
   };
 }
@@ -305,23 +309,39 @@ async function fetchGeminiSolution(crop, disease) {
   }
 }
 
-const CLASS_NAMES = [
-  "Pepper bell Bacterial_spot",
-  "Pepper bell healthy",
-  "Potato Early blight",
-  "Potato healthy",
-  "Potato Late blight",
-  "Tomato Target Spot",
-  "Tomato Tomato mosaic virus",
-  "Tomato Tomato YellowLeaf Curl Virus",
-  "Tomato Bacterial spot",
-  "Tomato Early blight",
-  "Tomato healthy",
-  "Tomato Late blight",
-  "Tomato Leaf Mold",
-  "Tomato Septoria leaf spot",
-  "Tomato Spider mites Two spotted spider mite",
-];
+// Display names keyed by the model's class label (the server's `label`).
+// These are the disease strings History has always stored, so keep them stable.
+const DISEASE_NAMES = {
+  Pepper__bell___Bacterial_spot: "Pepper bell Bacterial_spot",
+  Pepper__bell___healthy: "Pepper bell healthy",
+  Potato___Early_blight: "Potato Early blight",
+  Potato___Late_blight: "Potato Late blight",
+  Potato___healthy: "Potato healthy",
+  Tomato_Bacterial_spot: "Tomato Bacterial spot",
+  Tomato_Early_blight: "Tomato Early blight",
+  Tomato_Late_blight: "Tomato Late blight",
+  Tomato_Leaf_Mold: "Tomato Leaf Mold",
+  Tomato_Septoria_leaf_spot: "Tomato Septoria leaf spot",
+  Tomato_Spider_mites_Two_spotted_spider_mite: "Tomato Spider mites Two spotted spider mite",
+  Tomato__Target_Spot: "Tomato Target Spot",
+  Tomato__Tomato_YellowLeaf__Curl_Virus: "Tomato Tomato YellowLeaf Curl Virus",
+  Tomato__Tomato_mosaic_virus: "Tomato Tomato mosaic virus",
+  Tomato_healthy: "Tomato healthy",
+};
+
+const NOT_RECOGNISED = "Not recognised — try a closer photo of a single pepper, potato or tomato leaf.";
+const NOT_VERIFIED = "Couldn't verify this photo while the server is busy — please scan it again in a moment.";
+
+// null unless the server checked the photo and recognised it (unknown === false)
+function diseaseName(result) {
+  if (!result || result.unknown !== false || !result.label) return null;
+  return DISEASE_NAMES[result.label] || result.label.replace(/_+/g, " ");
+}
+
+// Why a result has no diagnosis
+function noDiagnosisReason(result) {
+  return result && result.unknown === null ? NOT_VERIFIED : NOT_RECOGNISED;
+}
 
 const cropTypes = [
   { value: "pepper", label: "Pepper" },
@@ -469,38 +489,49 @@ function HealthCheckContent() {
   async function handleGetCure() {
     if (!inferMut.data) return;
     
-    const diseaseName = CLASS_NAMES[inferMut.data.class_id] || "Unknown Disease";
+    const disease = diseaseName(inferMut.data);
+    if (!disease) {
+      setSolution(noDiagnosisReason(inferMut.data));
+      return;
+    }
 
-    if (lastFetched.current.disease === diseaseName && lastFetched.current.crop === cropType && solution) {
+    if (lastFetched.current.disease === disease && lastFetched.current.crop === cropType && solution) {
         return; 
     }
 
     setLoadingSolution(true);
-    const text = await fetchGeminiSolution(cropType, diseaseName);
+    const text = await fetchGeminiSolution(cropType, disease);
     setSolution(text);
     setLoadingSolution(false);
     
-    lastFetched.current = { disease: diseaseName, crop: cropType };
+    lastFetched.current = { disease, crop: cropType };
   }
 
   async function handleSaveAndPdf() {
     if (!inferMut.data) return;
+
+    const disease = diseaseName(inferMut.data);
+    if (!disease) {
+      // An unrecognised or unverified photo has no diagnosis to record
+      alert(noDiagnosisReason(inferMut.data));
+      return;
+    }
+
     setIsSaving(true);
 
     try {
-      const diseaseName = CLASS_NAMES[inferMut.data.class_id] || "Unknown";
-
       if (user && user.AcNo) {
         try {
             await saveHistory({
             account_acno: user.AcNo,
             crop_type: cropType,
-            disease: diseaseName,
+            disease,
             temperature: weather?.temp_c || null,
             humidity: weather?.humidity || null,
             location: locationName, 
             lat: loc?.lat,
-            lon: loc?.lon
+            lon: loc?.lon,
+            scan_id: inferMut.data.scan_id
             });
             console.log("✅ History saved.");
         } catch(dbError) {
@@ -533,7 +564,7 @@ function HealthCheckContent() {
           doc.text(`Stage: ${cropStage}`, 20, 70);
           doc.setFontSize(14);
           doc.setTextColor(220, 53, 69); 
-          doc.text(`Identified Issue: ${diseaseName}`, 20, 85);
+          doc.text(`Identified Issue: ${disease}`, 20, 85);
           doc.setFontSize(12);
           doc.setTextColor(0);
           doc.text(`Confidence: ${Math.round((inferMut.data.confidence || 0) * 100)}%`, 20, 95);
@@ -676,7 +707,7 @@ function HealthCheckContent() {
                   <div className="bg-white p-4 rounded border shadow-sm animate-in fade-in">
                     <div className="text-sm text-gray-500 uppercase tracking-wide font-semibold">Detected Disease</div>
                     <div className="text-xl font-bold text-gray-900 mt-1">
-                      {CLASS_NAMES[inferMut.data.class_id] || "Unknown"}
+                      {diseaseName(inferMut.data) || noDiagnosisReason(inferMut.data)}
                     </div>
                     <div className="text-sm text-gray-600 mt-2">
                       Confidence: <span className="font-mono bg-gray-100 px-1 rounded">{Math.round((inferMut.data.confidence || 0) * 100)}%</span>
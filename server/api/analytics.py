@@ -0,0 +1,196 @@
+"""
+Offline analytics over History.
+
+`export_new_rows` snapshots History rows added since the last run into
+Parquet files partitioned as date=YYYY-MM-DD/crop_type=X/, tracking a
+recordNo watermark so every run only reads new rows from the database.
+X is the crop type with anything but letters, digits, '.' and '-'
+replaced by '_' (see partition_value), so readers that do and don't
+URL-decode partition values see the same string.
+
+`disease_counts` aggregates those files (vectorised, with DuckDB when
+installed and pyarrow compute otherwise), so trend analyses never touch
+the production database.
+"""
+import json
+import os
+import re
+from datetime import timedelta
+from datetime import timezone as dt_timezone
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import History
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+EXPORT_DIR = str(getattr(settings, 'ANALYTICS_EXPORT_DIR', settings.BASE_DIR / 'exports' / 'history'))
+WATERMARK_PATH = os.path.join(EXPORT_DIR, '_watermark.json')
+
+# Rows younger than this may still be waiting on their geocoding job
+EXPORT_LAG = timedelta(minutes=getattr(settings, 'ANALYTICS_EXPORT_LAG_MINUTES', 15))
+
+SCHEMA = pa.schema([
+    ('recordNo', pa.int64()),
+    ('account_acno', pa.int64()),
+    ('region', pa.string()),
+    ('disease', pa.string()),
+    ('temperature', pa.float64()),
+    ('humidity', pa.float64()),
+    ('location', pa.string()),
+    ('record_date', pa.timestamp('us', tz='UTC')),
+    ('scan_id', pa.int64()),
+])
+PARTITION_SCHEMA = pa.schema([('date', pa.date32()), ('crop_type', pa.string())])
+DATASET_SCHEMA = pa.schema(list(SCHEMA) + list(PARTITION_SCHEMA))
+
+# values_list order: the SCHEMA columns, then crop_type for the partition path
+EXPORT_COLUMNS = ('recordNo', 'account_acno_id', 'account_acno__region', 'disease', 'temperature',
+                  'humidity', 'location', 'record_date', 'scan_id', 'crop_type')
+
+
+def partition_value(crop_type):
+    """Directory-safe crop_type partition value; crop_type filters go through this too."""
+    return re.sub(r'[^A-Za-z0-9.\-]+', '_', crop_type or 'unknown')
+
+
+def read_watermark():
+    """Highest recordNo already exported (0 before the first export)."""
+    if not os.path.exists(WATERMARK_PATH):
+        return 0
+    with open(WATERMARK_PATH, 'r') as f:
+        return json.load(f)['record_no']
+
+
+def _write_watermark(record_no):
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    tmp_path = WATERMARK_PATH + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'record_no': record_no, 'exported_at': timezone.now().isoformat()}, f)
+    os.replace(tmp_path, WATERMARK_PATH)
+
+
+def _write_partitions(rows):
+    partitions = {}
+    for row in rows:
+        day = row[7].astimezone(dt_timezone.utc).date()
+        partitions.setdefault((day, partition_value(row[9])), []).append(row[:9])
+
+    for (day, crop_type), part_rows in partitions.items():
+        columns = list(zip(*part_rows))
+        arrays = [
+            pa.array([float(v) if v is not None else None for v in c] if f.type == pa.float64() else c, type=f.type)
+            for c, f in zip(columns, SCHEMA)
+        ]
+        directory = os.path.join(EXPORT_DIR, f'date={day.isoformat()}', f'crop_type={crop_type}')
+        os.makedirs(directory, exist_ok=True)
+
+        name = f'part-{part_rows[0][0]}-{part_rows[-1][0]}.parquet'
+        # Dot-prefixed while being written, so dataset readers skip it
+        tmp_path = os.path.join(directory, f'.{name}.tmp')
+        pq.write_table(pa.Table.from_arrays(arrays, schema=SCHEMA), tmp_path, compression='zstd')
+        os.replace(tmp_path, os.path.join(directory, name))
+
+    return len(partitions)
+
+
+def export_new_rows(batch_size=50000):
+    """
+    Export rows with recordNo above the watermark. The watermark only
+    advances after a batch's files are written, so an interrupted run
+    resumes where it stopped. Returns the number of rows exported.
+    """
+    upper = History.objects.filter(
+        record_date__lt=timezone.now() - EXPORT_LAG
+    ).aggregate(top=Max('recordNo'))['top']
+    if upper is None:
+        return 0
+
+    exported = 0
+    watermark = read_watermark()
+    while watermark < upper:
+        rows = list(
+            History.objects.filter(recordNo__gt=watermark, recordNo__lte=upper)
+            .order_by('recordNo')
+            .values_list(*EXPORT_COLUMNS)[:batch_size]
+        )
+        if not rows:
+            break
+
+        files = _write_partitions(rows)
+        watermark = rows[-1][0]
+        _write_watermark(watermark)
+
+        exported += len(rows)
+        print(f"📤 Exported {len(rows)} rows into {files} partition file(s), watermark {watermark}")
+
+    return exported
+
+
+def _dataset():
+    # _watermark.json and dot-prefixed temp files are skipped by default
+    return ds.dataset(EXPORT_DIR, schema=DATASET_SCHEMA, format='parquet', partitioning='hive')
+
+
+def disease_counts(since=None, until=None, crop_type=None, group_by='region'):
+    """
+    Scans per (`group_by`, ISO week, disease), as a pyarrow Table sorted by
+    week. `group_by` is 'region' (the account's region) or 'location'.
+    Dates are days (datetime.date) and filter on the date partition.
+    """
+    if group_by not in ('region', 'location'):
+        raise ValueError("group_by must be 'region' or 'location'")
+    if not os.path.isdir(EXPORT_DIR):
+        return pa.table({group_by: [], 'week': [], 'disease': [], 'scans': []})
+
+    if duckdb is not None:
+        return _disease_counts_duckdb(since, until, crop_type, group_by)
+
+    expr = pc.scalar(True)
+    if since is not None:
+        expr &= pc.field('date') >= pa.scalar(since, pa.date32())
+    if until is not None:
+        expr &= pc.field('date') < pa.scalar(until, pa.date32())
+    if crop_type is not None:
+        expr &= pc.field('crop_type') == partition_value(crop_type)
+
+    table = _dataset().to_table(columns=[group_by, 'disease', 'record_date'], filter=expr)
+    week = pc.floor_temporal(table['record_date'], unit='week', week_starts_monday=True)
+    table = table.append_column('week', pc.cast(week, pa.date32()))
+
+    counts = table.group_by([group_by, 'week', 'disease']).aggregate([('record_date', 'count')])
+    counts = counts.rename_columns([group_by, 'week', 'disease', 'scans'])
+    return counts.sort_by([('week', 'ascending'), ('scans', 'descending')])
+
+
+def _disease_counts_duckdb(since, until, crop_type, group_by):
+    where, params = ['TRUE'], []
+    if since is not None:
+        where.append('date >= ?')
+        params.append(since)
+    if until is not None:
+        where.append('date < ?')
+        params.append(until)
+    if crop_type is not None:
+        where.append('crop_type = ?')
+        params.append(partition_value(crop_type))
+
+    query = f"""
+        SELECT {group_by}, CAST(date_trunc('week', record_date AT TIME ZONE 'UTC') AS DATE) AS week,
+               disease, count(*) AS scans
+        FROM read_parquet(?, hive_partitioning = true, hive_types = {{'date': DATE, 'crop_type': VARCHAR}})
+        WHERE {' AND '.join(where)}
+        GROUP BY ALL
+        ORDER BY week, scans DESC
+    """
+    with duckdb.connect() as con:
+        return con.execute(query, [os.path.join(EXPORT_DIR, '**', '*.parquet'), *params]).fetch_arrow_table()
@@ -0,0 +1,326 @@
+"""
+Hot/cold storage for History.
+
+Rows older than a cutoff are moved out of the HISTORY table into
+zstd-compressed Parquet files under HISTORY_ARCHIVE_DIR, partitioned as
+year=YYYY/month=MM/. The table then only holds recent scans, which keeps
+its working set small.
+
+`history_rows` is the read side: it returns rows in HISTORY_COLUMNS order,
+newest first, from the table and then (when needed) from the archive.
+Archived rows are always older than every row left in the table, so
+appending them keeps the date order.
+
+Per-account totals (`disease_counts`) come from ArchivedScanCount, which
+is updated in the same transaction that deletes archived rows.
+"""
+import json
+import os
+from collections import Counter
+from datetime import timezone as dt_timezone
+from itertools import chain, islice
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+
+from .analytics import read_watermark
+from .models import ArchivedScanCount, History
+from .serializers import HISTORY_COLUMNS
+
+ARCHIVE_DIR = str(getattr(settings, 'HISTORY_ARCHIVE_DIR', settings.BASE_DIR / 'archive' / 'history'))
+REQUIRE_EXPORT = getattr(settings, 'HISTORY_ARCHIVE_REQUIRES_EXPORT', True)
+# Files of the batch in progress; dot-prefixed so dataset readers skip it
+PENDING_PATH = os.path.join(ARCHIVE_DIR, '.pending.json')
+
+SCHEMA = pa.schema([
+    ('recordNo', pa.int64()),
+    ('account_acno', pa.int64()),
+    ('crop_type', pa.string()),
+    ('disease', pa.string()),
+    ('temperature', pa.decimal128(5, 2)),
+    ('humidity', pa.decimal128(5, 2)),
+    ('location', pa.string()),
+    ('record_date', pa.timestamp('us', tz='UTC')),
+    ('scan_id', pa.int64()),
+    # Added later: files written before it read back as null
+    ('captured_at', pa.timestamp('us', tz='UTC')),
+])
+PARTITION_SCHEMA = pa.schema([('year', pa.int16()), ('month', pa.int8())])
+PARTITIONING = ds.partitioning(PARTITION_SCHEMA, flavor='hive')
+DATASET_SCHEMA = pa.schema(list(SCHEMA) + list(PARTITION_SCHEMA))
+
+# Column order of History.values_list() used when archiving
+ARCHIVE_COLUMNS = ('recordNo', 'account_acno_id', 'crop_type', 'disease', 'temperature',
+                   'humidity', 'location', 'record_date', 'scan_id', 'captured_at')
+
+
+def _plan_batch(rows):
+    """Split one batch of rows into {path: rows}, one Parquet file per month it spans."""
+    by_month = {}
+    for row in rows:
+        when = row[7].astimezone(dt_timezone.utc)
+        by_month.setdefault((when.year, when.month), []).append(row)
+
+    plan = {}
+    for (year, month), month_rows in by_month.items():
+        directory = os.path.join(ARCHIVE_DIR, f'year={year}', f'month={month}')
+        plan[os.path.join(directory, f'part-{month_rows[0][0]}-{month_rows[-1][0]}.parquet')] = month_rows
+    return plan
+
+
+def _write_file(path, rows):
+    columns = list(zip(*rows))
+    table = pa.Table.from_arrays([pa.array(c, type=f.type) for c, f in zip(columns, SCHEMA)], schema=SCHEMA)
+
+    directory, name = os.path.split(path)
+    os.makedirs(directory, exist_ok=True)
+    # Dot-prefixed while being written, so dataset readers skip it
+    tmp_path = os.path.join(directory, f'.{name}.tmp')
+    pq.write_table(table, tmp_path, compression='zstd')
+    os.replace(tmp_path, path)
+
+
+def _write_pending(paths):
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    tmp_path = PENDING_PATH + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(paths, f)
+    os.replace(tmp_path, PENDING_PATH)
+
+
+def _add_counts(counts):
+    for (acno, disease), n in counts.items():
+        updated = ArchivedScanCount.objects.filter(account_acno_id=acno, disease=disease).update(
+            scan_count=F('scan_count') + n
+        )
+        if not updated:
+            ArchivedScanCount.objects.create(account_acno_id=acno, disease=disease, scan_count=n)
+
+
+def _delete_archived(record_nos):
+    """
+    Delete rows that are now safely in Parquet from the table, adding them
+    to ArchivedScanCount in the same transaction. Returns the number deleted.
+    """
+    with transaction.atomic():
+        rows_qs = History.objects.filter(recordNo__in=record_nos)
+        counts = Counter(rows_qs.values_list('account_acno_id', 'disease'))
+        deleted, _ = rows_qs.delete()
+        _add_counts(counts)
+    return deleted
+
+
+def rebuild_counts():
+    """Recompute ArchivedScanCount from the Parquet files (archives written before it existed)."""
+    dataset = _dataset()
+    counts = Counter()
+    if dataset is not None:
+        table = dataset.to_table(columns=['account_acno', 'disease'])
+        table = table.group_by(['account_acno', 'disease']).aggregate([('account_acno', 'count')])
+        counts = Counter(dict(zip(
+            zip(table.column('account_acno').to_pylist(), table.column('disease').to_pylist()),
+            table.column('account_acno_count').to_pylist(),
+        )))
+
+    with transaction.atomic():
+        ArchivedScanCount.objects.all().delete()
+        _add_counts(counts)
+    return sum(counts.values())
+
+
+def disease_counts(acno):
+    """
+    {disease: scans} for one account over the table and the archive. The
+    archived part comes from ArchivedScanCount, so this never reads Parquet.
+    """
+    hot = (
+        History.objects.filter(account_acno_id=acno)
+        .values_list('disease')
+        .annotate(n=Count('recordNo'))
+        .order_by()
+    )
+    counts = Counter(dict(hot))
+    counts.update(dict(ArchivedScanCount.objects.filter(account_acno_id=acno).values_list('disease', 'scan_count')))
+    return counts
+
+
+def finish_pending():
+    """
+    Complete a batch interrupted between writing its files and deleting
+    its rows: every row in a listed file that is still in the table is
+    deleted, so the next batch can't archive it a second time under a
+    different file name. Files that were never renamed into place hold
+    nothing, and their rows are simply archived again.
+    """
+    if not os.path.exists(PENDING_PATH):
+        return 0
+
+    with open(PENDING_PATH) as f:
+        paths = json.load(f)
+
+    record_nos = []
+    for path in paths:
+        if os.path.exists(path):
+            record_nos += pq.read_table(path, columns=['recordNo']).column('recordNo').to_pylist()
+
+    deleted = _delete_archived(record_nos)
+    os.remove(PENDING_PATH)
+    print(f"♻️ Finished an interrupted batch: removed {deleted} already-archived rows from the table")
+    return deleted
+
+
+def held_back(cutoff):
+    """
+    Rows old enough to archive that are kept in the table only because the
+    analytics export hasn't picked them up yet (0 unless REQUIRE_EXPORT).
+    """
+    if not REQUIRE_EXPORT:
+        return 0
+    return History.objects.filter(record_date__lt=cutoff, recordNo__gt=read_watermark()).count()
+
+
+def archive_before(cutoff, batch_size=50000, dry_run=False):
+    """
+    Move History rows with record_date < cutoff into the archive.
+    Returns the number of rows moved; see held_back() for the rows
+    REQUIRE_EXPORT keeps out.
+    """
+    if not dry_run:
+        finish_pending()
+
+    rows_qs = History.objects.filter(record_date__lt=cutoff)
+    if REQUIRE_EXPORT:
+        # Never archive rows the analytics export hasn't picked up yet
+        watermark = read_watermark()
+        rows_qs = rows_qs.filter(recordNo__lte=watermark)
+        blocked = held_back(cutoff)
+        if blocked:
+            print(f"⚠️ {blocked} rows older than the cutoff are not exported yet (watermark {watermark}) "
+                  f"and stay in the table; run export_history first")
+
+    moved = 0
+    while True:
+        rows = list(
+            rows_qs
+            .order_by('recordNo')
+            .values_list(*ARCHIVE_COLUMNS)[:batch_size]
+        )
+        if not rows or dry_run:
+            return moved + len(rows) if dry_run else moved
+
+        # The file list is recorded before anything is written and cleared
+        # once the rows are gone; see finish_pending() for the crash case
+        plan = _plan_batch(rows)
+        _write_pending(list(plan))
+        for path, file_rows in plan.items():
+            _write_file(path, file_rows)
+        _delete_archived([r[0] for r in rows])
+        os.remove(PENDING_PATH)
+
+        moved += len(rows)
+        print(f"📦 Archived {len(rows)} rows → {len(plan)} file(s)")
+
+
+def _dataset():
+    if not os.path.isdir(ARCHIVE_DIR):
+        return None
+    return ds.dataset(ARCHIVE_DIR, schema=DATASET_SCHEMA, format='parquet', partitioning=PARTITIONING)
+
+
+def _partitions():
+    """(year, month) of every archive partition, newest first."""
+    found = []
+    for year_dir in os.scandir(ARCHIVE_DIR):
+        if not (year_dir.is_dir() and year_dir.name.startswith('year=')):
+            continue
+        for month_dir in os.scandir(year_dir.path):
+            if month_dir.is_dir() and month_dir.name.startswith('month='):
+                found.append((int(year_dir.name[5:]), int(month_dir.name[6:])))
+    return sorted(found, reverse=True)
+
+
+def iter_archived_rows(acno=None, scan_ids=None, since=None, until=None):
+    """
+    Archived rows matching the filters, newest first, in HISTORY_COLUMNS order.
+
+    Partitions are read one month at a time, newest first, so memory is
+    bounded by a month of matching rows and a caller that stops early
+    (a page, an islice) never opens the older months.
+    """
+    dataset = _dataset()
+    if dataset is None:
+        return
+
+    expr = pc.scalar(True)
+    if acno is not None:
+        expr &= pc.field('account_acno') == int(acno)
+    if scan_ids:
+        expr &= pc.field('scan_id').isin([int(s) for s in scan_ids])
+    if since is not None:
+        expr &= pc.field('record_date') >= pa.scalar(since, type=SCHEMA.field('record_date').type)
+        since = since.astimezone(dt_timezone.utc)
+    if until is not None:
+        expr &= pc.field('record_date') < pa.scalar(until, type=SCHEMA.field('record_date').type)
+        until = until.astimezone(dt_timezone.utc)
+
+    for year, month in _partitions():
+        if until is not None and (year, month) > (until.year, until.month):
+            continue
+        if since is not None and (year, month) < (since.year, since.month):
+            break
+
+        month_expr = expr & (pc.field('year') == year) & (pc.field('month') == month)
+        table = dataset.to_table(columns=list(HISTORY_COLUMNS), filter=month_expr)
+        table = table.sort_by([('record_date', 'descending'), ('recordNo', 'descending')])
+        for batch in table.to_batches():
+            yield from zip(*(batch.column(c).to_pylist() for c in HISTORY_COLUMNS))
+
+
+def archived_rows(**filters):
+    """All archived rows matching the filters as a list (see iter_archived_rows)."""
+    return list(iter_archived_rows(**filters))
+
+
+def history_queryset(acno=None, scan_ids=None, since=None, until=None):
+    qs = History.objects.all()
+    if acno is not None:
+        qs = qs.filter(account_acno__AcNo=acno)
+    if scan_ids:
+        qs = qs.filter(scan_id__in=scan_ids)
+    if since is not None:
+        qs = qs.filter(record_date__gte=since)
+    if until is not None:
+        qs = qs.filter(record_date__lt=until)
+    return qs.order_by('-record_date')
+
+
+def history_rows(offset=0, limit=None, **filters):
+    """
+    Rows from the hot table and then the archive, newest first.
+
+    The archive is only opened when the requested page runs past the end
+    of the hot rows, so recent pages never touch Parquet.
+    """
+    rows_qs = history_queryset(**filters).values_list(*HISTORY_COLUMNS)
+    hot = list(rows_qs[offset:offset + limit] if limit is not None else rows_qs[offset:])
+
+    if limit is not None and len(hot) == limit:
+        return hot
+
+    hot_total = offset + len(hot) if hot else rows_qs.count()
+    skip = max(0, offset - hot_total)
+    cold = islice(iter_archived_rows(**filters), skip, skip + limit - len(hot) if limit is not None else None)
+    return hot + list(cold)
+
+
+def iter_history_rows(offset=0, limit=None, **filters):
+    """Streaming variant of history_rows for NDJSON exports."""
+    hot = history_queryset(**filters).values_list(*HISTORY_COLUMNS).iterator(chunk_size=2000)
+    # iter_archived_rows is a generator: Parquet is only read once the hot rows are exhausted
+    rows = chain(hot, iter_archived_rows(**filters))
+    return islice(rows, offset, offset + limit if limit is not None else None)
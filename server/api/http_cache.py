@@ -0,0 +1,162 @@
+"""
+Response cache for read-heavy GET endpoints.
+
+`cached_response` stores the rendered body (plus gzip/brotli variants of
+large bodies) in the `api` cache alias and answers conditional requests
+with 304. Entries are grouped by tags; `invalidate(tag)` bumps the tag's
+version so every key built from the old version is simply never read again.
+"""
+import gzip
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_http_date_safe
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CACHE_ALIAS = getattr(settings, 'API_CACHE_ALIAS', 'api')
+COMPRESS_MIN_BYTES = getattr(settings, 'API_CACHE_COMPRESS_MIN_BYTES', 1024)
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _tag_versions(tags):
+    cache = _cache()
+    keys = [f'tag:{t}' for t in tags]
+    versions = cache.get_many(keys)
+    missing = {k: time.time_ns() for k in keys if k not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return '.'.join(str(versions[k]) for k in keys)
+
+
+def invalidate(*tags):
+    """Drop every cached response built under any of `tags`."""
+    _cache().set_many({f'tag:{t}': time.time_ns() for t in tags}, None)
+
+
+def _encode(body):
+    """Pre-compress once at store time so cache hits cost nothing extra."""
+    variants = {}
+    if len(body) >= COMPRESS_MIN_BYTES:
+        variants['gzip'] = gzip.compress(body, compresslevel=6)
+        if brotli is not None:
+            variants['br'] = brotli.compress(body, quality=5)
+    return variants
+
+
+def _accepted_encodings(header):
+    """{coding: q} from an Accept-Encoding header; malformed q-values count as 0."""
+    accepted = {}
+    for item in header.split(','):
+        coding, *params = [p.strip() for p in item.split(';')]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            if param.lower().startswith('q='):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        accepted[coding.lower()] = q
+    return accepted
+
+
+def _pick_encoding(request, variants):
+    """The stored variant the client rates highest (brotli on a tie); q=0 means never."""
+    accepted = _accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    best, best_q = None, 0.0
+    for encoding in ('br', 'gzip'):
+        q = accepted.get(encoding, accepted.get('*', 0.0))
+        if encoding in variants and q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def _not_modified(request, entry):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        return entry['etag'] in [t.strip() for t in if_none_match.split(',')] or if_none_match.strip() == '*'
+
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return if_modified_since is not None and int(entry['last_modified']) <= if_modified_since
+
+
+def _build_response(request, entry, ttl):
+    headers = {
+        'ETag': entry['etag'],
+        'Last-Modified': http_date(entry['last_modified']),
+        'Cache-Control': f'private, max-age={ttl}',
+        # Accept is part of the cache key too (JSON vs NDJSON)
+        'Vary': 'Accept, Accept-Encoding',
+    }
+
+    if _not_modified(request, entry):
+        response = HttpResponseNotModified()
+    else:
+        encoding = _pick_encoding(request, entry['variants'])
+        body = entry['variants'][encoding] if encoding else entry['body']
+        response = HttpResponse(body, status=entry['status'], content_type=entry['content_type'])
+        if encoding:
+            response['Content-Encoding'] = encoding
+
+    for name, value in headers.items():
+        response[name] = value
+    return response
+
+
+def cached_response(name, ttl=None, tags=None):
+    """
+    Cache a GET view's 200 responses.
+
+    `tags` is a list of tag names, or a function of the request returning
+    one (for per-account entries). The query string and Accept header are
+    part of the key. Streaming responses are passed through uncached.
+    """
+    ttl = ttl if ttl is not None else getattr(settings, 'API_CACHE_TTL', {}).get(name, 30)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view(request, *args, **kwargs)
+
+            tag_list = tags(request) if callable(tags) else (tags or [])
+            # Accept is part of the key: some views pick a format from it
+            variant = f"{request.GET.urlencode()}|{request.META.get('HTTP_ACCEPT', '')}"
+            query = hashlib.sha1(variant.encode()).hexdigest()
+            key = f'resp:{name}:{_tag_versions(tag_list)}:{query}'
+
+            cache = _cache()
+            entry = cache.get(key)
+            if entry is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200 or response.streaming:
+                    return response
+
+                body = response.content
+                entry = {
+                    'body': body,
+                    'variants': _encode(body),
+                    'etag': f'W/"{hashlib.sha1(body).hexdigest()}"',
+                    'last_modified': time.time(),
+                    'status': response.status_code,
+                    'content_type': response['Content-Type'],
+                }
+                cache.set(key, entry, ttl)
+
+            return _build_response(request, entry, ttl)
+
+        return wrapper
+    return decorator
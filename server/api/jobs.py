@@ -0,0 +1,161 @@
+"""
+A small DB-backed job queue.
+
+Views call `enqueue()` to move slow side-effects out of the request path;
+`manage.py run_workers` claims due jobs and runs the registered function.
+Failed jobs are retried with exponential backoff until `max_attempts`.
+"""
+import random
+import traceback
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+REGISTRY = {}
+
+BACKOFF_BASE_SECONDS = 5
+BACKOFF_MAX_SECONDS = 3600
+LOCK_SECONDS = 300
+
+
+def task(name=None, max_attempts=5):
+    """Register a function as a job handler. It receives the payload as kwargs."""
+    def decorator(func):
+        REGISTRY[name or func.__name__] = (func, max_attempts)
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, idempotency_key=None, delay=0):
+    """
+    Queue `name` to run with `payload`. If a job with the same
+    idempotency_key already exists, that job is returned instead.
+    """
+    if name not in REGISTRY:
+        raise KeyError(f"Unknown job: {name}")
+
+    if idempotency_key:
+        existing = Job.objects.filter(idempotency_key=idempotency_key).first()
+        if existing:
+            return existing
+
+    try:
+        with transaction.atomic():
+            return Job.objects.create(
+                name=name,
+                payload=payload or {},
+                idempotency_key=idempotency_key,
+                max_attempts=REGISTRY[name][1],
+                run_after=timezone.now() + timedelta(seconds=delay),
+            )
+    except IntegrityError:
+        # Lost a race with another enqueue of the same key
+        return Job.objects.get(idempotency_key=idempotency_key)
+
+
+def enqueue_on_commit(name, payload=None, idempotency_key=None, delay=0):
+    """Enqueue once the surrounding transaction commits (or now, in autocommit)."""
+    transaction.on_commit(lambda: enqueue(name, payload, idempotency_key, delay))
+
+
+def backoff(attempts):
+    """Exponential backoff with full jitter, capped at BACKOFF_MAX_SECONDS."""
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempts))
+
+
+def claim():
+    """
+    Claim one due job, or return None.
+
+    Claiming is a conditional UPDATE on the row's previous state, so two
+    workers racing for the same job can't both win, on any database backend.
+
+    The attempt is counted when the job is claimed rather than when it
+    finishes, so a job whose worker died mid-run (its lock expired) still
+    used up an attempt. Once it has none left it is failed instead of
+    being handed to another worker to crash again.
+    """
+    now = timezone.now()
+    due = (
+        Job.objects.filter(status=Job.QUEUED, run_after__lte=now)
+        | Job.objects.filter(status=Job.RUNNING, locked_until__lt=now)
+    ).order_by('run_after').values('pk', 'status', 'locked_until', 'attempts', 'max_attempts', 'name')[:10]
+
+    for row in due:
+        previous = Job.objects.filter(pk=row['pk'], status=row['status'], locked_until=row['locked_until'])
+
+        if row['status'] == Job.RUNNING and row['attempts'] >= row['max_attempts']:
+            if previous.update(
+                status=Job.FAILED,
+                locked_until=None,
+                last_error=f"Worker lost during attempt {row['attempts']} (lock expired)",
+                updated_at=now,
+            ):
+                print(f"🔥 Job {row['name']} #{row['pk']} failed for good: worker lost on the last attempt")
+            continue
+
+        claimed = previous.update(
+            status=Job.RUNNING,
+            attempts=F('attempts') + 1,
+            locked_until=now + timedelta(seconds=LOCK_SECONDS),
+            updated_at=now,
+        )
+        if claimed:
+            return Job.objects.get(pk=row['pk'])
+
+    return None
+
+
+def run(job):
+    """
+    Run a claimed job (claim() already counted the attempt) and record the
+    outcome. Like claim(), the outcome is written with a conditional UPDATE
+    on the lock this worker holds: if the run outlived its lock and another
+    worker has reclaimed the job, that worker's attempt is left alone.
+    """
+    func, _ = REGISTRY[job.name]
+    claimed_lock = job.locked_until
+
+    try:
+        func(**job.payload)
+    except Exception as e:
+        job.last_error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            job.status = Job.FAILED
+            print(f"🔥 Job {job.name} #{job.pk} failed for good: {e}")
+        else:
+            job.status = Job.QUEUED
+            job.run_after = timezone.now() + timedelta(seconds=backoff(job.attempts))
+            print(f"⚠️ Job {job.name} #{job.pk} failed (attempt {job.attempts}), retrying: {e}")
+    else:
+        job.status = Job.DONE
+        job.last_error = ''
+
+    job.locked_until = None
+    job.updated_at = timezone.now()
+    recorded = Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_until=claimed_lock).update(
+        status=job.status,
+        run_after=job.run_after,
+        locked_until=None,
+        last_error=job.last_error,
+        updated_at=job.updated_at,
+    )
+    if not recorded:
+        print(f"⚠️ Job {job.name} #{job.pk} outlived its lock and was reclaimed; outcome of attempt {job.attempts} dropped")
+    return job
+
+
+def run_pending(limit=None):
+    """Run due jobs until none are left (or `limit` ran). Returns the count."""
+    count = 0
+    while limit is None or count < limit:
+        job = claim()
+        if job is None:
+            break
+        run(job)
+        count += 1
+    return count
@@ -0,0 +1,57 @@
+import json
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from api import serializers
+from api.serializers import HISTORY_KEYS, dumps, rows_to_dicts
+
+
+class Command(BaseCommand):
+    help = "Compare the old per-row dict + JsonResponse encoding with the serializers module."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=50000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        # Same shape as History.values_list(*HISTORY_COLUMNS)
+        rows = [
+            (i, 'Tomato_Late_blight', 'tomato', Decimal('27.50'), Decimal('81.25'),
+             'Mirpur, Dhaka, Bangladesh', now - timedelta(minutes=i), i, None)
+            for i in range(options['rows'])
+        ]
+
+        def baseline():
+            data = []
+            for r in rows:
+                data.append({
+                    'recordNo': r[0], 'disease': r[1], 'crop_type': r[2], 'temperature': r[3],
+                    'humidity': r[4], 'location': r[5], 'date': r[6], 'scan_id': r[7],
+                    'captured_at': r[8],
+                })
+            return json.dumps({'data': data}, cls=DjangoJSONEncoder).encode()
+
+        def fast():
+            return dumps({'data': rows_to_dicts(rows, HISTORY_KEYS)})
+
+        def best_of(fn):
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                fn()
+                timings.append(time.perf_counter() - start)
+            return min(timings) * 1000
+
+        base_ms, fast_ms = best_of(baseline), best_of(fast)
+        backend = 'orjson' if serializers.orjson is not None else 'json (orjson not installed)'
+
+        self.stdout.write(f"{options['rows']} rows, best of {options['repeat']}, backend: {backend}")
+        self.stdout.write(f"  dict per row + DjangoJSONEncoder: {base_ms:8.1f} ms")
+        self.stdout.write(f"  values_list zip + serializers:    {fast_ms:8.1f} ms")
+        self.stdout.write(self.style.SUCCESS(f"  speedup: {base_ms / fast_ms:.1f}x"))
@@ -0,0 +1,30 @@
+import csv
+import sys
+
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+
+from api.analytics import disease_counts
+
+
+class Command(BaseCommand):
+    help = "Weekly disease counts per region from the analytics export (not the live database)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=parse_date, help="YYYY-MM-DD, inclusive")
+        parser.add_argument('--until', type=parse_date, help="YYYY-MM-DD, exclusive")
+        parser.add_argument('--crop-type')
+        parser.add_argument('--by', choices=['region', 'location'], default='region')
+        parser.add_argument('--csv', metavar='PATH', help="write CSV here instead of stdout")
+
+    def handle(self, *args, **options):
+        table = disease_counts(options['since'], options['until'], options['crop_type'], options['by'])
+
+        out = open(options['csv'], 'w', newline='') if options['csv'] else sys.stdout
+        try:
+            writer = csv.writer(out)
+            writer.writerow(table.column_names)
+            writer.writerows(zip(*(table.column(c).to_pylist() for c in table.column_names)))
+        finally:
+            if options['csv']:
+                out.close()
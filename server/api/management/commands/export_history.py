@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from api.analytics import EXPORT_DIR, export_new_rows, read_watermark
+
+
+class Command(BaseCommand):
+    help = "Export History rows added since the last run into partitioned Parquet files."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50000)
+
+    def handle(self, *args, **options):
+        exported = export_new_rows(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {exported} rows → {EXPORT_DIR} (watermark recordNo {read_watermark()})"
+        ))
@@ -0,0 +1,43 @@
+import multiprocessing
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from api.worker import work
+
+
+class Command(BaseCommand):
+    help = "Run background job workers (one process each)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count())
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+        parser.add_argument('--burst', action='store_true', help="exit once the queue is empty")
+
+    def handle(self, *args, **options):
+        processes = max(1, options['processes'])
+
+        if processes == 1:
+            work(options['poll_interval'], options['burst'])
+            return
+
+        # Children must open their own DB connections
+        connections.close_all()
+
+        workers = [
+            multiprocessing.Process(target=work, args=(options['poll_interval'], options['burst']))
+            for _ in range(processes)
+        ]
+        for w in workers:
+            w.start()
+
+        try:
+            for w in workers:
+                w.join()
+        except KeyboardInterrupt:
+            for w in workers:
+                w.terminate()
+            for w in workers:
+                w.join()
+
+        self.stdout.write(self.style.SUCCESS(f"{processes} workers stopped"))
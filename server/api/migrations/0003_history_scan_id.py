@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_alter_account_acno'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='history',
+            name='scan_id',
+            field=models.BigIntegerField(blank=True, db_index=True, null=True),
+        ),
+    ]
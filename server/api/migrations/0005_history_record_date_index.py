@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:26
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_job_diseasestat'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='history',
+            name='record_date',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
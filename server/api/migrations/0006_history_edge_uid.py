@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_history_record_date_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='history',
+            name='edge_uid',
+            field=models.CharField(blank=True, max_length=32, null=True, unique=True),
+        ),
+    ]
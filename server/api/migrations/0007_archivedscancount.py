@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_history_edge_uid'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedScanCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('disease', models.CharField(max_length=50)),
+                ('scan_count', models.PositiveIntegerField(default=0)),
+                ('account_acno', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.account')),
+            ],
+            options={
+                'db_table': 'ARCHIVED_SCAN_COUNT',
+                'constraints': [models.UniqueConstraint(fields=('account_acno', 'disease'), name='unique_archived_scan_count')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_archivedscancount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='history',
+            name='captured_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -35,7 +35,14 @@ class History(models.Model):
     humidity = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)   
   
     location = models.CharField(max_length=255, null=True, blank=True)
-    record_date = models.DateTimeField(default=timezone.now)
+    record_date = models.DateTimeField(default=timezone.now, db_index=True)
+    # Id of this scan's embedding in the ML server's embedding stores (unique across models)
+    scan_id = models.BigIntegerField(null=True, blank=True, db_index=True)
+    # Client-generated id of scans synced from an offline edge device, so resends are no-ops
+    edge_uid = models.CharField(max_length=32, unique=True, null=True, blank=True)
+    # When an edge device took the photo. record_date stays the insert time: archiving
+    # and the analytics export both rely on new rows never being older than stored ones
+    captured_at = models.DateTimeField(null=True, blank=True)
     def __str__(self):
         return f"History: {self.crop_type} for AcNo {self.account_acno_id}"
 
@@ -46,3 +53,72 @@ class History(models.Model):
 
     
 
+class Job(models.Model):
+    """A unit of background work, claimed and run by `manage.py run_workers`."""
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(s, s) for s in (QUEUED, RUNNING, DONE, FAILED)]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    # Enqueueing twice with the same key returns the existing job
+    idempotency_key = models.CharField(max_length=255, null=True, blank=True, unique=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    # A running job whose lock has expired is assumed lost and is reclaimed
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Job: {self.name} #{self.pk} ({self.status})"
+
+    class Meta:
+        db_table = 'JOB'
+        indexes = [models.Index(fields=['status', 'run_after'])]
+
+
+class DiseaseStat(models.Model):
+    """Weekly scan counts per location, crop and disease, kept up to date by jobs."""
+
+    location = models.CharField(max_length=255, null=True, blank=True)
+    crop_type = models.CharField(max_length=100)
+    disease = models.CharField(max_length=50)
+    week_start = models.DateField()
+    scan_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"DiseaseStat: {self.disease} @ {self.location} ({self.week_start}) = {self.scan_count}"
+
+    class Meta:
+        db_table = 'DISEASE_STAT'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['location', 'crop_type', 'disease', 'week_start'],
+                name='unique_disease_stat_week',
+            )
+        ]
+
+
+class ArchivedScanCount(models.Model):
+    """Per-account scan counts by disease for History rows moved to the Parquet archive."""
+
+    account_acno = models.ForeignKey('Account', on_delete=models.CASCADE, to_field='AcNo')
+    disease = models.CharField(max_length=50)
+    scan_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"ArchivedScanCount: {self.disease} for AcNo {self.account_acno_id} = {self.scan_count}"
+
+    class Meta:
+        db_table = 'ARCHIVED_SCAN_COUNT'
+        constraints = [
+            models.UniqueConstraint(fields=['account_acno', 'disease'], name='unique_archived_scan_count')
+        ]
@@ -0,0 +1,90 @@
+"""
+Fast JSON rendering for list endpoints.
+
+Rows are read with `.values_list()` in HISTORY_COLUMNS order and zipped
+with HISTORY_KEYS, which skips model instantiation entirely. Datetimes
+(millisecond precision, "Z" for UTC) and Decimals (strings) are written
+exactly as Django's JSON encoder writes them, so responses are the same
+as JsonResponse's apart from whitespace. Without orjson, the stdlib
+encoder is used.
+"""
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, StreamingHttpResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Database columns and the keys they are published under, in the same order
+HISTORY_COLUMNS = ('recordNo', 'disease', 'crop_type', 'temperature', 'humidity', 'location', 'record_date', 'scan_id',
+                   'captured_at')
+HISTORY_KEYS = ('recordNo', 'disease', 'crop_type', 'temperature', 'humidity', 'location', 'date', 'scan_id',
+                'captured_at')
+
+NDJSON_CHUNK_ROWS = 2000
+
+_DJANGO_ENCODER = DjangoJSONEncoder()
+
+
+def _default(obj):
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, (datetime, date, time)):
+        # orjson would keep microseconds; clients already parse Django's format
+        return _DJANGO_ENCODER.default(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(data):
+    """Serialize to UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(data, default=_default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+    return json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def rows_to_dicts(rows, keys=HISTORY_KEYS):
+    return [dict(zip(keys, row)) for row in rows]
+
+
+class FastJsonResponse(HttpResponse):
+    """JsonResponse equivalent that renders with `dumps`."""
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
+
+
+def ndjson_response(rows, keys=HISTORY_KEYS, chunk_rows=NDJSON_CHUNK_ROWS):
+    """
+    Stream `rows` (a values_list queryset or any iterable of row tuples)
+    as newline-delimited JSON.
+
+    Querysets are read with .iterator() so memory stays flat, and lines
+    are written in chunks of `chunk_rows` to keep per-write overhead low.
+    """
+    if hasattr(rows, 'iterator'):
+        rows = rows.iterator(chunk_size=chunk_rows)
+
+    def generate():
+        batch = []
+        for row in rows:
+            batch.append(dumps(dict(zip(keys, row))))
+            if len(batch) == chunk_rows:
+                yield b'\n'.join(batch) + b'\n'
+                batch = []
+        if batch:
+            yield b'\n'.join(batch) + b'\n'
+
+    return StreamingHttpResponse(generate(), content_type='application/x-ndjson')
+
+
+def wants_ndjson(request):
+    return (
+        request.GET.get('format') == 'ndjson'
+        or 'application/x-ndjson' in request.META.get('HTTP_ACCEPT', '')
+    )
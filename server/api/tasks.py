@@ -0,0 +1,134 @@
+import hashlib
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.db.models import Q
+from django.utils import timezone
+from geopy.geocoders import Nominatim
+
+from .http_cache import invalidate
+from .jobs import enqueue, task
+from .models import Account, DiseaseStat, History
+
+OUTBREAK_WINDOW_DAYS = getattr(settings, 'OUTBREAK_WINDOW_DAYS', 7)
+OUTBREAK_THRESHOLD = getattr(settings, 'OUTBREAK_THRESHOLD', 5)
+
+
+def getLocation(lat,lon):
+    try:
+
+        geolocator=Nominatim(user_agent="smart_cropcare_app_v1")
+        location= geolocator.reverse((lat, lon),language='en',timeout=5)
+
+        if location:
+            address= location.raw.get('address', {})
+            city =address.get('city') or address.get('town') or address.get('village','')
+            state =address.get('state','')
+            country =address.get('country','')
+
+            #  "Mirpur, Dhaka, Bangladesh"
+            parts = [p for p in [city, state, country] if p]
+            return ", ".join(parts) # loc,loc2,country
+
+    except Exception as e:
+        print(f"Geocoding error: {e}")
+
+    return None
+
+
+def week_start(when):
+    day = timezone.localdate(when)
+    return day - timedelta(days=day.weekday())
+
+
+def enqueue_scan_followups(record_no):
+    """Jobs that need the record's final location."""
+    enqueue('update_disease_stats', {'record_no': record_no}, idempotency_key=f'stats:{record_no}')
+    enqueue('notify_outbreak', {'record_no': record_no}, idempotency_key=f'outbreak-check:{record_no}')
+
+
+@task(max_attempts=3)
+def geocode_history(record_no, lat, lon):
+    location = getLocation(float(lat), float(lon))
+    if location:
+        History.objects.filter(recordNo=record_no).update(location=location)
+        account_acno = History.objects.values_list('account_acno', flat=True).get(recordNo=record_no)
+        invalidate('history', f'account:{account_acno}')
+        print(f"✅ Address Found for #{record_no}: {location}")
+    else:
+        print(f"⚠️ Could not resolve address for #{record_no}, keeping the submitted location.")
+
+    enqueue_scan_followups(record_no)
+
+
+@task()
+def update_disease_stats(record_no):
+    """
+    Recount the record's (location, crop, disease, week) bucket from History.
+    Recounting rather than incrementing keeps retries idempotent.
+    """
+    h = History.objects.get(recordNo=record_no)
+    start = week_start(h.record_date)
+    start_dt = timezone.make_aware(datetime.combine(start, time.min))
+
+    count = History.objects.filter(
+        location=h.location,
+        crop_type=h.crop_type,
+        disease=h.disease,
+        record_date__gte=start_dt,
+        record_date__lt=start_dt + timedelta(days=7),
+    ).count()
+
+    DiseaseStat.objects.update_or_create(
+        location=h.location,
+        crop_type=h.crop_type,
+        disease=h.disease,
+        week_start=start,
+        defaults={'scan_count': count},
+    )
+
+
+@task()
+def notify_outbreak(record_no):
+    """Raise an alert when a disease crosses OUTBREAK_THRESHOLD scans nearby."""
+    h = History.objects.get(recordNo=record_no)
+    if not h.location or 'healthy' in h.disease.lower():
+        return
+
+    recent = History.objects.filter(
+        location=h.location,
+        disease=h.disease,
+        record_date__gte=timezone.now() - timedelta(days=OUTBREAK_WINDOW_DAYS),
+    ).count()
+
+    if recent >= OUTBREAK_THRESHOLD:
+        year, week, _ = timezone.localdate(h.record_date).isocalendar()
+        bucket = hashlib.sha1(f'{h.location}|{h.disease}'.encode()).hexdigest()
+        # One alert per location, disease and week however many scans follow
+        enqueue(
+            'send_outbreak_alert',
+            {'location': h.location, 'disease': h.disease, 'count': recent, 'region': h.account_acno.region},
+            idempotency_key=f'outbreak:{bucket}:{year}-W{week}',
+        )
+
+
+@task()
+def send_outbreak_alert(location, disease, count, region=None):
+    recipients = Account.objects.exclude(Q(email__isnull=True) | Q(email=''))
+    if region:
+        recipients = recipients.filter(region=region)
+
+    emails = list(recipients.values_list('email', flat=True))
+    if not emails:
+        return
+
+    EmailMessage(
+        subject=f"Outbreak alert: {disease} near {location}",
+        body=(
+            f"{count} scans of {disease} were reported around {location} "
+            f"in the last {OUTBREAK_WINDOW_DAYS} days. Check your crops."
+        ),
+        bcc=emails,
+    ).send()
+    print(f"📣 Outbreak alert for {disease} @ {location} sent to {len(emails)} accounts")
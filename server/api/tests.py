@@ -1,3 +1,489 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import date, datetime, timedelta
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db.models.query import QuerySet
+from django.http import JsonResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from . import analytics, archive, jobs
+from .http_cache import _pick_encoding, cached_response, invalidate
+from .models import Account, ArchivedScanCount, History, Job
+from .serializers import FastJsonResponse, dumps, ndjson_response, rows_to_dicts, wants_ndjson
+
+CALLS = []
+VIEW_CALLS = []
+
+
+@jobs.task(name='test_ok')
+def _ok(**payload):
+    CALLS.append(payload)
+
+
+@jobs.task(name='test_fail', max_attempts=2)
+def _fail(**payload):
+    raise RuntimeError('boom')
+
+
+# ------------------------------- JOB QUEUE -------------------------------
+class JobQueueTests(TestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def expire_lock(self, job):
+        Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+
+    def test_enqueue_unknown_job_raises(self):
+        with self.assertRaises(KeyError):
+            jobs.enqueue('no_such_job')
+
+    def test_same_idempotency_key_returns_existing_job(self):
+        first = jobs.enqueue('test_ok', {'n': 1}, idempotency_key='k')
+        second = jobs.enqueue('test_ok', {'n': 2}, idempotency_key='k')
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_delayed_job_is_not_claimed_early(self):
+        jobs.enqueue('test_ok', delay=60)
+        self.assertIsNone(jobs.claim())
+
+    def test_claimed_job_cannot_be_claimed_again(self):
+        jobs.enqueue('test_ok')
+        job = jobs.claim()
+        self.assertEqual((job.status, job.attempts), (Job.RUNNING, 1))
+        self.assertIsNone(jobs.claim())
+
+    def test_claim_loses_race_to_another_worker(self):
+        job = jobs.enqueue('test_ok')
+        real_update = QuerySet.update
+        raced = []
+
+        def racing_update(qs, **kwargs):
+            # Another worker takes the job between our SELECT and our UPDATE
+            if not raced:
+                raced.append(True)
+                Job.objects.filter(pk=job.pk).update(
+                    status=Job.RUNNING, locked_until=timezone.now() + timedelta(minutes=5)
+                )
+            return real_update(qs, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', racing_update):
+            self.assertIsNone(jobs.claim())
+        self.assertEqual(Job.objects.get(pk=job.pk).attempts, 0)
+
+    def test_run_pending_runs_and_completes_jobs(self):
+        jobs.enqueue('test_ok', {'n': 1})
+        jobs.enqueue('test_ok', {'n': 2})
+        self.assertEqual(jobs.run_pending(), 2)
+        self.assertEqual(sorted(c['n'] for c in CALLS), [1, 2])
+        self.assertFalse(Job.objects.exclude(status=Job.DONE).exists())
+
+    def test_failed_job_backs_off_then_fails_for_good(self):
+        job = jobs.enqueue('test_fail')
+
+        jobs.run(jobs.claim())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertGreater(job.run_after, timezone.now() - timedelta(seconds=1))
+        self.assertIn('boom', job.last_error)
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        jobs.run(jobs.claim())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIsNone(jobs.claim())
+
+    def test_backoff_is_capped(self):
+        with mock.patch('api.jobs.random.uniform', side_effect=lambda low, high: high):
+            self.assertEqual(jobs.backoff(1), jobs.BACKOFF_BASE_SECONDS * 2)
+            self.assertEqual(jobs.backoff(30), jobs.BACKOFF_MAX_SECONDS)
+
+    def test_expired_lock_is_reclaimed_and_counts_the_lost_attempt(self):
+        job = jobs.enqueue('test_ok')
+        jobs.claim()
+        self.expire_lock(job)
+
+        job = jobs.claim()
+        self.assertEqual((job.status, job.attempts), (Job.RUNNING, 2))
+
+    def test_worker_lost_on_last_attempt_fails_the_job(self):
+        job = jobs.enqueue('test_fail')
+        for _ in range(job.max_attempts):
+            self.assertIsNotNone(jobs.claim())
+            self.expire_lock(job)
+
+        self.assertIsNone(jobs.claim())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIn('lock expired', job.last_error)
+
+    def test_slow_worker_does_not_overwrite_reclaimed_job(self):
+        job = jobs.enqueue('test_fail')
+        slow = jobs.claim()
+        self.expire_lock(job)
+        self.assertEqual(jobs.claim().attempts, 2)
+
+        # The first worker finally finishes, long after its lock expired
+        jobs.run(slow)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.last_error), (Job.RUNNING, 2, ''))
+        self.assertGreater(job.locked_until, timezone.now())
+
+
+# ------------------------------- RESPONSE CACHE -------------------------------
+@cached_response('test', ttl=60, tags=lambda request: [f"account:{request.GET.get('acNo')}"])
+def _account_view(request):
+    VIEW_CALLS.append(request.GET.get('acNo'))
+    if request.GET.get('fail'):
+        return JsonResponse({'error': 'nope'}, status=400)
+    # The render count makes every re-render a different body
+    return JsonResponse({'acNo': request.GET.get('acNo'), 'render': len(VIEW_CALLS),
+                         'pad': 'x' * int(request.GET.get('pad', 0))})
+
+
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'api': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'api-tests'},
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        caches['api'].clear()
+        VIEW_CALLS.clear()
+        self.factory = RequestFactory()
+
+    def get(self, **headers):
+        params = {k: v for k, v in headers.items() if not k.startswith('HTTP_')}
+        meta = {k: v for k, v in headers.items() if k.startswith('HTTP_')}
+        return _account_view(self.factory.get('/test/', params, **meta))
+
+    def test_repeat_get_is_served_from_cache(self):
+        first = self.get(acNo='1')
+        second = self.get(acNo='1')
+        self.assertEqual(VIEW_CALLS, ['1'])
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_matching_etag_gets_304(self):
+        etag = self.get(acNo='1')['ETag']
+        self.assertEqual(self.get(acNo='1', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.get(acNo='1', HTTP_IF_NONE_MATCH='W/"stale"').status_code, 200)
+
+    def test_invalidate_only_drops_that_tag(self):
+        self.get(acNo='1')
+        self.get(acNo='2')
+        invalidate('account:1')
+        self.get(acNo='1')
+        self.get(acNo='2')
+        self.assertEqual(VIEW_CALLS, ['1', '2', '1'])
+
+    def test_old_etag_gets_fresh_body_after_invalidation(self):
+        etag = self.get(acNo='1')['ETag']
+        invalidate('account:1')
+        response = self.get(acNo='1', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_large_bodies_are_served_precompressed(self):
+        response = self.get(acNo='1', pad='5000', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        plain = self.get(acNo='1', pad='5000')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertEqual(len(VIEW_CALLS), 1)
+
+    def test_encoding_follows_q_values(self):
+        for header, expected in (('gzip', 'gzip'), ('br;q=0, gzip', 'gzip'), ('gzip;q=0', None),
+                                 ('*', 'gzip'), ('*, gzip;q=0', None), ('identity', None)):
+            with self.subTest(header=header):
+                response = self.get(acNo='1', pad='5000', HTTP_ACCEPT_ENCODING=header)
+                self.assertEqual(response.get('Content-Encoding'), expected)
+                self.assertEqual(response['Vary'], 'Accept, Accept-Encoding')
+
+    def test_brotli_is_preferred_unless_refused(self):
+        variants = {'br': b'', 'gzip': b''}
+        for header, expected in (('gzip, br', 'br'), ('br;q=0, gzip', 'gzip'), ('br;q=0.5, gzip', 'gzip'),
+                                 ('br;q=0, gzip;q=0', None), ('*;q=0.1', 'br')):
+            with self.subTest(header=header):
+                request = self.factory.get('/', HTTP_ACCEPT_ENCODING=header)
+                self.assertEqual(_pick_encoding(request, variants), expected)
+
+    def test_errors_are_not_cached(self):
+        self.get(acNo='1', fail='1')
+        self.get(acNo='1', fail='1')
+        self.assertEqual(len(VIEW_CALLS), 2)
+
+
+# ------------------------------- SERIALIZERS -------------------------------
+ROWS = [
+    (2, 'Leaf Blight', 'Rice', Decimal('31.50'), Decimal('80.00'), 'Dhaka',
+     datetime(2026, 1, 2, 3, 4, 5, 123456, tzinfo=dt_timezone.utc), 77,
+     datetime(2026, 1, 2, 3, 0, tzinfo=dt_timezone.utc)),
+    (1, 'Healthy', 'Wheat', None, None, None, datetime(2025, 12, 31, 23, 59, tzinfo=dt_timezone.utc), None, None),
+]
+
+
+class SerializerTests(TestCase):
+    def test_fast_response_matches_json_response(self):
+        data = {'acNo': 1, 'data': rows_to_dicts(ROWS)}
+        fast = FastJsonResponse(data)
+        self.assertEqual(fast['Content-Type'], 'application/json')
+        # Same document byte for byte once Django's ", " / ": " spacing is dropped
+        self.assertEqual(json.loads(fast.content), json.loads(JsonResponse(data).content))
+        self.assertEqual(fast.content, json.dumps(json.loads(JsonResponse(data).content),
+                                                  separators=(',', ':')).encode())
+
+    def test_datetimes_and_decimals_use_django_format(self):
+        row = json.loads(dumps(rows_to_dicts(ROWS[:1])[0]))
+        self.assertEqual(row['date'], '2026-01-02T03:04:05.123Z')
+        self.assertEqual(row['temperature'], '31.50')
+
+    def test_ndjson_streams_one_row_per_line(self):
+        response = ndjson_response(iter(ROWS), chunk_rows=1)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        chunks = list(response.streaming_content)
+        self.assertEqual(len(chunks), 2)
+        lines = b''.join(chunks).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines],
+                         json.loads(JsonResponse(rows_to_dicts(ROWS), safe=False).content))
+
+    def test_wants_ndjson(self):
+        factory = RequestFactory()
+        self.assertTrue(wants_ndjson(factory.get('/', {'format': 'ndjson'})))
+        self.assertTrue(wants_ndjson(factory.get('/', HTTP_ACCEPT='application/x-ndjson')))
+        self.assertFalse(wants_ndjson(factory.get('/')))
+
+
+# ------------------------------- ANALYTICS EXPORT -------------------------------
+class AnalyticsTests(TestCase):
+    CROP = 'Bell Pepper/Green'  # needs quoting in a partition directory name
+
+    def setUp(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        for name, value in (('EXPORT_DIR', tmp), ('WATERMARK_PATH', os.path.join(tmp, '_watermark.json')),
+                            ('EXPORT_LAG', timedelta(minutes=15))):
+            patcher = mock.patch.object(analytics, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.north = Account.objects.create(name='a', password='x', region='North')
+        self.south = Account.objects.create(name='b', password='x', region='South')
+
+    def scan(self, account, when, disease='Blight', crop_type='Rice'):
+        return History.objects.create(account_acno=account, crop_type=crop_type, disease=disease,
+                                      temperature=Decimal('30.25'), record_date=when)
+
+    def exported_record_nos(self):
+        return sorted(analytics._dataset().to_table(columns=['recordNo']).column('recordNo').to_pylist())
+
+    def test_export_advances_the_watermark_and_reruns_add_nothing(self):
+        old = [self.scan(self.north, timezone.now() - timedelta(days=d)) for d in (3, 2, 1)]
+        self.assertEqual(analytics.export_new_rows(batch_size=2), 3)
+        self.assertEqual(analytics.read_watermark(), old[-1].recordNo)
+
+        self.assertEqual(analytics.export_new_rows(), 0)
+        newer = self.scan(self.south, timezone.now() - timedelta(hours=1))
+        self.assertEqual(analytics.export_new_rows(), 1)
+        self.assertEqual(self.exported_record_nos(), [h.recordNo for h in old + [newer]])
+
+    def test_rows_younger_than_the_lag_wait_for_the_next_run(self):
+        self.scan(self.north, timezone.now() - timedelta(days=1))
+        recent = self.scan(self.north, timezone.now())
+        self.assertEqual(analytics.export_new_rows(), 1)
+        self.assertLess(analytics.read_watermark(), recent.recordNo)
+
+        History.objects.filter(pk=recent.pk).update(record_date=timezone.now() - timedelta(hours=1))
+        self.assertEqual(analytics.export_new_rows(), 1)
+        self.assertEqual(analytics.read_watermark(), recent.recordNo)
+
+    def counts(self, **filters):
+        table = analytics.disease_counts(**filters)
+        return sorted(zip(*(table.column(c).to_pylist() for c in table.column_names)))
+
+    def check_disease_counts(self):
+        monday = datetime(2026, 3, 2, 10, tzinfo=dt_timezone.utc)
+        self.scan(self.north, monday)
+        self.scan(self.north, monday + timedelta(days=2))
+        self.scan(self.north, monday + timedelta(days=3), disease='Healthy', crop_type=self.CROP)
+        self.scan(self.south, monday + timedelta(days=7), crop_type=self.CROP)
+        analytics.export_new_rows()
+        self.assertTrue(os.path.isdir(os.path.join(analytics.EXPORT_DIR, 'date=2026-03-09', 'crop_type=Bell_Pepper_Green')))
+
+        week1, week2 = date(2026, 3, 2), date(2026, 3, 9)
+        self.assertEqual(self.counts(), [
+            ('North', week1, 'Blight', 2), ('North', week1, 'Healthy', 1), ('South', week2, 'Blight', 1),
+        ])
+        self.assertEqual(self.counts(crop_type=self.CROP), [
+            ('North', week1, 'Healthy', 1), ('South', week2, 'Blight', 1),
+        ])
+        self.assertEqual(self.counts(since=date(2026, 3, 4), until=date(2026, 3, 9)), [
+            ('North', week1, 'Blight', 1), ('North', week1, 'Healthy', 1),
+        ])
+        with self.assertRaises(ValueError):
+            analytics.disease_counts(group_by='account')
+
+    def test_disease_counts_with_pyarrow(self):
+        with mock.patch.object(analytics, 'duckdb', None):
+            self.check_disease_counts()
+
+    def test_disease_counts_with_duckdb(self):
+        if analytics.duckdb is None:
+            self.skipTest('duckdb is not installed')
+        self.check_disease_counts()
+
+
+# ------------------------------- ARCHIVE -------------------------------
+class ArchiveTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        for name, value in (('ARCHIVE_DIR', tmp), ('PENDING_PATH', os.path.join(tmp, '.pending.json')),
+                            ('REQUIRE_EXPORT', False)):
+            patcher = mock.patch.object(archive, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.account = Account.objects.create(name='a', password='x')
+        other = Account.objects.create(name='b', password='x')
+        now = timezone.now()
+        # 12 old rows spread over several months, 4 recent ones, plus another account's scans
+        for i in range(16):
+            days = 200 + i * 17 if i < 12 else i - 12
+            History.objects.create(account_acno=self.account, crop_type='Rice', scan_id=i,
+                                   disease='Blight' if i % 3 else 'Healthy',
+                                   temperature=Decimal('30.25'), record_date=now - timedelta(days=days, minutes=i))
+        History.objects.create(account_acno=other, crop_type='Rice', disease='Blight',
+                               record_date=now - timedelta(days=300))
+        self.cutoff = now - timedelta(days=180)
+        self.all_rows = archive.history_rows(acno=self.account.AcNo)
+        self.counts = archive.disease_counts(self.account.AcNo)
+
+    def test_archiving_moves_old_rows_and_keeps_counts(self):
+        self.assertEqual(archive.archive_before(self.cutoff, batch_size=5), 13)
+        self.assertEqual(History.objects.filter(account_acno=self.account).count(), 4)
+        self.assertEqual(len(archive.archived_rows(acno=self.account.AcNo)), 12)
+        self.assertEqual(archive.disease_counts(self.account.AcNo), self.counts)
+
+        stored = dict(ArchivedScanCount.objects.filter(account_acno=self.account).values_list('disease', 'scan_count'))
+        self.assertEqual(stored, {'Healthy': 4, 'Blight': 8})
+        ArchivedScanCount.objects.all().delete()
+        self.assertEqual(archive.rebuild_counts(), 13)
+        self.assertEqual(archive.disease_counts(self.account.AcNo), self.counts)
+
+    def test_pages_across_the_hot_cold_boundary(self):
+        archive.archive_before(self.cutoff)
+        self.assertEqual(archive.history_rows(acno=self.account.AcNo), self.all_rows)
+        for offset in (0, 2, 3, 4, 5, 11, 15, 16, 20):
+            for limit in (1, 3, 5):
+                with self.subTest(offset=offset, limit=limit):
+                    page = self.all_rows[offset:offset + limit]
+                    self.assertEqual(archive.history_rows(offset, limit, acno=self.account.AcNo), page)
+                    self.assertEqual(list(archive.iter_history_rows(offset, limit, acno=self.account.AcNo)), page)
+
+    def test_filters_apply_to_archived_rows(self):
+        archive.archive_before(self.cutoff)
+        since, until = self.all_rows[9][6], self.all_rows[5][6]
+        rows = archive.history_rows(acno=self.account.AcNo, since=since, until=until)
+        self.assertEqual(rows, self.all_rows[6:10])
+        rows = archive.history_rows(acno=self.account.AcNo, scan_ids=[1, 2, 14])
+        self.assertEqual([r[7] for r in rows], [14, 1, 2])
+
+    def test_rows_not_yet_exported_are_held_back_loudly(self):
+        export_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, export_dir)
+        for module, name, value in ((archive, 'REQUIRE_EXPORT', True), (analytics, 'EXPORT_DIR', export_dir),
+                                    (analytics, 'WATERMARK_PATH', os.path.join(export_dir, '_watermark.json'))):
+            patcher = mock.patch.object(module, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        # The export has never run: nothing may be archived, and the command says so
+        self.assertEqual(archive.held_back(self.cutoff), 13)
+        with self.assertRaisesMessage(CommandError, '13 rows older than'):
+            call_command('archive_history', stdout=io.StringIO())
+        self.assertEqual(History.objects.count(), 17)
+
+        analytics._write_watermark(History.objects.order_by('recordNo')[5].recordNo)
+        self.assertEqual(archive.archive_before(self.cutoff), 6)
+        self.assertEqual(archive.held_back(self.cutoff), 7)
+
+    def test_interrupted_batch_is_finished_without_duplicates(self):
+        with mock.patch.object(archive, '_delete_archived', side_effect=RuntimeError('crash')):
+            with self.assertRaises(RuntimeError):
+                archive.archive_before(self.cutoff, batch_size=5)
+        self.assertTrue(os.path.exists(archive.PENDING_PATH))
+        # The files are in place but their rows are still in the table
+        self.assertEqual(History.objects.count(), 17)
+
+        self.assertEqual(archive.archive_before(self.cutoff, batch_size=5), 8)
+        self.assertFalse(os.path.exists(archive.PENDING_PATH))
+        record_nos = [r[0] for r in archive.archived_rows()]
+        self.assertEqual(len(record_nos), 13)
+        self.assertEqual(len(set(record_nos)), 13)
+        self.assertEqual(archive.disease_counts(self.account.AcNo), self.counts)
+
+
+# ------------------------------- EDGE BATCH SYNC -------------------------------
+@override_settings(CACHES=LOCMEM_CACHES)
+class SubmitBatchTests(TestCase):
+    def setUp(self):
+        self.account = Account.objects.create(name='a', password='x')
+
+    def submit(self, records):
+        response = self.client.post('/api/submit_batch/', json.dumps({
+            'account_acno': self.account.AcNo, 'records': records,
+        }), content_type='application/json')
+        return response.status_code, response.json()
+
+    def record(self, uid, **fields):
+        return {'uid': uid, 'crop_type': 'Rice', 'disease': 'Blight', 'temperature': '30.5',
+                'captured_at': '2026-01-02T03:04:05Z', **fields}
+
+    def test_resending_a_batch_is_a_no_op(self):
+        records = [self.record('a'), self.record('b', lat=23.8, lon=90.4)]
+        with self.captureOnCommitCallbacks(execute=True):
+            status, body = self.submit(records)
+        self.assertEqual(status, 201)
+        self.assertEqual((body['inserted'], body['duplicates'], body['synced_uids']), (2, 0, ['a', 'b']))
+        self.assertTrue(Job.objects.filter(name='geocode_history').exists())
+
+        status, body = self.submit(records + [self.record('a')])
+        self.assertEqual((body['inserted'], body['duplicates'], body['synced_uids']), (0, 2, ['a', 'b']))
+        self.assertEqual(History.objects.count(), 2)
+
+    def test_photo_time_is_captured_at_and_record_date_is_insert_time(self):
+        before = timezone.now()
+        self.submit([self.record('a')])
+        row = History.objects.get(edge_uid='a')
+        self.assertEqual(row.captured_at, datetime(2026, 1, 2, 3, 4, 5, tzinfo=dt_timezone.utc))
+        self.assertGreaterEqual(row.record_date, before)
+
+    def test_invalid_records_are_rejected_not_synced(self):
+        status, body = self.submit([
+            self.record('ok'),
+            self.record('long', disease='x' * 51),
+            self.record('hot', temperature='12345.5'),
+        ])
+        self.assertEqual(status, 201)
+        self.assertEqual(body['synced_uids'], ['ok'])
+        self.assertEqual(set(body['rejected']), {'long', 'hot'})
+        self.assertIn('disease', body['rejected']['long'])
+        self.assertEqual(list(History.objects.values_list('edge_uid', flat=True)), ['ok'])
+
+    def test_unknown_account_and_oversized_batches_are_refused(self):
+        self.account.AcNo += 1000
+        self.assertEqual(self.submit([self.record('a')])[0], 400)
+        with override_settings(EDGE_SYNC_MAX_RECORDS=1):
+            self.assertEqual(self.submit([self.record('a'), self.record('b')])[0], 413)
@@ -4,7 +4,17 @@ from .models import Account,History
 from django.views.decorators.csrf import csrf_exempt    
 import json
 from django.contrib.auth.hashers import make_password, check_password
-from geopy.geocoders import Nominatim
+from .jobs import enqueue_on_commit
+from .tasks import enqueue_scan_followups
+from .http_cache import cached_response, invalidate
+from .serializers import HISTORY_COLUMNS, FastJsonResponse, ndjson_response, rows_to_dicts, wants_ndjson
+from .archive import disease_counts, history_queryset, history_rows, iter_history_rows
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils import timezone
+from django.conf import settings
+from django.db import transaction
+from django.core.exceptions import ValidationError
+from datetime import datetime, time
 from collections import Counter
 
 def hello(request):
@@ -79,72 +89,27 @@ def login(request):
 
         except Exception as e:
             return JsonResponse({'message': 'Invalid data format', 'error': str(e)}, status=400)
-def getLocation(lat,lon):
-    try:
-       
-        geolocator=Nominatim(user_agent="smart_cropcare_app_v1")
-        location= geolocator.reverse((lat, lon),language='en',timeout=5)
-        
-        if location:
-            address= location.raw.get('address', {})
-            city =address.get('city') or address.get('town') or address.get('village','')
-            state =address.get('state','')
-            country =address.get('country','')
-            
-            #  "Mirpur, Dhaka, Bangladesh"
-            parts = [p for p in [city, state, country] if p]
-            return ", ".join(parts) # loc,loc2,country
-            
-    except Exception as e:
-        print(f"Geocoding error: {e}")
-    
-    return None
-    
-    
-
 @csrf_exempt
 def save_history(request):
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
-            
-          
-            print("\n" + "="*40)
-            
-            print(f" AcNo: {data.get('account_acno')}")
-            print(f"Crop: {data.get('crop_type')}")
-            print(f"Disease: {data.get('disease')}")
-            print(f"Coordinates: {data.get('lat')}, {data.get('lon')}")
-            print("="*40 + "\n")
-    
+
             account_acno = data.get('account_acno')
             crop_type = data.get('crop_type')
             disease = data.get('disease')
             temperature = data.get('temperature')
             humidity = data.get('humidity')
+            scan_id = data.get('scan_id')
             
            
             lat = data.get('lat')
             lon = data.get('lon')
             location_val = data.get('location') 
 
-            if lat and lon:
-                try:
-                   
-                    generated_name = getLocation(float(lat), float(lon))
-                    if generated_name:
-                        location_val = generated_name
-                        print(f"✅ Address Found: {location_val}") # Debug
-                    else:
-                        print("⚠️ Could not resolve address from coordinates.")
-                except ValueError:
-                    print("⚠️ Invalid coordinate format.")
-
-      
             try:
                 account = Account.objects.get(AcNo=account_acno)
             except Account.DoesNotExist:
-                print(f"Account {account_acno} not found!") # Debug
                 return JsonResponse({'message': 'Account does not exist'}, status=400)
 
 
@@ -154,15 +119,32 @@ def save_history(request):
                 disease=disease,
                 temperature=temperature,
                 humidity=humidity,
-                location=location_val
+                location=location_val,
+                scan_id=scan_id
             )
             history_record.save()
-            
-            print(f"💾 SAVED SUCCESS! Record No: {history_record.recordNo}") # Debug
+            invalidate('history', f'account:{account.AcNo}')
+
+            # Geocoding, stats and outbreak checks run on the job workers
+            record_no = history_record.recordNo
+            geocoding = False
+            if lat and lon:
+                try:
+                    lat, lon = float(lat), float(lon)
+                    geocoding = True
+                except ValueError:
+                    print("⚠️ Invalid coordinate format.")
+
+            if geocoding:
+                enqueue_on_commit('geocode_history', {'record_no': record_no, 'lat': lat, 'lon': lon},
+                                  idempotency_key=f'geocode:{record_no}')
+            else:
+                enqueue_scan_followups(record_no)
 
             return JsonResponse({
                 'message': 'History record saved successfully', 
                 'location_saved': location_val,
+                'location_pending': geocoding,
                 'recordNo': history_record.recordNo
             }, status=201)
 
@@ -174,6 +156,105 @@ def save_history(request):
 
 
 @csrf_exempt
+def save_history_batch(request):
+    """
+    Bulk insert of scans queued on an offline edge device (ml/edge).
+
+    Every record carries the device's `uid`; records whose uid is already
+    stored are skipped, so a device can safely resend a batch after a
+    dropped connection. Records that fail validation are listed in
+    `rejected` and never inserted. `synced_uids` holds only uids confirmed
+    stored by reading them back, since INSERT IGNORE can drop rows silently.
+    The photo time goes to `captured_at`; `record_date` is the insert time.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    try:
+        data = json.loads(request.body)
+        records = data.get('records') or []
+        max_records = getattr(settings, 'EDGE_SYNC_MAX_RECORDS', 500)
+        if len(records) > max_records:
+            return JsonResponse({'message': f'At most {max_records} records per batch'}, status=413)
+
+        try:
+            account = Account.objects.get(AcNo=data.get('account_acno'))
+        except Account.DoesNotExist:
+            return JsonResponse({'message': 'Account does not exist'}, status=400)
+
+        uids = [r['uid'] for r in records]
+        existing = set(History.objects.filter(edge_uid__in=uids).values_list('edge_uid', flat=True))
+
+        new_rows, coords, rejected = [], {}, {}
+        seen = set(existing)
+        for r in records:
+            if r['uid'] in seen:
+                continue
+            seen.add(r['uid'])
+            captured_at = parse_datetime(r['captured_at']) if r.get('captured_at') else None
+            row = History(
+                account_acno=account,
+                crop_type=r.get('crop_type') or '',
+                disease=r['disease'],
+                temperature=r.get('temperature'),
+                humidity=r.get('humidity'),
+                location=r.get('location'),
+                captured_at=captured_at,
+                edge_uid=r['uid'],
+            )
+            try:
+                # MySQL's INSERT IGNORE would truncate or drop bad values without an error
+                row.full_clean(exclude=['account_acno'], validate_unique=False, validate_constraints=False)
+            except ValidationError as e:
+                rejected[r['uid']] = '; '.join(f'{field}: {" ".join(errors)}' for field, errors in e.message_dict.items())
+                continue
+            new_rows.append(row)
+            if r.get('lat') is not None and r.get('lon') is not None:
+                coords[r['uid']] = (float(r['lat']), float(r['lon']))
+
+        with transaction.atomic():
+            # ignore_conflicts covers a concurrent resend of the same batch
+            History.objects.bulk_create(new_rows, batch_size=200, ignore_conflicts=True)
+
+            # bulk_create can't return pks with ignore_conflicts on MySQL, so read them back
+            inserted = list(
+                History.objects.filter(edge_uid__in=[h.edge_uid for h in new_rows]).values_list('recordNo', 'edge_uid')
+            )
+            for record_no, uid in inserted:
+                if uid in coords:
+                    lat, lon = coords[uid]
+                    enqueue_on_commit('geocode_history', {'record_no': record_no, 'lat': lat, 'lon': lon},
+                                      idempotency_key=f'geocode:{record_no}')
+                else:
+                    enqueue_scan_followups(record_no)
+
+        if inserted:
+            invalidate('history', f'account:{account.AcNo}')
+
+        # Only what is really in the table; the device retries everything else
+        synced_uids = existing | {uid for _, uid in inserted}
+        return JsonResponse({
+            'message': 'Batch saved',
+            'inserted': len(inserted),
+            'duplicates': len(existing),
+            'rejected': rejected,
+            'synced_uids': [uid for uid in dict.fromkeys(uids) if uid in synced_uids],
+        }, status=201)
+
+    except (KeyError, TypeError, ValueError) as e:
+        return JsonResponse({'message': 'Invalid data format', 'error': str(e)}, status=400)
+
+
+def _parse_when(value):
+    """Accept an ISO date or datetime from a query string; naive values are local time."""
+    if not value:
+        return None
+    when = parse_datetime(value) or datetime.combine(parse_date(value), time.min)
+    return when if timezone.is_aware(when) else timezone.make_aware(when)
+
+
+@csrf_exempt
+@cached_response('history_list', tags=['history'])
 def get_history(request):
     
   if request.method=="GET":
@@ -181,26 +262,22 @@ def get_history(request):
         limit = int(request.GET.get('limit', 100))
         offset = int(request.GET.get('offset', 0))
         
-        histories = History.objects.all().order_by('-record_date')[offset:offset+limit]
-        
-        data=[]
-        
-        for h in histories:
-            data.append(
-                {
-                    'recordNo':h.recordNo,
-                    'disease':h.disease,
-                    'crop_type':h.crop_type,
-                    'temperature':h.temperature,
-                    'humidity':h.humidity,
-                    'location':h.location,
-                    'date':h.record_date,
-                    
-                }
-            )
-        
-        
-        return JsonResponse({'message':'History fetched successfully', 'data':data},safe=False, status=200)
+        # Resolve the similar_cases returned by /api/predict
+        scan_ids = request.GET.get('scan_ids')
+        filters = {
+            'scan_ids': [int(s) for s in scan_ids.split(',')] if scan_ids else None,
+            'since': _parse_when(request.GET.get('since')),
+            'until': _parse_when(request.GET.get('until')),
+        }
+
+        # Large exports: stream one JSON object per line instead of one big array
+        if wants_ndjson(request):
+            return ndjson_response(iter_history_rows(offset, limit, **filters))
+
+        # Pages past the end of the hot table continue into the archive
+        rows = history_rows(offset, limit, **filters)
+
+        return FastJsonResponse({'message':'History fetched successfully', 'data':rows_to_dicts(rows)}, status=200)
     
     except Exception as e:
         return JsonResponse({'message':'Error fetching history', 'error': str(e)}, status=400)
@@ -212,48 +289,32 @@ def get_history(request):
 
 
 @csrf_exempt
+@cached_response('me', tags=lambda request: [f"account:{request.GET.get('acNo')}", 'archive'])
 def user_Auth(request):
     if request.method == "GET":
         try:
             acNo = request.GET.get('acNo')
-            if acNo:
-             
-                histories = History.objects.filter(account_acno__AcNo=acNo).order_by('-record_date')
-            else:
+            if not acNo:
                 return JsonResponse({'message': 'acNo parameter is required'}, status=400)
             
-            data = []
-            disease_list = [] 
-            
-            for h in histories:
- 
-                if h.disease:
-                    disease_list.append(h.disease)
-
-                data.append({
-                    'recordNo': h.recordNo,
-                    'disease': h.disease,
-                    'crop_type': h.crop_type,
-                    'temperature': h.temperature,
-                    'humidity': h.humidity,
-                    'location': h.location,
-                    'date': h.record_date,
-                })
-            
-            scanCnt = len(data)
+            # Totals cover archived scans too, from the per-account counts
+            counts = disease_counts(int(acNo))
+            scanCnt = sum(counts.values())
             mostSeenDisease = None
-        
-            if disease_list:
-                most_counted = Counter(disease_list).most_common(1)
-                if most_counted:
-                    mostSeenDisease = most_counted[0][0]
 
-            return JsonResponse({
+            most_counted = Counter({d: n for d, n in counts.items() if d}).most_common(1)
+            if most_counted:
+                mostSeenDisease = most_counted[0][0]
+
+            # Recent (hot) scans only; older ones are paged in through /api/history_list/
+            data = rows_to_dicts(history_queryset(acno=int(acNo)).values_list(*HISTORY_COLUMNS))
+
+            return FastJsonResponse({
                 'message': 'User info fetched successfully', 
                 'scan_count': scanCnt, 
                 'most_seen_disease': mostSeenDisease, 
                 'data': data
-            }, safe=False, status=200)
+            }, status=200)
 
         except Exception as e:
 
@@ -262,6 +323,7 @@ def user_Auth(request):
         return JsonResponse({'error': 'Method not allowed'}, status=405)
             
 @csrf_exempt
+@cached_response('regional_alerts', tags=['alerts'])
 def regional_alerts(request):
     """
     Endpoint: /api/regional_alerts/
@@ -0,0 +1,42 @@
+"""
+Worker process entry point for `manage.py run_workers`.
+
+Kept free of model imports at module level so it can be the target of a
+spawned process (the default on macOS), which has to set up Django itself.
+"""
+import os
+import signal
+import time
+
+
+def work(poll_interval=1.0, burst=False):
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+
+    from django.db import close_old_connections
+    from . import jobs
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    print(f"👷 Worker {os.getpid()} started")
+    while not stopping:
+        close_old_connections()
+        job = jobs.claim()
+        if job is None:
+            if burst:
+                break
+            time.sleep(poll_interval)
+            continue
+        jobs.run(job)
+
+    print(f"👷 Worker {os.getpid()} stopped")
@@ -0,0 +1,173 @@
+"""
+Admission control for the inference endpoint.
+
+Requests are first checked against a per-client token bucket (429 when
+empty), then admitted into a bounded priority queue served by a single
+inference thread (503 when the queue is full or the estimated wait is
+already past the deadline). Interactive scans are always dequeued ahead
+of bulk uploads, and bulk requests may only fill part of the queue so
+they can never crowd interactive traffic out.
+
+Both rejections carry a Retry-After so clients back off instead of
+piling more work onto an overloaded server.
+"""
+import asyncio
+import itertools
+import math
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+INTERACTIVE = 0
+BULK = 1
+LANES = {"interactive": INTERACTIVE, "bulk": BULK}
+
+# Job kinds whose service times are tracked separately
+PREDICT = "predict"
+
+
+class Rejected(Exception):
+    """Raised when a request is not admitted. Maps directly onto an HTTP response."""
+
+    def __init__(self, status_code, retry_after, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.detail = detail
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, cost=1.0):
+        """Spend `cost` tokens. Returns 0 on success, else seconds until they are available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Token bucket per client key, keeping only the most recently seen clients."""
+
+    def __init__(self, per_minute, burst, max_clients=10000):
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self.max_clients = max_clients
+        self.buckets = OrderedDict()
+
+    def check(self, client, cost=1.0):
+        bucket = self.buckets.pop(client, None) or TokenBucket(self.rate, self.burst)
+        self.buckets[client] = bucket
+        if len(self.buckets) > self.max_clients:
+            self.buckets.popitem(last=False)
+
+        wait = bucket.take(cost)
+        if wait:
+            raise Rejected(429, wait, "Rate limit exceeded, slow down")
+
+
+class AdmissionQueue:
+    """
+    Bounded two-lane queue in front of a single inference thread.
+
+    `submit(lane, fn, *args, kind=...)` runs fn(*args) on the inference
+    thread and returns its result. Jobs that waited longer than `max_wait`
+    are dropped unrun, since their client has most likely given up already.
+
+    Service time is smoothed per job kind, so a few slow batched Grad-CAM
+    jobs don't make every plain prediction look slow; the wait estimate
+    adds up the jobs actually queued ahead at their own kind's cost.
+    """
+
+    def __init__(self, max_size=32, bulk_max_size=8, max_wait=10.0):
+        self.max_size = max_size
+        self.bulk_max_size = bulk_max_size
+        self.max_wait = max_wait
+
+        self.queue = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+        self.worker = None
+        self.order = itertools.count()
+        self.depth = [0, 0]
+        # Waiting jobs by (lane, kind)
+        self.queued = Counter()
+
+        # Smoothed seconds per job by kind, used to estimate the wait of a new request
+        self.service_time = {PREDICT: 0.2}
+
+    def start(self):
+        self.queue = asyncio.PriorityQueue()
+        self.worker = asyncio.create_task(self._work())
+
+    async def stop(self):
+        if self.worker is not None:
+            self.worker.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    @property
+    def size(self):
+        return sum(self.depth)
+
+    def job_time(self, kind=PREDICT):
+        """Smoothed seconds per `kind` job (the predict estimate until that kind has run)."""
+        return self.service_time.get(kind, self.service_time[PREDICT])
+
+    def estimated_wait(self, lane=INTERACTIVE, kind=PREDICT):
+        # Bulk jobs queue behind everything; interactive ones only behind interactive ones
+        lanes = (INTERACTIVE, BULK) if lane == BULK else (INTERACTIVE,)
+        ahead = sum(n * self.job_time(k) for (l, k), n in self.queued.items() if l in lanes)
+        return ahead + self.job_time(kind)
+
+    def admit(self, lane, kind=PREDICT):
+        """Raise Rejected if a new `kind` job in `lane` would not be served in time."""
+        if self.size >= self.max_size or (lane == BULK and self.depth[BULK] >= self.bulk_max_size):
+            raise Rejected(503, self.estimated_wait(BULK), "Server busy, queue is full")
+
+        wait = self.estimated_wait(lane, kind)
+        if wait > self.max_wait:
+            raise Rejected(503, wait, "Server busy, try again later")
+
+    async def submit(self, lane, fn, *args, kind=PREDICT):
+        self.admit(lane, kind)
+
+        future = asyncio.get_running_loop().create_future()
+        self.depth[lane] += 1
+        self.queued[lane, kind] += 1
+        await self.queue.put((lane, next(self.order), time.monotonic(), future, fn, args, kind))
+        return await future
+
+    async def _work(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            lane, _, enqueued, future, fn, args, kind = await self.queue.get()
+            self.depth[lane] -= 1
+            self.queued[lane, kind] -= 1
+
+            if future.cancelled():
+                continue
+            if time.monotonic() - enqueued > self.max_wait:
+                future.set_exception(Rejected(503, self.estimated_wait(lane), "Request expired in queue"))
+                continue
+
+            started = time.monotonic()
+            try:
+                result = await loop.run_in_executor(self.executor, fn, *args)
+            except Exception as e:
+                if not future.cancelled():
+                    future.set_exception(e)
+            else:
+                if not future.cancelled():
+                    future.set_result(result)
+            finally:
+                elapsed = time.monotonic() - started
+                previous = self.service_time.get(kind)
+                self.service_time[kind] = elapsed if previous is None else 0.8 * previous + 0.2 * elapsed
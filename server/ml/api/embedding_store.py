@@ -0,0 +1,200 @@
+import os
+import json
+import time
+import threading
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+
+META_DTYPE = np.dtype([("label", "<i2"), ("created", "<f8")])
+
+# Scan ids handed out per model; stays below 2**53 so JavaScript clients read them exactly
+ID_BLOCK = 1 << 40
+ID_BLOCKS_FILE = "id_blocks.json"
+
+
+def scan_id_base(root, name):
+    """
+    First scan id of the store for model `name` under `root`.
+
+    Each model gets its own block of ID_BLOCK ids, recorded in
+    root/id_blocks.json the first time the model is seen, so the
+    History.scan_id values of different models never collide when
+    serving.model changes. The first model registered gets block 0,
+    which keeps the ids of a store created before blocks existed.
+    """
+    path = os.path.join(root, ID_BLOCKS_FILE)
+    blocks = {}
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            blocks = json.load(f)
+
+    if name not in blocks:
+        blocks[name] = max(blocks.values(), default=-1) + 1
+        os.makedirs(root, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(blocks, f, indent=4)
+        os.replace(tmp_path, path)
+
+    return blocks[name] * ID_BLOCK
+
+
+class EmbeddingStore:
+    """
+    Append-only store of L2-normalised scan embeddings with k-NN lookup.
+
+    Layout of `directory`:
+      vectors.f32  - float32 matrix (capacity x dim), memory-mapped
+      meta.bin     - per-row predicted label and insert time, memory-mapped
+      state.json   - dim, row count, capacity and id base
+      hnsw.bin     - HNSW graph (only when hnswlib is installed)
+
+    A scan id is `id_base` plus the row number (see scan_id_base); Django
+    stores it on History.scan_id.
+    Without hnswlib, queries fall back to a brute-force dot product over the
+    memory-mapped matrix, which stays under the 10 ms query budget up to a
+    few tens of thousands of 1280-d vectors (~90 ms at 200k), not a million.
+    """
+
+    def __init__(self, directory, dim, id_base=0, initial_capacity=4096, ef=64, save_every=256):
+        self.directory = directory
+        self.dim = dim
+        self.id_base = id_base
+        self.save_every = save_every
+        self._lock = threading.Lock()
+        self._unsaved = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._state_path = os.path.join(directory, "state.json")
+        self._index_path = os.path.join(directory, "hnsw.bin")
+
+        vectors_path = os.path.join(directory, "vectors.f32")
+        if os.path.exists(self._state_path):
+            with open(self._state_path, "r") as f:
+                state = json.load(f)
+            if state["dim"] != dim:
+                raise ValueError(f"Store at {directory} has dim {state['dim']}, model gives {dim}")
+            if state.get("id_base", id_base) != id_base:
+                raise ValueError(f"Store at {directory} has id base {state['id_base']}, expected {id_base}")
+            # The files are the source of truth; state.json may lag after a crash
+            self.count = state["count"]
+            self.capacity = os.path.getsize(vectors_path) // (4 * dim)
+        else:
+            self.count, self.capacity = 0, initial_capacity
+
+        self._open_maps()
+
+        # Rows inserted after the last state save still have an insert time
+        unsaved = np.flatnonzero(self.meta["created"][self.count:] == 0)
+        self.count += int(unsaved[0]) if len(unsaved) else self.capacity - self.count
+
+        self.index = None
+        if hnswlib is not None:
+            self.index = hnswlib.Index(space="ip", dim=dim)
+            if os.path.exists(self._index_path):
+                self.index.load_index(self._index_path, max_elements=self.capacity)
+            else:
+                self.index.init_index(max_elements=self.capacity, ef_construction=200, M=16)
+            self.index.set_ef(ef)
+
+            # Rows written after the last index save (e.g. after a crash)
+            indexed = self.index.get_current_count()
+            if indexed < self.count:
+                self.index.add_items(self.vectors[indexed:self.count], np.arange(indexed, self.count))
+
+    def __len__(self):
+        return self.count
+
+    def _open_maps(self):
+        mode = "r+" if os.path.exists(os.path.join(self.directory, "vectors.f32")) else "w+"
+        self.vectors = np.memmap(
+            os.path.join(self.directory, "vectors.f32"),
+            dtype=np.float32, mode=mode, shape=(self.capacity, self.dim)
+        )
+        self.meta = np.memmap(
+            os.path.join(self.directory, "meta.bin"),
+            dtype=META_DTYPE, mode=mode, shape=(self.capacity,)
+        )
+
+    def _grow(self):
+        self.vectors.flush()
+        self.meta.flush()
+        del self.vectors, self.meta
+
+        self.capacity *= 2
+        for name, itemsize in (("vectors.f32", 4 * self.dim), ("meta.bin", META_DTYPE.itemsize)):
+            with open(os.path.join(self.directory, name), "r+b") as f:
+                f.truncate(self.capacity * itemsize)
+
+        self._open_maps()
+        if self.index is not None:
+            self.index.resize_index(self.capacity)
+
+    @staticmethod
+    def _normalise(vectors):
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def add(self, vector, label):
+        """Insert one embedding and return its scan id."""
+        vector = self._normalise(vector)
+
+        with self._lock:
+            if self.count == self.capacity:
+                self._grow()
+
+            row = self.count
+            self.vectors[row] = vector[0]
+            self.meta[row] = (label, time.time())
+            self.count += 1
+
+            if self.index is not None:
+                self.index.add_items(vector, np.array([row]))
+
+            self._unsaved += 1
+            if self._unsaved >= self.save_every:
+                self._save()
+
+        return self.id_base + row
+
+    def query(self, vector, k=5):
+        """Return [(scan_id, cosine_similarity, label)] for the k nearest scans."""
+        vector = self._normalise(vector)
+
+        with self._lock:
+            k = min(k, self.count)
+            if k == 0:
+                return []
+
+            if self.index is not None:
+                ids, distances = self.index.knn_query(vector, k=k)
+                ids, sims = ids[0], 1.0 - distances[0]
+            else:
+                sims = self.vectors[:self.count] @ vector[0]
+                ids = np.argpartition(-sims, k - 1)[:k]
+                ids = ids[np.argsort(-sims[ids])]
+                sims = sims[ids]
+
+            labels = self.meta["label"][ids]
+
+        return [(self.id_base + int(i), float(s), int(l)) for i, s, l in zip(ids, sims, labels)]
+
+    def _save(self):
+        self.vectors.flush()
+        self.meta.flush()
+        if self.index is not None:
+            self.index.save_index(self._index_path)
+
+        with open(self._state_path, "w") as f:
+            json.dump({"dim": self.dim, "count": self.count, "capacity": self.capacity, "id_base": self.id_base}, f)
+        self._unsaved = 0
+
+    def save(self):
+        with self._lock:
+            self._save()
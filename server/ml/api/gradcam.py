@@ -0,0 +1,149 @@
+"""
+Grad-CAM explanations for /api/predict?explain.
+
+`GradCam` runs one forward pass that returns the last conv block's
+activations, the pooled features and the predictions together, so the
+heatmap costs a backward pass on top of the normal prediction and nothing
+else. Explain requests are grouped by `ExplainBatcher` and results are
+kept in an LRU keyed by the upload's sha256.
+"""
+import asyncio
+import base64
+import io
+from collections import OrderedDict
+
+import numpy as np
+import tensorflow as tf
+from PIL import Image
+
+
+def last_conv_layer(model):
+    """MobileNetV2's final activation ("out_relu"), else the last layer with a spatial output."""
+    try:
+        return model.get_layer("out_relu")
+    except ValueError:
+        pass
+    for layer in reversed(model.layers):
+        if len(layer.output.shape) == 4:
+            return layer
+    raise ValueError("Model has no convolutional feature map to explain")
+
+
+class GradCam:
+    """
+    The gradient target is the chosen class's pre-softmax logit, rebuilt
+    from the pooled features and the softmax Dense head (dropout is a no-op
+    at inference). The softmax probability saturates near 1 for confident
+    predictions, which leaves almost no gradient and a noisy map.
+    """
+
+    def __init__(self, model):
+        pooling = [l for l in model.layers if isinstance(l, tf.keras.layers.GlobalAveragePooling2D)]
+        self.head = [l for l in model.layers if isinstance(l, tf.keras.layers.Dense)][-1]
+        outputs = [last_conv_layer(model).output, pooling[-1].output, model.output]
+        self.grad_model = tf.keras.Model(inputs=model.input, outputs=outputs)
+
+    def explain(self, batch, choose_class):
+        """
+        Returns (pooled, preds, class_ids, cams) for a batch. `choose_class`
+        maps one row of predictions to the class to explain, so the heatmap
+        is for the same class the response reports. cams are in [0, 1].
+        """
+        batch = tf.convert_to_tensor(batch, dtype=tf.float32)
+        with tf.GradientTape() as tape:
+            conv, pooled, preds = self.grad_model(batch, training=False)
+            class_ids = [choose_class(row) for row in preds.numpy()]
+            logits = tf.matmul(pooled, self.head.kernel) + self.head.bias
+            # Samples are independent at inference, so one gradient of the sum
+            # gives every sample's gradient w.r.t. its own feature map
+            target = tf.reduce_sum(tf.gather(logits, class_ids, axis=1, batch_dims=1))
+
+        grads = tape.gradient(target, conv)
+        weights = tf.reduce_mean(grads, axis=(1, 2), keepdims=True)
+        cams = tf.nn.relu(tf.reduce_sum(conv * weights, axis=-1)).numpy()
+
+        peak = cams.max(axis=(1, 2), keepdims=True)
+        cams = np.divide(cams, peak, out=np.zeros_like(cams), where=peak > 0)
+        return pooled.numpy(), preds.numpy(), class_ids, cams
+
+
+def encode_overlay(cam, size, quality=80):
+    """
+    Heatmap as a JPEG data URL: white where the model isn't looking, through
+    orange to red where it is, so it can be multiply-blended over the photo.
+    `size` is the model's (height, width).
+    """
+    heat = np.asarray(Image.fromarray(np.uint8(cam * 255)).resize(size[::-1], Image.BILINEAR), dtype=np.float32) / 255
+    rgb = np.stack([
+        np.full_like(heat, 255),
+        255 * (1 - heat),
+        255 * (1 - np.minimum(1, 2 * heat)),
+    ], axis=-1).astype(np.uint8)
+
+    buffer = io.BytesIO()
+    Image.fromarray(rgb).save(buffer, format="JPEG", quality=quality)
+    return "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+class LRUCache:
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.items = OrderedDict()
+
+    def get(self, key):
+        if key not in self.items:
+            return None
+        self.items.move_to_end(key)
+        return self.items[key]
+
+    def put(self, key, value):
+        self.items[key] = value
+        self.items.move_to_end(key)
+        if len(self.items) > self.max_size:
+            self.items.popitem(last=False)
+
+
+class ExplainBatcher:
+    """
+    Collects explain requests for up to `max_delay` seconds (or until
+    `max_batch` are waiting) and hands them to `run(items)` as one batch.
+    `run` is a coroutine returning one result per item.
+    """
+
+    def __init__(self, run, max_batch=8, max_delay=0.02):
+        self.run = run
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.pending = []
+        self.timer = None
+
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((item, future))
+
+        if len(self.pending) >= self.max_batch:
+            self._flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(self.max_delay, self._flush)
+        return await future
+
+    def _flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        if batch:
+            asyncio.create_task(self._run(batch))
+
+    async def _run(self, batch):
+        try:
+            results = await self.run([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,76 @@
+"""
+Load-aware tier selection for the inference endpoint.
+
+Requests are served by the full model unless the admission queue is
+deeper than `max_depth` or the recent p95 latency of full-tier requests
+is above the SLO, in which case they go to the smaller fallback model.
+Latency samples expire after `window_seconds`, so once the full tier
+stops being used its stale p95 can't keep the server degraded forever.
+"""
+import time
+from collections import Counter, deque
+
+import numpy as np
+
+FULL = "full"
+FALLBACK = "fallback"
+
+
+class LoadRouter:
+    def __init__(self, queue, max_depth=8, latency_slo=0.8, window_seconds=30, fallback_available=True):
+        self.queue = queue
+        self.max_depth = max_depth
+        self.latency_slo = latency_slo
+        self.window_seconds = window_seconds
+        self.fallback_available = fallback_available
+
+        self.samples = deque(maxlen=1000)  # (finished_at, seconds) of full-tier requests
+        self.served = Counter()
+        self.degraded = Counter()
+        self.rejected = Counter()
+
+    def p95(self):
+        cutoff = time.monotonic() - self.window_seconds
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+        if not self.samples:
+            return None
+        return float(np.percentile([s for _, s in self.samples], 95))
+
+    def choose(self):
+        """Tier for a new request."""
+        if not self.fallback_available:
+            return FULL
+
+        if self.queue.size >= self.max_depth:
+            self.degraded["queue_depth"] += 1
+            return FALLBACK
+
+        p95 = self.p95()
+        if p95 is not None and p95 > self.latency_slo:
+            self.degraded["latency"] += 1
+            return FALLBACK
+
+        return FULL
+
+    def record(self, tier, seconds):
+        self.served[tier] += 1
+        if tier == FULL:
+            self.samples.append((time.monotonic(), seconds))
+
+    def reject(self, status_code):
+        self.rejected[status_code] += 1
+
+    def metrics(self):
+        total = sum(self.served.values())
+        p95 = self.p95()
+        return {
+            "served": {FULL: self.served[FULL], FALLBACK: self.served[FALLBACK]},
+            "degraded": dict(self.degraded),
+            "degraded_ratio": self.served[FALLBACK] / total if total else 0.0,
+            "rejected": {str(k): v for k, v in self.rejected.items()},
+            "queue_depth": self.queue.size,
+            "full_p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "latency_slo_ms": round(self.latency_slo * 1000, 1),
+            "fallback_available": self.fallback_available,
+        }
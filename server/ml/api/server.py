@@ -1,12 +1,25 @@
-from fastapi import FastAPI, UploadFile, File, Form
+from fastapi import FastAPI, UploadFile, File, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 import tensorflow as tf
 import numpy as np
 from PIL import Image
 import os
+import sys
 import uvicorn
-import json
-from tensorflow.keras.applications.mobilenet_v2 import preprocess_input
+import gzip
+import shutil
+import tempfile
+import time
+import hashlib
+import io
+from collections import Counter
+
+from admission import LANES, PREDICT, AdmissionQueue, RateLimiter, Rejected
+from embedding_store import EmbeddingStore, scan_id_base
+from gradcam import ExplainBatcher, GradCam, LRUCache, encode_overlay
+from router import FALLBACK, FULL, LoadRouter
 
 app = FastAPI()
 
@@ -24,86 +37,409 @@ app.add_middleware(
 )
 
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
-MODEL_PATH = os.path.join(BASE_DIR, "model/plant_disease_model.h5")
-CLASS_MAP_PATH = os.path.join(BASE_DIR, "model/class_indices.json")
+
+# Shared numpy-only helpers from ml/src
+sys.path.insert(0, os.path.join(BASE_DIR, "src"))
+from calibration import Calibration
+from runtime_config import load_runtime_config
+
+# config.yaml + class_indices.json, parsed and cross-checked once.
+# Raises (and the server doesn't start) if they disagree.
+RUNTIME = load_runtime_config()
+for warning in RUNTIME.warnings:
+    print(f"⚠ {warning}")
+
+# Pick the serving model (teacher or a distilled student) from config.yaml
+SERVING_MODEL = RUNTIME.serving_model
+MODEL_SPEC = RUNTIME.serving
+MODEL_PATH = MODEL_SPEC.path
+IMG_SIZE = MODEL_SPEC.img_size  # (height, width)
+
+class TFLiteModel:
+    """predict()-compatible wrapper around a TFLite interpreter."""
+
+    def __init__(self, path):
+        self.interpreter = tf.lite.Interpreter(model_path=path, num_threads=os.cpu_count())
+        self.interpreter.allocate_tensors()
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+
+    def predict(self, batch, verbose=0):
+        batch = np.asarray(batch, dtype=np.float32)
+        if batch.shape[0] != self.input["shape"][0]:
+            self.interpreter.resize_tensor_input(self.input["index"], batch.shape)
+            self.interpreter.allocate_tensors()
+            self.input = self.interpreter.get_input_details()[0]
+            self.output = self.interpreter.get_output_details()[0]
+
+        self.interpreter.set_tensor(self.input["index"], batch)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self.output["index"])
+
+
+def load_serving_model(path):
+    """Load a .h5/.keras model, a gzipped .h5.gz, or a .tflite export."""
+    if path.endswith(".tflite"):
+        return TFLiteModel(path)
+
+    if path.endswith(".gz"):
+        with tempfile.NamedTemporaryFile(suffix=".h5") as tmp:
+            with gzip.open(path, "rb") as src:
+                shutil.copyfileobj(src, tmp)
+            tmp.flush()
+            return tf.keras.models.load_model(tmp.name, compile=False)
+
+    return tf.keras.models.load_model(path)
+
 
 # Load model
 try:
-    model = tf.keras.models.load_model(MODEL_PATH)
-    print(f"✅ Model loaded from {MODEL_PATH}")
+    model = load_serving_model(MODEL_PATH)
+    print(f"✅ Model '{SERVING_MODEL}' loaded from {MODEL_PATH}")
 except Exception as e:
     print(f"❌ Model load error: {e}")
     model = None
 
-# Load class mapping (folder → index)
-if os.path.exists(CLASS_MAP_PATH):
-    with open(CLASS_MAP_PATH, "r") as f:
-        mapping = json.load(f)
-    INV_MAP = {int(k): v for k, v in mapping.items()}
+if model is not None and not isinstance(model, TFLiteModel):
+    RUNTIME.check_model_outputs(model.output_shape[-1])
+
+# Smaller model served under load (see `fallback` in config.yaml)
+FALLBACK_CONFIG = RUNTIME.section("fallback")
+FALLBACK_MODEL = os.environ.get("FALLBACK_MODEL", FALLBACK_CONFIG.get("model"))
+fallback_model = None
+FALLBACK_IMG_SIZE = IMG_SIZE
+
+if FALLBACK_MODEL and FALLBACK_MODEL != SERVING_MODEL:
+    fallback_spec = RUNTIME.model(FALLBACK_MODEL)
+    FALLBACK_IMG_SIZE = fallback_spec.img_size
+    try:
+        fallback_model = load_serving_model(fallback_spec.path)
+        if not isinstance(fallback_model, TFLiteModel):
+            RUNTIME.check_model_outputs(fallback_model.output_shape[-1], FALLBACK_MODEL)
+        print(f"✅ Fallback model '{FALLBACK_MODEL}' loaded")
+    except Exception as e:
+        print(f"⚠ Fallback model unavailable, serving without a degraded tier: {e}")
+
+
+# Pooled features + predictions from one forward pass (Keras models only)
+def build_feature_model(model):
+    pooling = [l for l in model.layers if isinstance(l, tf.keras.layers.GlobalAveragePooling2D)]
+    if not pooling:
+        return None
+    return tf.keras.Model(inputs=model.input, outputs=[pooling[-1].output, model.output])
+
+
+EMBEDDING_CONFIG = RUNTIME.section("embeddings")
+feature_model = None
+embedding_store = None
+
+if model is not None and not isinstance(model, TFLiteModel):
+    feature_model = build_feature_model(model)
+
+if feature_model is not None and EMBEDDING_CONFIG.get("enabled", True):
+    embedding_root = os.path.join(BASE_DIR, EMBEDDING_CONFIG.get("dir", "embeddings"))
+    embedding_store = EmbeddingStore(
+        os.path.join(embedding_root, SERVING_MODEL),
+        dim=int(feature_model.outputs[0].shape[-1]),
+        id_base=scan_id_base(embedding_root, SERVING_MODEL),
+    )
+    print(f"✅ Embedding store ready ({len(embedding_store)} scans)")
+
+# Calibrated confidence + OOD rejection. Logits are rebuilt from the pooled
+# features with the softmax layer's weights, so this needs no extra model call.
+calibration = None
+head_kernel = head_bias = None
+CALIBRATION_PATH = MODEL_SPEC.calibration
+
+if feature_model is not None and CALIBRATION_PATH:
+    if os.path.exists(CALIBRATION_PATH):
+        calibration = Calibration.load(CALIBRATION_PATH)
+        head_kernel, head_bias = [l for l in model.layers if isinstance(l, tf.keras.layers.Dense)][-1].get_weights()
+        print(f"✅ Calibration loaded (T={calibration.temperature:.3f})")
+    else:
+        print(f"⚠ No {CALIBRATION_PATH}; confidences are uncalibrated. Run train.py --calibrate-only.")
+
+
+def calibrate(pooled, preds):
+    """
+    (probabilities, energy scores, unknown flags) for a batch. Uncalibrated,
+    the raw preds come back and every flag is None: the OOD check didn't run.
+    """
+    if calibration is None:
+        return preds, [None] * len(preds), [None] * len(preds)
+    return calibration.apply(pooled @ head_kernel + head_bias)
+
+
+def ood_flag(unknown):
+    return None if unknown is None else bool(unknown)
+
+
+# Grad-CAM needs gradients, so only Keras models can explain
+gradcam = None
+if model is not None and not isinstance(model, TFLiteModel):
+    try:
+        gradcam = GradCam(model)
+    except Exception as e:
+        print(f"⚠ Grad-CAM unavailable: {e}")
+
+EXPLAIN_CONFIG = RUNTIME.section("explain")
+# Admission queue job kinds besides plain predictions, each with its own service time
+EXPLAIN_JOB = "explain"
+RECORD_JOB = "record"
+explain_cache = LRUCache(EXPLAIN_CONFIG.get("cache_size", 256))
+explain_stats = Counter()
+
+DUPLICATE_THRESHOLD = EMBEDDING_CONFIG.get("duplicate_threshold", 0.98)
+SIMILAR_K = EMBEDDING_CONFIG.get("k", 5)
+
+
+ADMISSION_CONFIG = RUNTIME.section("admission")
+rate_limiter = RateLimiter(
+    per_minute=ADMISSION_CONFIG.get("rate_per_minute", 60),
+    burst=ADMISSION_CONFIG.get("burst", 10),
+)
+TRUSTED_PROXIES = set(ADMISSION_CONFIG.get("trusted_proxies") or [])
+admission_queue = AdmissionQueue(
+    max_size=ADMISSION_CONFIG.get("queue_size", 32),
+    bulk_max_size=ADMISSION_CONFIG.get("bulk_queue_size", 8),
+    max_wait=ADMISSION_CONFIG.get("max_wait_seconds", 10),
+)
+
+
+router = LoadRouter(
+    admission_queue,
+    max_depth=FALLBACK_CONFIG.get("queue_depth", 8),
+    latency_slo=FALLBACK_CONFIG.get("latency_slo_ms", 800) / 1000,
+    window_seconds=FALLBACK_CONFIG.get("window_seconds", 30),
+    fallback_available=fallback_model is not None,
+)
 
-else:
-    print("⚠ No class_indices.json found. Labels will be None.")
-    INV_MAP = {}
 
-CROP_CLASS_GROUPS = {
-    "pepper": [0, 1],
-    "potato": [2, 3, 4],
-    "tomato": [5, 6, 7, 8, 9, 10, 11, 12, 13, 14],
-}
+@app.on_event("startup")
+def start_admission_queue():
+    admission_queue.start()
 
 
-def preprocess(img: Image.Image):
+@app.on_event("shutdown")
+async def shutdown():
+    await admission_queue.stop()
+    if embedding_store is not None:
+        embedding_store.save()
+
+
+def preprocess(img: Image.Image, size=IMG_SIZE):
     img = img.convert("RGB")
-    img = img.resize((224, 224))
-    img = np.array(img)
+    img = img.resize(size[::-1])  # PIL takes (width, height)
 
-    # IMPORTANT FIX
-    img = preprocess_input(img)
+    # Same scaling as training (preprocessing.mode in config.yaml)
+    img = RUNTIME.preprocess(img)
 
     img = np.expand_dims(img, axis=0)
     return img
 
+def decode(file, tier):
+    return preprocess(Image.open(file), FALLBACK_IMG_SIZE if tier == FALLBACK else IMG_SIZE)
+
+
+def run_model(img_array, allowed, tier):
+    """Inference and embedding bookkeeping. Only ever runs on the admission queue's thread."""
+    embedding, energy, unknown = None, None, None
+    if tier == FALLBACK:
+        # Embeddings and calibration are per model, so fallback scans get neither;
+        # unknown stays None (not checked) and clients show no diagnosis
+        preds = fallback_model.predict(img_array, verbose=0)[0]
+    elif feature_model is not None:
+        pooled, preds = feature_model.predict(img_array, verbose=0)
+        probs, energies, unknowns = calibrate(pooled, preds)
+        embedding, preds, energy, unknown = pooled[0], probs[0], energies[0], ood_flag(unknowns[0])
+    else:
+        preds = model.predict(img_array, verbose=0)[0]
+
+    best_class_id = choose_class(preds, allowed)
+    confidence = float(preds[best_class_id])
+    scan_id, similar = record_scan(embedding, best_class_id)
+
+    return best_class_id, confidence, scan_id, similar, energy, unknown
+
+
+def choose_class(preds, allowed):
+    """Best class, restricted to `allowed` (the crop's class indices) when given."""
+    if allowed is not None:
+        return int(allowed[np.argmax(preds[allowed])])
+    return int(np.argmax(preds))
+
+
+def record_scan(embedding, class_id):
+    """Similar earlier scans, then index this one. Inference thread only (the store isn't thread-safe)."""
+    if embedding is None or embedding_store is None:
+        return None, []
+
+    # Look up earlier scans before inserting this one so it can't match itself
+    similar = embedding_store.query(embedding, k=SIMILAR_K)
+    return embedding_store.add(embedding, class_id), similar
+
+
+def run_explain(items):
+    """
+    One Grad-CAM pass over a batch of (img_array, allowed classes). Returns, per
+    item, the cacheable (embedding, class_id, confidence, energy, unknown,
+    overlay) plus the (scan_id, similar) from recording the scan.
+    """
+    batch = np.concatenate([img for img, _ in items])
+    allowed = iter([classes for _, classes in items])
+    pooled, preds, class_ids, cams = gradcam.explain(batch, lambda row: choose_class(row, next(allowed)))
+    probs, energies, unknowns = calibrate(pooled, preds)
+
+    results = []
+    for i, class_id in enumerate(class_ids):
+        explained = (pooled[i], class_id, float(probs[i][class_id]), energies[i], ood_flag(unknowns[i]),
+                     encode_overlay(cams[i], IMG_SIZE))
+        results.append((explained, record_scan(pooled[i], class_id)))
+    return results
+
+
+async def explain_batch(items):
+    lane = min(lane for _, _, lane in items)
+    return await admission_queue.submit(lane, run_explain, [(img, allowed) for img, allowed, _ in items], kind=EXPLAIN_JOB)
+
+
+explain_batcher = ExplainBatcher(
+    explain_batch,
+    max_batch=EXPLAIN_CONFIG.get("max_batch", 8),
+    max_delay=EXPLAIN_CONFIG.get("max_delay_ms", 20) / 1000,
+)
+
+
+async def predict_explained(file, crop_type, allowed, lane):
+    """Prediction plus Grad-CAM overlay, served from the cache when this exact image was explained before."""
+    data = await file.read()
+    key = (hashlib.sha256(data).hexdigest(), (crop_type or "").lower())
+
+    explained = explain_cache.get(key)
+    if explained is not None:
+        explain_stats["cache_hits"] += 1
+        embedding, class_id = explained[0], explained[1]
+        scan = await admission_queue.submit(lane, record_scan, embedding, class_id, kind=RECORD_JOB)
+    else:
+        explain_stats["computed"] += 1
+        img_array = await run_in_threadpool(decode, io.BytesIO(data), FULL)
+        explained, scan = await explain_batcher.submit((img_array, allowed, lane))
+        explain_cache.put(key, explained)
+
+    _, class_id, confidence, energy, unknown, overlay = explained
+    scan_id, similar = scan
+    return class_id, confidence, scan_id, similar, energy, unknown, overlay
+
+
+def client_key(request: Request):
+    """
+    Rate-limit bucket for a request: the peer IP, or behind one of
+    admission.trusted_proxies the last X-Forwarded-For hop those proxies
+    didn't add. This server doesn't authenticate callers, so identifiers
+    they send themselves (X-Account-No) can't be trusted as keys: rotating
+    one would dodge the limit and borrowing someone else's would drain theirs.
+    """
+    host = request.client.host if request.client else "anonymous"
+    if host in TRUSTED_PROXIES:
+        hops = [h.strip() for h in request.headers.get("x-forwarded-for", "").split(",") if h.strip()]
+        while hops and hops[-1] in TRUSTED_PROXIES:
+            hops.pop()
+        if hops:
+            host = hops[-1]
+    return host
+
+
+def rejection(e: Rejected):
+    router.reject(e.status_code)
+    return JSONResponse(
+        status_code=e.status_code,
+        content={"error": e.detail, "retry_after": e.retry_after},
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
 @app.post("/api/predict")
 async def predict(
+    request: Request,
     file: UploadFile = File(...),
     crop_type: str = Form(None),
     crop_stage: str = Form(None),
     lat: float = Form(None),
     lon: float = Form(None),
     acc: float = Form(None),
+    priority: str = Form("interactive"),
+    explain: bool = Form(False),
 ):
+    lane = LANES.get(priority, LANES["interactive"])
     try:
-        img_pil = Image.open(file.file)
-        img_array = preprocess(img_pil)
-
-        preds = model.predict(img_array)[0]
+        # Cheap checks first, so rejected requests never cost a decode
+        rate_limiter.check(client_key(request))
+        admission_queue.admit(lane, EXPLAIN_JOB if explain and gradcam is not None else PREDICT)
 
-        # Filter if crop type provided
-        if crop_type and crop_type.lower() in CROP_CLASS_GROUPS:
-            allowed = CROP_CLASS_GROUPS[crop_type.lower()]
-            filtered = {i: preds[i] for i in allowed}
-            best_class_id = max(filtered, key=filtered.get)
-            confidence = float(filtered[best_class_id])
+        gradcam_url = None
+        allowed = RUNTIME.crop_classes(crop_type)
+        if explain and gradcam is not None:
+            # Explanations always come from the full model, and are kept out
+            # of the router's latency window so they can't trigger degradation
+            tier = FULL
+            best_class_id, confidence, scan_id, similar, energy, unknown, gradcam_url = await predict_explained(
+                file, crop_type, allowed, lane
+            )
         else:
-            best_class_id = int(np.argmax(preds))
-            confidence = float(np.max(preds))
+            tier = router.choose()
+            started = time.monotonic()
+            img_array = await run_in_threadpool(decode, file.file, tier)
+            best_class_id, confidence, scan_id, similar, energy, unknown = await admission_queue.submit(
+                lane, run_model, img_array, allowed, tier
+            )
+            router.record(tier, time.monotonic() - started)
 
-        label = INV_MAP.get(best_class_id, "Unknown")
+        # Out-of-distribution photos (not a leaf, wrong crop, ...) get no diagnosis
+        label = "Unknown" if unknown else RUNTIME.labels[best_class_id]
+        duplicate_of = similar[0][0] if similar and similar[0][1] >= DUPLICATE_THRESHOLD else None
 
         return {
-            "class_id": best_class_id,
+            "tier": tier,
+            "model": FALLBACK_MODEL if tier == FALLBACK else SERVING_MODEL,
+            "scan_id": scan_id,
+            "near_duplicate": duplicate_of is not None,
+            "duplicate_of": duplicate_of,
+            "similar_cases": [
+                {"scan_id": sid, "similarity": sim, "label": RUNTIME.label(cls)}
+                for sid, sim, cls in similar
+            ],
+            # No class for out-of-distribution photos, so clients can't show a diagnosis by index
+            "class_id": None if unknown else best_class_id,
             "label": label,
             "confidence": confidence,
+            "calibrated": calibration is not None and tier == FULL,
+            # True: out of distribution. None: not checked (fallback tier or no
+            # calibration), so the label is unverified and clients show no diagnosis
+            "unknown": unknown,
+            "ood_score": float(energy) if energy is not None else None,
             "crop_type": crop_type,
             "crop_stage": crop_stage,
             "lat": lat,
             "lon": lon,
             "acc": acc,
+            "gradcam_url": gradcam_url,
         }
 
+    except Rejected as e:
+        return rejection(e)
     except Exception as e:
         return {"error": str(e)}
 
 
+@app.get("/api/metrics")
+def metrics():
+    return {
+        **router.metrics(),
+        "service_time_ms": {kind: round(t * 1000, 1) for kind, t in admission_queue.service_time.items()},
+        "tiers": {FULL: SERVING_MODEL, FALLBACK: FALLBACK_MODEL if fallback_model is not None else None},
+        "explain": dict(explain_stats),
+    }
+
+
 if __name__ == "__main__":
     uvicorn.run("server:app", host="0.0.0.0", port=2526)
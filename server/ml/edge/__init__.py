@@ -0,0 +1,13 @@
+"""
+Offline inference for farms without connectivity.
+
+A bundle (model.tflite + bundle.json) is built once on a workstation with
+`python -m edge build`. On the device, `python -m edge scan DIR` classifies
+a folder of photos with the TFLite interpreter alone (ai-edge-litert or
+tflite-runtime, never full TensorFlow) and queues the results in a local
+SQLite outbox; `python -m edge sync` pushes them into the Django History
+table once the network is back.
+
+Modules import their dependencies lazily so the CLI starts quickly on a
+Raspberry-Pi-class CPU.
+"""
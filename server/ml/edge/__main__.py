@@ -0,0 +1,104 @@
+"""
+python -m edge build --model teacher_compressed --out edge_bundle   (workstation)
+python -m edge scan PHOTOS_DIR --crop tomato                        (device)
+python -m edge sync --server http://HOST:8000 --account 1042        (device, when online)
+python -m edge status
+
+Heavy imports happen inside the subcommands: `sync` and `status` never load
+numpy, PIL or the interpreter.
+"""
+import argparse
+import os
+import sys
+
+DEFAULT_BUNDLE = os.environ.get("EDGE_BUNDLE", "edge_bundle")
+DEFAULT_OUTBOX = os.environ.get("EDGE_OUTBOX", "edge_outbox.sqlite3")
+
+
+def cmd_build(args):
+    from .bundle import build
+
+    build(args.model, args.out)
+
+
+def cmd_scan(args):
+    from . import bundle
+    from .outbox import Outbox
+    from .runtime import EdgeModel
+    from .scan import scan_directory
+
+    model = EdgeModel(bundle.load(args.bundle), num_threads=args.threads)
+    outbox = Outbox(args.outbox)
+    try:
+        _, failed = scan_directory(
+            model, outbox, args.directory,
+            crop_type=args.crop, lat=args.lat, lon=args.lon,
+            batch_size=args.batch_size, threads=args.threads,
+        )
+    finally:
+        outbox.close()
+    return 1 if failed else 0
+
+
+def cmd_sync(args):
+    from .outbox import Outbox
+    from .sync import sync
+
+    outbox = Outbox(args.outbox)
+    try:
+        _, complete = sync(outbox, args.server, args.account, batch_size=args.batch_size)
+    finally:
+        outbox.close()
+    return 0 if complete else 2
+
+
+def cmd_status(args):
+    from .outbox import Outbox
+
+    outbox = Outbox(args.outbox)
+    counts = outbox.counts()
+    rejected = outbox.rejected(limit=10)
+    outbox.close()
+    print(f"📋 {counts['total']} scans, {counts['pending']} waiting to sync ({counts['failing']} failed last attempt), "
+          f"{counts['rejected']} rejected")
+    for row in rejected:
+        print(f"   🚫 {row['path']}: {row['last_error']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m edge", description="Offline plant disease scanning")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("build", help="export a config.yaml model as an edge bundle (needs TensorFlow for Keras models)")
+    p.add_argument("--model", default="teacher_compressed", help="entry under models: in config.yaml")
+    p.add_argument("--out", default=DEFAULT_BUNDLE)
+    p.set_defaults(func=cmd_build)
+
+    p = sub.add_parser("scan", help="classify every new image under a directory")
+    p.add_argument("directory")
+    p.add_argument("--bundle", default=DEFAULT_BUNDLE)
+    p.add_argument("--outbox", default=DEFAULT_OUTBOX)
+    p.add_argument("--crop", help="restrict predictions to this crop (pepper, potato, tomato)")
+    p.add_argument("--lat", type=float)
+    p.add_argument("--lon", type=float)
+    p.add_argument("--batch-size", type=int, default=8)
+    p.add_argument("--threads", type=int, default=None, help="decode and interpreter threads (default: all CPUs)")
+    p.set_defaults(func=cmd_scan)
+
+    p = sub.add_parser("sync", help="upload queued scans to the server")
+    p.add_argument("--server", required=True, help="Django base URL, e.g. http://192.168.1.10:8000")
+    p.add_argument("--account", type=int, required=True, help="account number the scans belong to")
+    p.add_argument("--outbox", default=DEFAULT_OUTBOX)
+    p.add_argument("--batch-size", type=int, default=200)
+    p.set_defaults(func=cmd_sync)
+
+    p = sub.add_parser("status", help="show how many scans are waiting to sync and which were rejected")
+    p.add_argument("--outbox", default=DEFAULT_OUTBOX)
+    p.set_defaults(func=cmd_status)
+
+    args = parser.parse_args(argv)
+    return args.func(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
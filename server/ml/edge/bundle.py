@@ -0,0 +1,90 @@
+"""
+Edge bundle: a TFLite model plus bundle.json, which carries everything the
+device needs that would otherwise come from config.yaml and
+class_indices.json (labels, crop of each class, input size, scaling,
+calibration temperature).
+
+Building runs on a workstation with the full training environment;
+loading needs only the standard library.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+BUNDLE_FILE = "bundle.json"
+MODEL_FILE = "model.tflite"
+BUNDLE_VERSION = 1
+
+
+def _convert_to_tflite(path, out_path):
+    """Keras .h5/.keras (optionally .gz) → TFLite with default optimizations."""
+    import gzip
+    import tensorflow as tf
+
+    if path.endswith(".gz"):
+        with tempfile.NamedTemporaryFile(suffix=".h5") as tmp:
+            with gzip.open(path, "rb") as src:
+                shutil.copyfileobj(src, tmp)
+            tmp.flush()
+            model = tf.keras.models.load_model(tmp.name, compile=False)
+    else:
+        model = tf.keras.models.load_model(path, compile=False)
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    with open(out_path, "wb") as f:
+        f.write(converter.convert())
+
+
+def build(model_name, out_dir):
+    """Write model.tflite and bundle.json for `model_name` (a config.yaml models entry)."""
+    from src.runtime_config import load_runtime_config
+
+    runtime = load_runtime_config()
+    spec = runtime.model(model_name)
+    os.makedirs(out_dir, exist_ok=True)
+    model_path = os.path.join(out_dir, MODEL_FILE)
+
+    if spec.is_tflite:
+        shutil.copyfile(spec.path, model_path)
+    else:
+        print(f"🔧 Converting {spec.path} to TFLite")
+        _convert_to_tflite(spec.path, model_path)
+
+    temperature = 1.0
+    if spec.calibration and os.path.exists(spec.calibration):
+        with open(spec.calibration, "r") as f:
+            temperature = json.load(f)["temperature"]
+
+    with open(model_path, "rb") as f:
+        model_sha256 = hashlib.sha256(f.read()).hexdigest()
+
+    bundle = {
+        "version": BUNDLE_VERSION,
+        "model": model_name,
+        "model_sha256": model_sha256,
+        "img_size": list(spec.img_size),
+        "preprocess": {"scale": runtime.preprocess_scale, "offset": runtime.preprocess_offset},
+        "class_names": list(runtime.class_names),
+        "crops": [str(c) for c in runtime.crop_of_class],
+        "temperature": temperature,
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with open(os.path.join(out_dir, BUNDLE_FILE), "w") as f:
+        json.dump(bundle, f, indent=4)
+
+    size_mb = os.path.getsize(model_path) / 1e6
+    print(f"📦 Bundle for '{model_name}' → {out_dir} ({size_mb:.1f} MB model)")
+    return bundle
+
+
+def load(bundle_dir):
+    with open(os.path.join(bundle_dir, BUNDLE_FILE), "r") as f:
+        bundle = json.load(f)
+    if bundle.get("version") != BUNDLE_VERSION:
+        raise ValueError(f"Unsupported bundle version {bundle.get('version')}, rebuild it with `python -m edge build`")
+    bundle["model_path"] = os.path.join(bundle_dir, MODEL_FILE)
+    return bundle
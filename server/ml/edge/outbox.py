@@ -0,0 +1,141 @@
+"""
+Local SQLite queue of scan results waiting to be synced to the server.
+
+Each scan gets a uid when it is queued; the server stores it as
+History.edge_uid and skips uids it already has, so resending after a
+dropped connection never creates duplicates. Files are keyed by
+(path, size, mtime) so re-running a scan over the same folder only
+classifies new or changed photos.
+
+Scans the server refuses (rejected_at set) leave the queue, so one bad
+record can't hold back everything queued after it; `status` lists them.
+"""
+import sqlite3
+import uuid
+from datetime import datetime, timezone
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scans (
+    uid TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    crop_type TEXT,
+    class_id INTEGER NOT NULL,
+    disease TEXT NOT NULL,
+    confidence REAL NOT NULL,
+    captured_at TEXT NOT NULL,
+    lat REAL,
+    lon REAL,
+    model TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    synced_at TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    rejected_at TEXT
+);
+"""
+
+INDEXES = """
+CREATE UNIQUE INDEX IF NOT EXISTS scans_file ON scans (path, size, mtime_ns);
+DROP INDEX IF EXISTS scans_pending;
+CREATE INDEX IF NOT EXISTS scans_queued ON scans (created_at) WHERE synced_at IS NULL AND rejected_at IS NULL;
+"""
+
+# A scan the server leaves out without giving a reason is retried this many times
+MAX_ATTEMPTS = 5
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+class Outbox:
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        # WAL keeps a concurrent `sync` from blocking a running `scan`
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        columns = {r["name"] for r in self.db.execute("PRAGMA table_info(scans)")}
+        if "rejected_at" not in columns:
+            # Outboxes created before rejections were tracked
+            self.db.execute("ALTER TABLE scans ADD COLUMN rejected_at TEXT")
+        self.db.executescript(INDEXES)
+
+    def close(self):
+        self.db.close()
+
+    def known_files(self):
+        return {(r[0], r[1], r[2]) for r in self.db.execute("SELECT path, size, mtime_ns FROM scans")}
+
+    def add_many(self, scans):
+        """Queue scan dicts (path, size, mtime_ns, crop_type, class_id, disease, confidence, captured_at, lat, lon, model)."""
+        now = _now()
+        with self.db:
+            self.db.executemany(
+                """
+                INSERT OR REPLACE INTO scans
+                    (uid, path, size, mtime_ns, crop_type, class_id, disease, confidence,
+                     captured_at, lat, lon, model, created_at)
+                VALUES (:uid, :path, :size, :mtime_ns, :crop_type, :class_id, :disease, :confidence,
+                        :captured_at, :lat, :lon, :model, :created_at)
+                """,
+                [{**s, "uid": uuid.uuid4().hex, "created_at": now} for s in scans],
+            )
+
+    def pending(self, limit):
+        return self.db.execute(
+            "SELECT * FROM scans WHERE synced_at IS NULL AND rejected_at IS NULL ORDER BY created_at, rowid LIMIT ?",
+            (limit,),
+        ).fetchall()
+
+    def mark_synced(self, uids):
+        with self.db:
+            self.db.executemany(
+                "UPDATE scans SET synced_at = ?, last_error = NULL WHERE uid = ?",
+                [(_now(), uid) for uid in uids],
+            )
+
+    def mark_failed(self, uids, error, max_attempts=None):
+        """
+        Record a failed attempt; the scans stay queued. With `max_attempts`,
+        scans that have now failed that many times are rejected instead.
+        """
+        now = _now()
+        with self.db:
+            self.db.executemany(
+                """
+                UPDATE scans SET attempts = attempts + 1, last_error = ?,
+                    rejected_at = CASE WHEN attempts + 1 >= ? THEN ? END
+                WHERE uid = ?
+                """,
+                [(error, max_attempts, now, uid) for uid in uids],
+            )
+
+    def mark_rejected(self, uids, error):
+        """Take scans the server refused out of the queue, keeping the reason."""
+        with self.db:
+            self.db.executemany(
+                "UPDATE scans SET attempts = attempts + 1, last_error = ?, rejected_at = ? WHERE uid = ?",
+                [(error, _now(), uid) for uid in uids],
+            )
+
+    def rejected(self, limit=None):
+        return self.db.execute(
+            "SELECT * FROM scans WHERE rejected_at IS NOT NULL ORDER BY rejected_at, rowid LIMIT ?",
+            (-1 if limit is None else limit,),
+        ).fetchall()
+
+    def counts(self):
+        row = self.db.execute(
+            """
+            SELECT COUNT(*),
+                   SUM(synced_at IS NULL AND rejected_at IS NULL),
+                   SUM(synced_at IS NULL AND rejected_at IS NULL AND last_error IS NOT NULL),
+                   SUM(rejected_at IS NOT NULL)
+            FROM scans
+            """
+        ).fetchone()
+        return {"total": row[0], "pending": row[1] or 0, "failing": row[2] or 0, "rejected": row[3] or 0}
@@ -0,0 +1,91 @@
+"""
+TFLite-only inference for the edge bundle. Mirrors src/inference.py and
+src/preprocessing.py: same resize and input scaling, same crop filter as
+the API server, with the bundle's calibration temperature applied.
+"""
+import os
+
+import numpy as np
+from PIL import Image
+
+
+def load_interpreter(model_path, num_threads=None):
+    """The standalone TFLite interpreter; full TensorFlow is deliberately not a fallback."""
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            raise ImportError("Install ai-edge-litert (or tflite-runtime) to run the edge bundle") from None
+    return Interpreter(model_path=model_path, num_threads=num_threads or os.cpu_count())
+
+
+class EdgeModel:
+    def __init__(self, bundle, num_threads=None):
+        self.bundle = bundle
+        self.img_size = tuple(bundle["img_size"])  # (height, width)
+        self.scale = np.float32(bundle["preprocess"]["scale"])
+        self.offset = np.float32(bundle["preprocess"]["offset"])
+        self.temperature = float(bundle.get("temperature", 1.0))
+
+        self.labels = np.array(bundle["class_names"], dtype=object)
+        crops = np.array(bundle["crops"], dtype=object)
+        self.crop_groups = {crop: np.flatnonzero(crops == crop) for crop in dict.fromkeys(crops)}
+        self.crop_of_class = crops
+
+        self.interpreter = load_interpreter(bundle["model_path"], num_threads)
+        self.interpreter.allocate_tensors()
+        self._refresh_details()
+
+    def _refresh_details(self):
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+
+    def load_image(self, path):
+        """Decode + resize + scale one file. Thread-safe; PIL releases the GIL while decoding."""
+        with Image.open(path) as img:
+            # JPEG draft mode decodes at a reduced DCT scale (still >= the
+            # target size), which is most of the cost on large phone photos
+            width_height = self.img_size[::-1]
+            img.draft("RGB", width_height)
+            img = img.convert("RGB").resize(width_height, Image.BILINEAR)
+            return np.asarray(img, dtype=np.float32) * self.scale + self.offset
+
+    def predict(self, batch):
+        """Class probabilities for a (N, H, W, 3) batch."""
+        batch = np.asarray(batch, dtype=np.float32)
+        if tuple(self.input["shape"]) != batch.shape:
+            self.interpreter.resize_tensor_input(self.input["index"], batch.shape)
+            self.interpreter.allocate_tensors()
+            self._refresh_details()
+
+        if self.input["dtype"] != np.float32:
+            # Fully integer-quantized model
+            scale, zero_point = self.input["quantization"]
+            batch = np.round(batch / scale + zero_point).astype(self.input["dtype"])
+
+        self.interpreter.set_tensor(self.input["index"], batch)
+        self.interpreter.invoke()
+        probs = self.interpreter.get_tensor(self.output["index"]).astype(np.float32)
+
+        if self.output["dtype"] != np.float32:
+            scale, zero_point = self.output["quantization"]
+            probs = (probs - zero_point) * scale
+
+        if self.temperature != 1.0:
+            # softmax(log p / T) == softmax(logits / T): the log-softmax constant cancels
+            z = np.log(np.clip(probs, 1e-12, None)) / self.temperature
+            z -= z.max(axis=-1, keepdims=True)
+            probs = np.exp(z)
+            probs /= probs.sum(axis=-1, keepdims=True)
+        return probs
+
+    def classify(self, probs, crop_type=None):
+        """(class ids, confidences) for a batch, restricted to `crop_type`'s classes when given."""
+        allowed = self.crop_groups.get(crop_type.lower()) if crop_type else None
+        if allowed is not None:
+            class_ids = allowed[np.argmax(probs[:, allowed], axis=-1)]
+        else:
+            class_ids = np.argmax(probs, axis=-1)
+        return class_ids, probs[np.arange(len(probs)), class_ids]
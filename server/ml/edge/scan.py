@@ -0,0 +1,100 @@
+"""
+Classify a directory of photos into the outbox.
+
+Decoding runs on a thread pool a bounded number of images ahead of the
+interpreter, so the CPU-heavy JPEG decode of the next batch overlaps
+with inference on the current one while memory stays flat.
+"""
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+IMAGE_EXTENSIONS = (".bmp", ".gif", ".jpeg", ".jpg", ".png", ".webp")
+
+
+def find_images(directory):
+    for root, _, names in os.walk(directory):
+        for name in sorted(names):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.abspath(os.path.join(root, name))
+
+
+def decode_ahead(pool, fn, items, depth):
+    """Like pool.map, but with at most `depth` results in flight."""
+    pending = deque()
+    for item in items:
+        pending.append((item, pool.submit(fn, item)))
+        if len(pending) >= depth:
+            yield _result(*pending.popleft())
+    while pending:
+        yield _result(*pending.popleft())
+
+
+def _result(item, future):
+    try:
+        return item, future.result(), None
+    except Exception as e:
+        return item, None, e
+
+
+def scan_directory(model, outbox, directory, crop_type=None, lat=None, lon=None, batch_size=8, threads=None):
+    """Queue a result for every new or changed image under `directory`. Returns (queued, failed)."""
+    known = outbox.known_files()
+    files = []
+    for path in find_images(directory):
+        st = os.stat(path)
+        if (path, st.st_size, st.st_mtime_ns) not in known:
+            files.append((path, st))
+
+    print(f"🔍 {len(files)} new images in {directory}")
+    if not files:
+        return 0, 0
+
+    threads = threads or os.cpu_count()
+    queued = failed = 0
+    start = time.perf_counter()
+
+    def flush(batch):
+        probs = model.predict(np.stack([image for _, image in batch]))
+        class_ids, confidences = model.classify(probs, crop_type)
+        outbox.add_many([
+            {
+                "path": path,
+                "size": st.st_size,
+                "mtime_ns": st.st_mtime_ns,
+                "crop_type": crop_type or model.crop_of_class[class_id],
+                "class_id": int(class_id),
+                "disease": model.labels[class_id],
+                "confidence": float(confidence),
+                # Photo time, stored as History.captured_at (record_date is the sync time)
+                "captured_at": datetime.fromtimestamp(st.st_mtime, timezone.utc).isoformat(timespec="seconds"),
+                "lat": lat,
+                "lon": lon,
+                "model": model.bundle["model"],
+            }
+            for ((path, st), _), class_id, confidence in zip(batch, class_ids, confidences)
+        ])
+
+    batch = []
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for (path, st), image, error in decode_ahead(pool, lambda f: model.load_image(f[0]), files, 2 * batch_size):
+            if error is not None:
+                failed += 1
+                print(f"⚠ Skipping {path}: {error}")
+                continue
+            batch.append(((path, st), image))
+            if len(batch) == batch_size:
+                flush(batch)
+                queued += len(batch)
+                batch = []
+        if batch:
+            flush(batch)
+            queued += len(batch)
+
+    elapsed = time.perf_counter() - start
+    print(f"✅ Queued {queued} scans in {elapsed:.1f}s ({queued / elapsed:.1f} img/s), {failed} unreadable")
+    return queued, failed
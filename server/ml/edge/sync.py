@@ -0,0 +1,94 @@
+"""
+Push queued scans to the Django server (/api/submit_batch/) in batches.
+Uses only the standard library, so syncing works without numpy or PIL.
+"""
+import json
+import urllib.error
+import urllib.request
+
+from .outbox import MAX_ATTEMPTS
+
+SUBMIT_PATH = "/api/submit_batch/"
+
+# Keep below the server's EDGE_SYNC_MAX_RECORDS
+BATCH_SIZE = 200
+
+
+def _payload(account_acno, rows):
+    return {
+        "account_acno": account_acno,
+        "records": [
+            {
+                "uid": r["uid"],
+                "crop_type": r["crop_type"] or "",
+                "disease": r["disease"],
+                "captured_at": r["captured_at"],
+                "lat": r["lat"],
+                "lon": r["lon"],
+            }
+            for r in rows
+        ],
+    }
+
+
+def sync(outbox, server, account_acno, batch_size=BATCH_SIZE, timeout=15):
+    """
+    Send pending scans until the outbox is empty or the server can't be
+    reached. Scans the server rejects leave the queue (see Outbox.rejected).
+    Returns (number synced, True if everything was sent and nothing rejected).
+    """
+    url = server.rstrip("/") + SUBMIT_PATH
+    synced, rejected_any = 0, False
+
+    while True:
+        rows = outbox.pending(batch_size)
+        if not rows:
+            return synced, not rejected_any
+
+        uids = [r["uid"] for r in rows]
+        request = urllib.request.Request(
+            url,
+            data=json.dumps(_payload(account_acno, rows)).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                body = json.load(response)
+        except urllib.error.HTTPError as e:
+            # Rows stay queued; a 4xx (unknown account, bad data) needs fixing before the next sync
+            detail = e.read().decode(errors="replace")[:500]
+            outbox.mark_failed(uids, f"HTTP {e.code}: {detail}")
+            print(f"❌ Server rejected the batch: HTTP {e.code} {detail}")
+            return synced, False
+        except (urllib.error.URLError, TimeoutError, OSError) as e:
+            outbox.mark_failed(uids, str(e))
+            print(f"📴 Server unreachable ({e}); {synced} synced, the rest stay queued")
+            return synced, False
+
+        stored = set(body["synced_uids"])
+        outbox.mark_synced(stored)
+        synced += len(stored)
+        print(f"☁️  Synced {len(stored)} scans ({body['inserted']} new)")
+
+        # Records that failed validation will fail the same way every time, so
+        # they leave the queue. Scans left out without a reason are retried,
+        # but this run stops so they aren't resent in a loop
+        reasons = body.get("rejected") or {}
+        rejected = [uid for uid in uids if uid not in stored and uid in reasons]
+        left_out = [uid for uid in uids if uid not in stored and uid not in reasons]
+
+        by_error = {}
+        for uid in rejected:
+            by_error.setdefault(reasons[uid], []).append(uid)
+        for error, group in by_error.items():
+            outbox.mark_rejected(group, error)
+        if rejected:
+            rejected_any = True
+            print(f"🚫 {len(rejected)} scans were rejected by the server ({next(iter(by_error))}); "
+                  f"see `python -m edge status`")
+
+        if left_out:
+            outbox.mark_failed(left_out, "Not stored by the server", max_attempts=MAX_ATTEMPTS)
+            print(f"⚠ {len(left_out)} scans were not stored and stay queued (up to {MAX_ATTEMPTS} attempts)")
+            return synced, False
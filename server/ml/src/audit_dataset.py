@@ -0,0 +1,314 @@
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+import numpy as np
+import os
+import io
+import json
+import time
+import hashlib
+import argparse
+
+# ------------------------------- PATHS -------------------------------
+DATA_DIR = "../data/PlantVillage"
+MANIFEST_PATH = "../data/manifest.json"
+
+# ------------------------------- CONFIG -------------------------------
+VAL_FRACTION = 0.2
+LEGACY_SEED = 123  # seed load_data() passes to image_dataset_from_directory
+
+# 16x16 dHash = 256 bits. Pairs at most this many bits apart are near-duplicates;
+# on PlantVillage, different leaves start around 36 bits, and re-shots of one leaf
+# fall around 20-32. An 8x8 hash is too coarse: unrelated leaves on the same
+# background collide.
+HASH_SIZE = 16
+NEAR_DUPLICATE_BITS = 24
+
+# Extensions image_dataset_from_directory picks up
+IMAGE_EXTENSIONS = (".bmp", ".gif", ".jpeg", ".jpg", ".png")
+
+MANIFEST_VERSION = 2
+
+
+# ------------------------------- PER-FILE SCAN -------------------------------
+def dhash(image, size=HASH_SIZE):
+    """Difference hash as hex: is each pixel brighter than its right neighbour."""
+    gray = np.asarray(image.convert("L").resize((size + 1, size), Image.BILINEAR), dtype=np.int16)
+    return np.packbits(gray[:, 1:] > gray[:, :-1]).tobytes().hex()
+
+
+def inspect(path):
+    """Runs in a worker process. Fully decodes the file so truncated JPEGs are caught."""
+    with open(path, "rb") as f:
+        data = f.read()
+
+    entry = {"sha256": hashlib.sha256(data).hexdigest(), "error": None}
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img.load()
+            entry["width"], entry["height"] = img.size
+            entry["dhash"] = dhash(img)
+    except Exception as e:
+        entry["error"] = f"{type(e).__name__}: {e}"
+    return entry
+
+
+def list_files(data_dir):
+    """(relative path, class name) for every image, in image_dataset_from_directory order."""
+    class_names = sorted(d for d in os.listdir(data_dir) if os.path.isdir(os.path.join(data_dir, d)))
+    files = []
+    for label in class_names:
+        for root, _, names in sorted(os.walk(os.path.join(data_dir, label))):
+            for name in sorted(names):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    files.append((os.path.relpath(os.path.join(root, name), data_dir), label))
+    return class_names, files
+
+
+def load_manifest(path=MANIFEST_PATH):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def scan(data_dir, previous, workers):
+    """
+    Manifest entries for every image. Files whose size and mtime match the
+    previous manifest are reused, so only new or changed files are decoded.
+    """
+    class_names, files = list_files(data_dir)
+    old = previous.get("files", {}) if previous else {}
+
+    entries, todo = {}, []
+    for rel, label in files:
+        st = os.stat(os.path.join(data_dir, rel))
+        cached = old.get(rel)
+        if cached and cached["size"] == st.st_size and cached["mtime_ns"] == st.st_mtime_ns:
+            entries[rel] = {k: cached[k] for k in ("label", "size", "mtime_ns", "sha256", "error",
+                                                    "width", "height", "dhash") if k in cached}
+        else:
+            entries[rel] = {"label": label, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+            todo.append(rel)
+
+    print(f"🔍 {len(files)} images, {len(files) - len(todo)} cached, {len(todo)} to decode")
+
+    if todo:
+        start = time.perf_counter()
+        paths = [os.path.join(data_dir, rel) for rel in todo]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for rel, result in zip(todo, pool.map(inspect, paths, chunksize=64)):
+                entries[rel].update(result)
+        print(f"⏱ Decoded {len(todo)} images in {time.perf_counter() - start:.1f}s")
+
+    return class_names, entries
+
+
+# ------------------------------- DUPLICATES -------------------------------
+class UnionFind:
+    def __init__(self, n):
+        self.parent = np.arange(n)
+
+    def find(self, i):
+        root = i
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[i] != root:
+            self.parent[i], i = root, self.parent[i]
+        return root
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+
+def near_duplicate_pairs(hashes, max_bits=NEAR_DUPLICATE_BITS):
+    """
+    Index pairs of `hashes` (uint8 rows) differing in at most `max_bits` bits.
+
+    Pigeonhole: split the bits into max_bits + 1 bands; two hashes that
+    close must agree exactly on at least one band. Only hashes sharing a
+    band value are compared, and each bucket is compared as one NumPy
+    XOR/popcount matrix instead of pair by pair.
+    """
+    bits = np.unpackbits(hashes, axis=1)
+    edges = np.linspace(0, bits.shape[1], max_bits + 2).astype(int)
+    pairs = set()
+
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        keys = bits[:, lo:hi].astype(np.uint64) @ (np.uint64(1) << np.arange(hi - lo, dtype=np.uint64))
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        ends = np.r_[starts[1:], len(order)]
+
+        for s, e in zip(starts, ends):
+            if e - s < 2:
+                continue
+            members = order[s:e]
+            h = hashes[members]
+            distance = np.bitwise_count(h[:, None] ^ h[None, :]).sum(axis=-1, dtype=np.int32)
+            i, j = np.nonzero(np.triu(distance <= max_bits, k=1))
+            pairs.update(zip(members[i].tolist(), members[j].tolist()))
+
+    return pairs
+
+
+def group_duplicates(paths, entries, max_bits):
+    """Connected components of exact and near-duplicate images (index → group root)."""
+    uf = UnionFind(len(paths))
+
+    by_sha = {}
+    for i, rel in enumerate(paths):
+        first = by_sha.setdefault(entries[rel]["sha256"], i)
+        if first != i:
+            uf.union(first, i)
+
+    hashes = np.array([bytearray.fromhex(entries[rel]["dhash"]) for rel in paths], dtype=np.uint8)
+    near = near_duplicate_pairs(hashes, max_bits)
+    for a, b in near:
+        uf.union(a, b)
+
+    return [uf.find(i) for i in range(len(paths))], by_sha, len(near)
+
+
+# ------------------------------- SPLITS -------------------------------
+def group_split(key, val_fraction=VAL_FRACTION):
+    """
+    Deterministic split for a duplicate group, from the hash of its key.
+    Unlike a seeded shuffle, adding files never moves existing groups.
+    """
+    bucket = int(hashlib.sha256(key.encode()).hexdigest()[:8], 16) / 0xFFFFFFFF
+    return "val" if bucket < val_fraction else "train"
+
+
+def legacy_split(files, val_fraction=VAL_FRACTION, seed=LEGACY_SEED):
+    """
+    The split image_dataset_from_directory(validation_split, seed) makes:
+    shuffle the sorted file list with RandomState(seed), last part is val.
+    """
+    paths = [rel for rel, _ in files]
+    np.random.RandomState(seed).shuffle(paths)
+    num_val = int(val_fraction * len(paths))
+    return {rel: ("val" if i >= len(paths) - num_val else "train") for i, rel in enumerate(paths)}
+
+
+def leaking_groups(members_by_group, split_of):
+    """Duplicate groups with members on both sides of a split."""
+    return [
+        members for members in members_by_group.values()
+        if len(members) > 1 and len({split_of[m] for m in members if m in split_of}) > 1
+    ]
+
+
+# ------------------------------- AUDIT -------------------------------
+def audit(data_dir=DATA_DIR, manifest_path=MANIFEST_PATH, workers=None, max_bits=NEAR_DUPLICATE_BITS,
+          val_fraction=VAL_FRACTION, rescan=False):
+    previous = None
+    if not rescan and os.path.exists(manifest_path):
+        previous = load_manifest(manifest_path)
+        if previous.get("version") != MANIFEST_VERSION:
+            previous = None
+
+    class_names, entries = scan(data_dir, previous, workers)
+    _, files = list_files(data_dir)
+
+    corrupt = sorted(rel for rel, e in entries.items() if e["error"])
+    paths = sorted(rel for rel, e in entries.items() if not e["error"])
+    roots, by_sha, near_pairs = group_duplicates(paths, entries, max_bits)
+
+    members_by_group = {}
+    for rel, root in zip(paths, roots):
+        members_by_group.setdefault(root, []).append(rel)
+
+    exact_copies = 0
+    for members in members_by_group.values():
+        group_key = min(entries[m]["sha256"] for m in members)
+        split = group_split(group_key, val_fraction)
+        labels = {entries[m]["label"] for m in members}
+
+        for rel in members:
+            entry = entries[rel]
+            entry["group"] = group_key[:16] if len(members) > 1 else None
+            entry["label_conflict"] = len(labels) > 1
+            entry["split"] = split
+
+            # Byte-identical copies add nothing; keep the first one only
+            first = paths[by_sha[entry["sha256"]]]
+            entry["duplicate_of"] = first if first != rel else None
+            if entry["duplicate_of"]:
+                entry["split"] = None
+                exact_copies += 1
+
+    for rel in corrupt:
+        entries[rel].update(group=None, label_conflict=False, split=None, duplicate_of=None)
+
+    groups = [m for m in members_by_group.values() if len(m) > 1]
+    old_leaks = leaking_groups(members_by_group, legacy_split(files, val_fraction))
+    new_leaks = leaking_groups(members_by_group, {rel: e["split"] for rel, e in entries.items() if e["split"]})
+
+    summary = {
+        "images": len(entries),
+        "corrupt": len(corrupt),
+        "exact_duplicate_copies": exact_copies,
+        "near_duplicate_pairs": near_pairs,
+        "duplicate_groups": len(groups),
+        "label_conflict_groups": sum(1 for m in groups if len({entries[x]["label"] for x in m}) > 1),
+        "leaking_groups_legacy_split": len(old_leaks),
+        "leaking_groups_manifest_split": len(new_leaks),
+        "train": sum(1 for e in entries.values() if e["split"] == "train"),
+        "val": sum(1 for e in entries.values() if e["split"] == "val"),
+    }
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "data_dir": os.path.abspath(data_dir),
+        "class_names": class_names,
+        "val_fraction": val_fraction,
+        "near_duplicate_bits": max_bits,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "summary": summary,
+        "corrupt": corrupt,
+        "legacy_split_leaks": old_leaks,
+        "files": dict(sorted(entries.items())),
+    }
+
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+
+    print("📋 Audit summary:")
+    for key, value in summary.items():
+        print(f"   {key}: {value}")
+    for rel in corrupt[:10]:
+        print(f"   ❌ {rel}: {entries[rel]['error']}")
+    for members in old_leaks[:5]:
+        print(f"   ⚠ Leaks across the old split: {', '.join(members)}")
+    print(f"📁 Saved manifest → {manifest_path}")
+
+    return manifest
+
+
+def manifest_split(manifest, split):
+    """(absolute paths, label indices) of one split, in manifest order."""
+    index = {name: i for i, name in enumerate(manifest["class_names"])}
+    paths, labels = [], []
+    for rel, entry in manifest["files"].items():
+        if entry["split"] == split:
+            paths.append(os.path.join(manifest["data_dir"], rel))
+            labels.append(index[entry["label"]])
+    return paths, labels
+
+
+# ------------------------------- MAIN -------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find corrupt and duplicate images and write a split manifest")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--manifest", default=MANIFEST_PATH)
+    parser.add_argument("--workers", type=int, default=None, help="decode processes (default: all CPUs)")
+    parser.add_argument("--max-bits", type=int, default=NEAR_DUPLICATE_BITS,
+                        help="dHash Hamming distance counted as a near-duplicate")
+    parser.add_argument("--val-fraction", type=float, default=VAL_FRACTION)
+    parser.add_argument("--rescan", action="store_true", help="ignore the cached manifest")
+    args = parser.parse_args()
+
+    audit(args.data_dir, args.manifest, args.workers, args.max_bits, args.val_fraction, args.rescan)
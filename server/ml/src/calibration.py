@@ -0,0 +1,130 @@
+import numpy as np
+import json
+import os
+
+# ------------------------------- PATHS -------------------------------
+CALIBRATION_PATH = "../model/calibration.json"
+
+# ------------------------------- CONFIG -------------------------------
+# Share of in-distribution validation images that must still be accepted;
+# the energy threshold is set at this quantile of their scores
+OOD_ACCEPT_QUANTILE = 0.99
+ECE_BINS = 15
+
+
+# ------------------------------- MATH -------------------------------
+def logsumexp(x, axis=-1):
+    peak = x.max(axis=axis, keepdims=True)
+    return (peak + np.log(np.exp(x - peak).sum(axis=axis, keepdims=True))).squeeze(axis)
+
+
+def softmax(logits, temperature=1.0):
+    z = logits / temperature
+    z = z - z.max(axis=-1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+def energy(logits):
+    """Energy score (Liu et al., 2020): lower means more in-distribution."""
+    return -logsumexp(logits, axis=-1)
+
+
+def nll(logits, labels, temperature):
+    z = logits / temperature
+    return float(np.mean(logsumexp(z) - z[np.arange(len(labels)), labels]))
+
+
+def expected_calibration_error(probs, labels, bins=ECE_BINS):
+    confidence = probs.max(axis=-1)
+    correct = probs.argmax(axis=-1) == labels
+    edges = np.linspace(0, 1, bins + 1)
+    which = np.clip(np.digitize(confidence, edges[1:-1]), 0, bins - 1)
+
+    ece = 0.0
+    for b in range(bins):
+        mask = which == b
+        if mask.any():
+            ece += mask.mean() * abs(correct[mask].mean() - confidence[mask].mean())
+    return float(ece)
+
+
+def fit_temperature(logits, labels, low=0.05, high=20.0, iterations=60):
+    """Temperature minimising validation NLL (golden-section search on log T)."""
+    a, b = np.log(low), np.log(high)
+    ratio = (np.sqrt(5) - 1) / 2
+    c, d = b - ratio * (b - a), a + ratio * (b - a)
+    fc, fd = nll(logits, labels, np.exp(c)), nll(logits, labels, np.exp(d))
+
+    for _ in range(iterations):
+        if fc < fd:
+            b, d, fd = d, c, fc
+            c = b - ratio * (b - a)
+            fc = nll(logits, labels, np.exp(c))
+        else:
+            a, c, fc = c, d, fd
+            d = a + ratio * (b - a)
+            fd = nll(logits, labels, np.exp(d))
+
+    return float(np.exp((a + b) / 2))
+
+
+# ------------------------------- CALIBRATION -------------------------------
+class Calibration:
+    """
+    Temperature scaling plus energy-based OOD rejection, applied to logits.
+
+    For a softmax classifier the logits are `pooled @ kernel + bias` of its
+    last Dense layer, so serving gets them from the pooled features it
+    already computes: no second model call.
+    """
+
+    def __init__(self, temperature=1.0, energy_threshold=None, report=None):
+        self.temperature = temperature
+        self.energy_threshold = energy_threshold
+        self.report = report or {}
+
+    @classmethod
+    def fit(cls, logits, labels, accept_quantile=OOD_ACCEPT_QUANTILE):
+        logits = np.asarray(logits, dtype=np.float64)
+        labels = np.asarray(labels, dtype=np.int64)
+
+        temperature = fit_temperature(logits, labels)
+        scores = energy(logits)
+        report = {
+            "val_samples": int(len(labels)),
+            "accuracy": float((logits.argmax(axis=-1) == labels).mean()),
+            "nll_before": nll(logits, labels, 1.0),
+            "nll_after": nll(logits, labels, temperature),
+            "ece_before": expected_calibration_error(softmax(logits), labels),
+            "ece_after": expected_calibration_error(softmax(logits, temperature), labels),
+            "ood_accept_quantile": accept_quantile,
+        }
+        return cls(temperature, float(np.quantile(scores, accept_quantile)), report)
+
+    def apply(self, logits):
+        """(calibrated probabilities, energy scores, is-unknown mask) for a batch of logits."""
+        logits = np.asarray(logits, dtype=np.float64)
+        scores = energy(logits)
+        if self.energy_threshold is None:
+            unknown = np.zeros(len(scores), dtype=bool)
+        else:
+            unknown = scores > self.energy_threshold
+        return softmax(logits, self.temperature), scores, unknown
+
+    def save(self, path=CALIBRATION_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({
+                "temperature": self.temperature,
+                "energy_threshold": self.energy_threshold,
+                **self.report,
+            }, f, indent=4)
+
+    @classmethod
+    def load(cls, path=CALIBRATION_PATH):
+        with open(path, "r") as f:
+            data = json.load(f)
+        temperature = data.pop("temperature")
+        threshold = data.pop("energy_threshold")
+        return cls(temperature, threshold, data)
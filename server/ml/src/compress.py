@@ -0,0 +1,253 @@
+import os
+
+# tensorflow-model-optimization only supports Keras 2, so switch tf.keras to
+# tf_keras before TensorFlow is imported (needs the tf-keras package)
+os.environ.setdefault("TF_USE_LEGACY_KERAS", "1")
+
+import tensorflow as tf
+import tensorflow_model_optimization as tfmot
+import numpy as np
+import sys
+import json
+import gzip
+import time
+import shutil
+import argparse
+import subprocess
+
+from train import load_data, SEED
+
+# ------------------------------- PATHS -------------------------------
+BASE_MODEL_PATH = "../model/plant_disease_model.h5"
+COMPRESSED_DIR = "../model/compressed"
+COMPRESSED_H5_PATH = "../model/compressed/plant_disease_model_pc.h5"
+COMPRESSED_GZ_PATH = "../model/compressed/plant_disease_model_pc.h5.gz"
+COMPRESSED_TFLITE_PATH = "../model/compressed/plant_disease_model_pc.tflite"
+REPORT_PATH = "../model/compressed/report.json"
+
+# ------------------------------- CONFIG -------------------------------
+TARGET_SPARSITY = 0.5
+NUM_CLUSTERS = 16
+PRUNE_EPOCHS = 4
+CLUSTER_EPOCHS = 3
+FINE_TUNE_LR = 1e-5
+LATENCY_RUNS = 50
+
+
+def _compile(model, learning_rate=FINE_TUNE_LR):
+    model.compile(
+        optimizer=tf.keras.optimizers.Adam(learning_rate),
+        loss="sparse_categorical_crossentropy",
+        metrics=["accuracy"]
+    )
+    return model
+
+
+# ------------------------------- PRUNING -------------------------------
+def prune(model, train_ds, val_ds, epochs=PRUNE_EPOCHS):
+    """Magnitude-prune to TARGET_SPARSITY, fine-tuning while sparsity ramps up."""
+    end_step = int(train_ds.cardinality().numpy()) * epochs
+
+    schedule = tfmot.sparsity.keras.PolynomialDecay(
+        initial_sparsity=0.0,
+        final_sparsity=TARGET_SPARSITY,
+        begin_step=0,
+        end_step=end_step
+    )
+    pruned = _compile(tfmot.sparsity.keras.prune_low_magnitude(model, pruning_schedule=schedule))
+
+    pruned.fit(
+        train_ds,
+        validation_data=val_ds,
+        epochs=epochs,
+        callbacks=[tfmot.sparsity.keras.UpdatePruningStep()]
+    )
+
+    return tfmot.sparsity.keras.strip_pruning(pruned)
+
+
+# ------------------------------- CLUSTERING -------------------------------
+def cluster(model, train_ds, val_ds, epochs=CLUSTER_EPOCHS):
+    """Share NUM_CLUSTERS values per kernel while keeping the pruned zeros."""
+    clustered = tfmot.clustering.keras.cluster_weights(
+        model,
+        number_of_clusters=NUM_CLUSTERS,
+        cluster_centroids_init=tfmot.clustering.keras.CentroidInitialization.KMEANS_PLUS_PLUS,
+        preserve_sparsity=True
+    )
+    clustered = _compile(clustered)
+
+    clustered.fit(train_ds, validation_data=val_ds, epochs=epochs)
+
+    return tfmot.clustering.keras.strip_clustering(clustered)
+
+
+# ------------------------------- EXPORT -------------------------------
+def export(model):
+    os.makedirs(COMPRESSED_DIR, exist_ok=True)
+
+    model.save(COMPRESSED_H5_PATH, include_optimizer=False)
+
+    # Sparse, clustered kernels are highly redundant, so they gzip well
+    with open(COMPRESSED_H5_PATH, "rb") as src, gzip.open(COMPRESSED_GZ_PATH, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.EXPERIMENTAL_SPARSITY, tf.lite.Optimize.DEFAULT]
+    with open(COMPRESSED_TFLITE_PATH, "wb") as f:
+        f.write(converter.convert())
+
+    for path in (COMPRESSED_H5_PATH, COMPRESSED_GZ_PATH, COMPRESSED_TFLITE_PATH):
+        print(f"[INFO] Saved → {path}")
+
+
+# ------------------------------- BENCHMARK -------------------------------
+def _rss_mb():
+    import psutil
+    return psutil.Process().memory_info().rss / 2**20
+
+
+def measure_artifact(path):
+    """
+    Load one artifact and time it. Meant to run in a fresh process (see
+    benchmark()) so load time and RSS are not skewed by earlier loads.
+    """
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+
+    if path.endswith(".tflite"):
+        interpreter = tf.lite.Interpreter(model_path=path, num_threads=os.cpu_count())
+        interpreter.allocate_tensors()
+        input_index = interpreter.get_input_details()[0]["index"]
+
+        def run(x):
+            interpreter.set_tensor(input_index, x)
+            interpreter.invoke()
+    else:
+        if path.endswith(".gz"):
+            with gzip.open(path, "rb") as src, open(path[:-3] + ".tmp", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            model = tf.keras.models.load_model(path[:-3] + ".tmp", compile=False)
+            os.remove(path[:-3] + ".tmp")
+        else:
+            model = tf.keras.models.load_model(path, compile=False)
+
+        def run(x):
+            model(x, training=False)
+
+    load_s = time.perf_counter() - start
+
+    sample = np.zeros((1, 224, 224, 3), dtype=np.float32)
+    run(sample)  # warm-up
+    timings = []
+    for _ in range(LATENCY_RUNS):
+        t = time.perf_counter()
+        run(sample)
+        timings.append((time.perf_counter() - t) * 1000)
+
+    return {
+        "size_mb": os.path.getsize(path) / 2**20,
+        "load_s": load_s,
+        "rss_mb": _rss_mb() - rss_before,
+        "latency_ms_p50": float(np.percentile(timings, 50)),
+        "latency_ms_p95": float(np.percentile(timings, 95)),
+    }
+
+
+def evaluate(path, val_ds):
+    model = tf.keras.models.load_model(path, compile=False)
+    _compile(model)
+    return float(model.evaluate(val_ds, verbose=0)[1])
+
+
+def evaluate_tflite(path, val_ds):
+    """Top-1 accuracy of a .tflite export with the TFLite interpreter, batch by batch."""
+    interpreter = tf.lite.Interpreter(model_path=path, num_threads=os.cpu_count())
+    interpreter.allocate_tensors()
+
+    correct = total = 0
+    for images, labels in val_ds:
+        images = images.numpy().astype(np.float32)
+        input_details = interpreter.get_input_details()[0]
+        if tuple(input_details["shape"]) != images.shape:
+            interpreter.resize_tensor_input(input_details["index"], images.shape)
+            interpreter.allocate_tensors()
+            input_details = interpreter.get_input_details()[0]
+
+        if input_details["dtype"] != np.float32:
+            # Fully integer-quantized input
+            scale, zero_point = input_details["quantization"]
+            images = np.round(images / scale + zero_point).astype(input_details["dtype"])
+
+        interpreter.set_tensor(input_details["index"], images)
+        interpreter.invoke()
+        preds = interpreter.get_tensor(interpreter.get_output_details()[0]["index"])
+
+        correct += int(np.sum(np.argmax(preds, axis=-1) == labels.numpy()))
+        total += len(images)
+
+    return correct / total
+
+
+def benchmark(val_ds):
+    report = {}
+    artifacts = [BASE_MODEL_PATH, COMPRESSED_H5_PATH, COMPRESSED_GZ_PATH, COMPRESSED_TFLITE_PATH]
+
+    for path in artifacts:
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--measure", path],
+            capture_output=True, text=True, check=True
+        )
+        report[os.path.basename(path)] = json.loads(out.stdout.strip().splitlines()[-1])
+
+    report[os.path.basename(BASE_MODEL_PATH)]["accuracy"] = evaluate(BASE_MODEL_PATH, val_ds)
+    report[os.path.basename(COMPRESSED_H5_PATH)]["accuracy"] = evaluate(COMPRESSED_H5_PATH, val_ds)
+    # The .gz holds the same weights as the compressed .h5
+    report[os.path.basename(COMPRESSED_GZ_PATH)]["accuracy"] = report[os.path.basename(COMPRESSED_H5_PATH)]["accuracy"]
+    # Quantization happens in the converter, so the .tflite has to be scored on its own
+    report[os.path.basename(COMPRESSED_TFLITE_PATH)]["accuracy"] = evaluate_tflite(COMPRESSED_TFLITE_PATH, val_ds)
+
+    with open(REPORT_PATH, "w") as f:
+        json.dump(report, f, indent=4)
+
+    print(f"\n{'artifact':<36}{'MB':>8}{'load s':>9}{'RSS MB':>9}{'p50 ms':>9}{'acc':>8}")
+    for name, r in report.items():
+        print(f"{name:<36}{r['size_mb']:>8.2f}{r['load_s']:>9.2f}{r['rss_mb']:>9.1f}{r['latency_ms_p50']:>9.2f}{r['accuracy']:>8.4f}")
+    print(f"[INFO] Saved report → {REPORT_PATH}")
+
+    return report
+
+
+# ------------------------------- PIPELINE -------------------------------
+def compress():
+    tf.keras.utils.set_random_seed(SEED)
+
+    train_ds, val_ds, _ = load_data()
+    model = tf.keras.models.load_model(BASE_MODEL_PATH, compile=False)
+
+    # Fine-tune the whole network so it can recover from the pruning
+    model.trainable = True
+
+    print("✂️  Pruning")
+    model = prune(model, train_ds, val_ds)
+
+    print("🧩 Clustering")
+    model = cluster(model, train_ds, val_ds)
+
+    export(model)
+    return benchmark(val_ds)
+
+
+# ------------------------------- MAIN -------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prune, cluster and export a compact serving model")
+    parser.add_argument("--measure", metavar="PATH", help="benchmark a single artifact and print JSON")
+    parser.add_argument("--benchmark-only", action="store_true", help="skip training, re-measure exports")
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure_artifact(args.measure)))
+    elif args.benchmark_only:
+        benchmark(load_data()[1])
+    else:
+        compress()
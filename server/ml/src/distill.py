@@ -0,0 +1,232 @@
+import tensorflow as tf
+from tensorflow.keras.layers import Dense, GlobalAveragePooling2D, Dropout, Softmax
+from tensorflow.keras.models import Model
+import numpy as np
+import os
+import json
+import time
+import argparse
+
+from train import load_data, SEED
+
+# ------------------------------- PATHS -------------------------------
+TEACHER_PATH = "../model/plant_disease_model.h5"
+STUDENT_DIR = "../model/students"
+REPORT_PATH = "../model/students/pareto_report.json"
+
+# ------------------------------- CONFIG -------------------------------
+EPOCHS = 15
+TEMPERATURE = 4.0
+ALPHA = 0.1  # weight of the hard-label loss; the rest goes to the soft targets
+LATENCY_RUNS = 50
+
+# Candidate students. Inputs stay in MobileNet's [-1, 1] range so the
+# serving preprocessing is the same as the teacher's, only the size changes.
+STUDENTS = {
+    "mobilenetv3_small_160": {"backbone": "mobilenetv3_small", "alpha": 1.0, "img_size": (160, 160)},
+    "mobilenetv3_small_224": {"backbone": "mobilenetv3_small", "alpha": 1.0, "img_size": (224, 224)},
+    "mobilenetv2_035_160": {"backbone": "mobilenetv2", "alpha": 0.35, "img_size": (160, 160)},
+}
+
+
+# ------------------------------- MODELS -------------------------------
+def build_student(name, num_classes):
+    """
+    Build a student that outputs logits. Softmax is added at export time so
+    the saved model returns probabilities like the teacher does.
+    """
+    spec = STUDENTS[name]
+    input_shape = (*spec["img_size"], 3)
+
+    if spec["backbone"] == "mobilenetv3_small":
+        base = tf.keras.applications.MobileNetV3Small(
+            input_shape=input_shape,
+            alpha=spec["alpha"],
+            include_top=False,
+            weights="imagenet",
+            include_preprocessing=False
+        )
+    else:
+        base = tf.keras.applications.MobileNetV2(
+            input_shape=input_shape,
+            alpha=spec["alpha"],
+            include_top=False,
+            weights="imagenet"
+        )
+
+    x = GlobalAveragePooling2D()(base.output)
+    x = Dropout(0.2)(x)
+    logits = Dense(num_classes)(x)
+
+    return Model(inputs=base.input, outputs=logits, name=name)
+
+
+class Distiller(tf.keras.Model):
+    """
+    Train `student` on a mix of the hard labels and the teacher's
+    temperature-softened predictions (Hinton et al., 2015).
+
+    The teacher sees the full-size batch; the student sees the same batch
+    resized to its own input size.
+    """
+
+    def __init__(self, student, teacher, temperature=TEMPERATURE, alpha=ALPHA):
+        super().__init__()
+        self.student = student
+        self.teacher = teacher
+        self.temperature = temperature
+        self.alpha = alpha
+        self.student_size = student.input_shape[1:3]
+
+        self.loss_tracker = tf.keras.metrics.Mean(name="loss")
+        self.accuracy = tf.keras.metrics.SparseCategoricalAccuracy(name="accuracy")
+
+    @property
+    def metrics(self):
+        return [self.loss_tracker, self.accuracy]
+
+    def _losses(self, images, labels, training):
+        # Teacher outputs probabilities; its log-probs are logits up to a constant
+        teacher_logits = tf.math.log(self.teacher(images, training=False) + 1e-8)
+        student_logits = self.student(tf.image.resize(images, self.student_size), training=training)
+
+        hard_loss = tf.reduce_mean(tf.keras.losses.sparse_categorical_crossentropy(
+            labels, student_logits, from_logits=True
+        ))
+        soft_loss = tf.reduce_mean(tf.keras.losses.kl_divergence(
+            tf.nn.softmax(teacher_logits / self.temperature),
+            tf.nn.softmax(student_logits / self.temperature)
+        )) * self.temperature ** 2
+
+        return self.alpha * hard_loss + (1 - self.alpha) * soft_loss, student_logits
+
+    def train_step(self, data):
+        images, labels = data
+
+        with tf.GradientTape() as tape:
+            loss, student_logits = self._losses(images, labels, training=True)
+
+        grads = tape.gradient(loss, self.student.trainable_variables)
+        self.optimizer.apply_gradients(zip(grads, self.student.trainable_variables))
+
+        self.loss_tracker.update_state(loss)
+        self.accuracy.update_state(labels, student_logits)
+        return {m.name: m.result() for m in self.metrics}
+
+    def test_step(self, data):
+        images, labels = data
+        loss, student_logits = self._losses(images, labels, training=False)
+
+        self.loss_tracker.update_state(loss)
+        self.accuracy.update_state(labels, student_logits)
+        return {m.name: m.result() for m in self.metrics}
+
+
+def export_student(student):
+    """Append softmax so the exported student is a drop-in for the teacher."""
+    probs = Softmax()(student.output)
+    return Model(inputs=student.input, outputs=probs, name=student.name)
+
+
+# ------------------------------- EVALUATION -------------------------------
+def measure(model, val_ds, path):
+    """Accuracy on val_ds, single-image CPU latency, file size and params."""
+    img_size = model.input_shape[1:3]
+
+    correct, total = 0, 0
+    for images, labels in val_ds:
+        probs = model(tf.image.resize(images, img_size), training=False)
+        correct += int(np.sum(np.argmax(probs, axis=1) == labels.numpy()))
+        total += int(labels.shape[0])
+
+    sample = tf.zeros((1, *img_size, 3))
+    model(sample, training=False)  # warm-up
+    timings = []
+    for _ in range(LATENCY_RUNS):
+        start = time.perf_counter()
+        model(sample, training=False)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "path": os.path.relpath(path, ".."),
+        "img_size": list(img_size),
+        "accuracy": correct / total,
+        "latency_ms_p50": float(np.percentile(timings, 50)),
+        "latency_ms_p95": float(np.percentile(timings, 95)),
+        "size_mb": os.path.getsize(path) / 2**20,
+        "params": int(model.count_params()),
+    }
+
+
+def mark_pareto(results):
+    """Flag candidates not beaten on accuracy, latency and size at once."""
+    for name, r in results.items():
+        r["pareto"] = not any(
+            o["accuracy"] >= r["accuracy"]
+            and o["latency_ms_p50"] <= r["latency_ms_p50"]
+            and o["size_mb"] <= r["size_mb"]
+            and (o["accuracy"], o["latency_ms_p50"], o["size_mb"])
+            != (r["accuracy"], r["latency_ms_p50"], r["size_mb"])
+            for other, o in results.items() if other != name
+        )
+    return results
+
+
+# ------------------------------- DISTILLATION -------------------------------
+def distill(names=None, epochs=EPOCHS):
+    tf.keras.utils.set_random_seed(SEED)
+    names = names or list(STUDENTS)
+
+    train_ds, val_ds, class_names = load_data()
+    teacher = tf.keras.models.load_model(TEACHER_PATH)
+    teacher.trainable = False
+
+    os.makedirs(STUDENT_DIR, exist_ok=True)
+    results = {"teacher": measure(teacher, val_ds, TEACHER_PATH)}
+
+    for name in names:
+        print(f"🎓 Distilling {name}")
+
+        student = build_student(name, len(class_names))
+        distiller = Distiller(student, teacher)
+        distiller.compile(optimizer=tf.keras.optimizers.Adam(1e-3))
+        distiller.fit(
+            train_ds,
+            validation_data=val_ds,
+            epochs=epochs,
+            callbacks=[tf.keras.callbacks.EarlyStopping(
+                monitor="val_accuracy",
+                mode="max",
+                patience=3,
+                restore_best_weights=True
+            )]
+        )
+
+        path = os.path.join(STUDENT_DIR, f"{name}.h5")
+        exported = export_student(student)
+        exported.save(path)
+        print(f"[INFO] Saved student → {path}")
+
+        results[name] = measure(exported, val_ds, path)
+
+    mark_pareto(results)
+
+    with open(REPORT_PATH, "w") as f:
+        json.dump(results, f, indent=4)
+
+    print(f"\n{'model':<24}{'acc':>8}{'p50 ms':>10}{'MB':>8}  pareto")
+    for name, r in sorted(results.items(), key=lambda kv: kv[1]["latency_ms_p50"]):
+        print(f"{name:<24}{r['accuracy']:>8.4f}{r['latency_ms_p50']:>10.2f}{r['size_mb']:>8.2f}  {'*' if r['pareto'] else ''}")
+    print(f"[INFO] Saved report → {REPORT_PATH}")
+
+    return results
+
+
+# ------------------------------- MAIN -------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distill the teacher into smaller students")
+    parser.add_argument("--students", nargs="+", choices=list(STUDENTS), help="default: all")
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    args = parser.parse_args()
+
+    distill(args.students, args.epochs)
@@ -2,28 +2,33 @@ import numpy as np
 from tensorflow.keras.models import load_model
 from PIL import Image
 from .preprocessing import preprocess_image
-import os
+from .runtime_config import load_runtime_config
 
-MODEL_PATH = os.path.abspath(os.path.join("..",'server','ml', "model", "plant_disease_model.h5"))
+# Paths and labels come from config.yaml, resolved against ml/ (not the CWD)
+RUNTIME = load_runtime_config()
+MODEL_PATH = RUNTIME.serving.path
 
-
-IMG_SIZE = (224, 224)
+IMG_SIZE = RUNTIME.serving.img_size
 
 # Load model once at startup
 model = load_model(MODEL_PATH)
+RUNTIME.check_model_outputs(model.output_shape[-1])
 
-def predict_image(image: Image.Image, class_names: list) -> dict:
+def predict_image(image: Image.Image, class_names: list = None) -> dict:
     """
     Run inference on a PIL image using the trained model.
 
     Args:
         image (PIL.Image): Input image
-        class_names (list): Mapping of indices -> class names
+        class_names (list, optional): Mapping of indices -> class names
+            (defaults to the configured classes)
 
     Returns:
         dict: { "label": str, "confidence": float }
     """
 
+    labels = RUNTIME.labels if class_names is None else class_names
+
     # Preprocess image
     img_array = preprocess_image(image, IMG_SIZE)
 
@@ -31,11 +36,11 @@ def predict_image(image: Image.Image, class_names: list) -> dict:
     img_batch = np.expand_dims(img_array, axis=0)
 
     # Predict
-    preds = model.predict(img_batch)
-    class_index = np.argmax(preds[0])
+    preds = model.predict(img_batch, verbose=0)
+    class_index = int(np.argmax(preds[0]))
     confidence = float(np.max(preds[0]))
 
     return {
-        "label": class_names[class_index],
+        "label": labels[class_index],
         "confidence": confidence
     }
@@ -1,27 +1,22 @@
 import numpy as np
-from tensorflow.keras.applications.mobilenet_v2 import preprocess_input
 from PIL import Image
 
-IMG_SIZE = (224, 224)
+from .runtime_config import load_runtime_config
+
+IMG_SIZE = load_runtime_config().serving.img_size
 
 def preprocess_image(image: Image.Image, target_size=IMG_SIZE) -> np.ndarray:
     """
     Preprocess a PIL image for MobileNetV2 inference.
 
     Steps:
-    - Resize → (224, 224)
-    - Convert to NumPy
-    - Convert to float32
-    - Apply MobileNetV2 preprocess_input (scales to [-1, 1])
+    - Convert to RGB and resize → target_size, the model's (height, width)
+    - Scale to the model's input range (preprocessing.mode in config.yaml,
+      [-1, 1] for MobileNetV2), as float32
     """
 
     # Resize
-    image = image.resize(target_size)
-
-    # Convert to numpy float32
-    img_array = np.array(image).astype("float32")
-
-    # Preprocessing for MobileNetV2
-    img_array = preprocess_input(img_array)
+    image = image.convert("RGB").resize(target_size[::-1])
 
-    return img_array
+    # Same scaling as MobileNetV2's preprocess_input, without importing TensorFlow
+    return load_runtime_config().preprocess(image)
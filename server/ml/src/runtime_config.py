@@ -0,0 +1,186 @@
+"""
+Single source of truth for serving: config.yaml plus the artifacts
+training writes (class_indices.json).
+
+`load_runtime_config()` parses everything once (it is memoized), resolves
+every path (models, calibration, model/class_indices.json) against the
+directory of the config file instead of the CWD, and validates that the
+pieces agree before anything is served. Lookup tables are NumPy
+arrays built up front, so the request path only indexes into them.
+
+This module only needs NumPy and PyYAML, so it is cheap to import from
+tools and the edge runtime as well as from the API server.
+"""
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+import numpy as np
+import json
+import os
+import yaml
+
+ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIG_PATH = os.path.join(ML_DIR, "config.yaml")
+# Relative to the config file's directory
+CLASS_INDEX_FILE = os.path.join("model", "class_indices.json")
+
+# preprocess_input modes: pixel * scale + offset
+PREPROCESSING_MODES = {
+    "mobilenet_v2": (1 / 127.5, -1.0),  # [0, 255] → [-1, 1]
+}
+
+
+@dataclass(frozen=True)
+class ModelSpec:
+    name: str
+    path: str  # absolute
+    img_size: Tuple[int, int]  # (height, width) like Keras input_shape; PIL's resize() wants it reversed
+    calibration: Optional[str] = None  # absolute, if the model has one
+
+    @property
+    def is_tflite(self):
+        return self.path.endswith(".tflite")
+
+
+@dataclass(frozen=True)
+class RuntimeConfig:
+    raw: dict
+    class_names: Tuple[str, ...]
+    labels: np.ndarray  # class index → label (object array)
+    crop_of_class: np.ndarray  # class index → crop name (object array)
+    crop_groups: Dict[str, np.ndarray]  # crop name → class indices
+    models: Dict[str, ModelSpec]
+    serving_model: str
+    preprocess_scale: float
+    preprocess_offset: float
+    warnings: Tuple[str, ...] = field(default=())
+
+    @property
+    def num_classes(self):
+        return len(self.class_names)
+
+    @property
+    def serving(self):
+        return self.models[self.serving_model]
+
+    def model(self, name):
+        if name not in self.models:
+            raise KeyError(f"Unknown model '{name}', config.yaml has: {', '.join(self.models)}")
+        return self.models[name]
+
+    def section(self, name):
+        return self.raw.get(name) or {}
+
+    def label(self, class_id):
+        return self.labels[class_id] if 0 <= class_id < len(self.labels) else "Unknown"
+
+    def crop_classes(self, crop_type):
+        """Class indices for a crop (case-insensitive), or None for an unknown/empty crop."""
+        return self.crop_groups.get(crop_type.lower()) if crop_type else None
+
+    def preprocess(self, pixels):
+        """[0, 255] pixels → model input range, as float32."""
+        return np.asarray(pixels, dtype=np.float32) * np.float32(self.preprocess_scale) + np.float32(self.preprocess_offset)
+
+    def check_model_outputs(self, num_outputs, name=None):
+        if num_outputs != self.num_classes:
+            raise ValueError(
+                f"Model '{name or self.serving_model}' has {num_outputs} outputs "
+                f"but {self.num_classes} classes are configured"
+            )
+
+
+def crop_name(class_name):
+    """Crop a PlantVillage class belongs to: the folder-name prefix ("Tomato__Target_Spot" → "tomato")."""
+    return class_name.split("_", 1)[0].lower()
+
+
+def _load_class_names(config, base_dir):
+    """class_indices.json (what the model was trained with), checked against config.yaml."""
+    configured = list(config.get("class_names") or [])
+    warnings = []
+    class_index_path = os.path.join(base_dir, CLASS_INDEX_FILE)
+
+    if os.path.exists(class_index_path):
+        with open(class_index_path, "r") as f:
+            mapping = json.load(f)
+        indices = sorted(int(k) for k in mapping)
+        if indices != list(range(len(indices))):
+            raise ValueError(f"{class_index_path} must map 0..N-1, got {indices}")
+        class_names = [mapping[str(i)] for i in indices]
+
+        if configured and configured != class_names:
+            mismatched = [
+                f"{i}: config.yaml={c!r} class_indices.json={t!r}"
+                for i, (c, t) in enumerate(zip(configured, class_names)) if c != t
+            ]
+            if len(configured) != len(class_names):
+                mismatched.append(f"config.yaml has {len(configured)} classes, class_indices.json {len(class_names)}")
+            raise ValueError("class_names in config.yaml disagree with class_indices.json:\n  " + "\n  ".join(mismatched))
+
+    elif configured:
+        class_names = configured
+        warnings.append(f"{class_index_path} not found, using class_names from config.yaml")
+    else:
+        raise ValueError("No class names: train the model or list class_names in config.yaml")
+
+    return tuple(class_names), warnings
+
+
+def _load_models(config, base_dir):
+    models, warnings = {}, []
+    for name, entry in (config.get("models") or {}).items():
+        img_size = tuple(int(v) for v in entry.get("img_size", (224, 224)))
+        if len(img_size) != 2 or min(img_size) <= 0:
+            raise ValueError(f"models.{name}.img_size must be [height, width], got {entry.get('img_size')}")
+
+        spec = ModelSpec(
+            name=name,
+            path=os.path.join(base_dir, entry["path"]),
+            img_size=img_size,
+            calibration=os.path.join(base_dir, entry["calibration"]) if entry.get("calibration") else None,
+        )
+        if not os.path.exists(spec.path):
+            warnings.append(f"models.{name}: {spec.path} does not exist yet")
+        models[name] = spec
+
+    if not models and config.get("model_path"):
+        # Older configs only had a single model_path
+        models["default"] = ModelSpec("default", os.path.join(base_dir, config["model_path"]), (224, 224))
+    return models, warnings
+
+
+@lru_cache(maxsize=None)
+def load_runtime_config(config_path=CONFIG_PATH):
+    with open(config_path, "r") as f:
+        config = yaml.safe_load(f) or {}
+
+    base_dir = os.path.dirname(os.path.abspath(config_path))
+    class_names, warnings = _load_class_names(config, base_dir)
+    models, model_warnings = _load_models(config, base_dir)
+    warnings += model_warnings
+
+    serving_model = os.environ.get("SERVING_MODEL", (config.get("serving") or {}).get("model", "teacher"))
+    if serving_model not in models:
+        raise ValueError(f"serving.model '{serving_model}' is not listed under models in {config_path}")
+
+    crop_of_class = np.array([crop_name(c) for c in class_names], dtype=object)
+    crop_groups = {crop: np.flatnonzero(crop_of_class == crop) for crop in dict.fromkeys(crop_of_class)}
+
+    mode = (config.get("preprocessing") or {}).get("mode", "mobilenet_v2")
+    if mode not in PREPROCESSING_MODES:
+        raise ValueError(f"preprocessing.mode must be one of {sorted(PREPROCESSING_MODES)}, got '{mode}'")
+    scale, offset = PREPROCESSING_MODES[mode]
+
+    return RuntimeConfig(
+        raw=config,
+        class_names=class_names,
+        labels=np.array(class_names, dtype=object),
+        crop_of_class=crop_of_class,
+        crop_groups=crop_groups,
+        models=models,
+        serving_model=serving_model,
+        preprocess_scale=scale,
+        preprocess_offset=offset,
+        warnings=tuple(warnings),
+    )
@@ -1,10 +1,19 @@
 import tensorflow as tf
+import numpy as np
 from tensorflow.keras.applications.mobilenet_v2 import preprocess_input
 from tensorflow.keras.layers import Dense, GlobalAveragePooling2D, Dropout
 from tensorflow.keras.models import Model
 from tensorflow.keras.preprocessing import image_dataset_from_directory
 import os
+import sys
 import json
+import socket
+import signal
+import argparse
+import subprocess
+
+from audit_dataset import load_manifest, manifest_split
+from calibration import CALIBRATION_PATH, Calibration
 
 # ------------------------------- PATHS -------------------------------
 DATA_DIR = "../data/PlantVillage"
@@ -12,11 +21,20 @@ DATA_DIR = "../data/PlantVillage"
 MODEL_SAVE_PATH_H5 = "../model/plant_disease_model.h5"
 MODEL_SAVE_PATH_KERAS = "../model/plant_disease_model.keras"
 CLASS_INDEX_PATH = "../model/class_indices.json"
+CHECKPOINT_DIR = "../model/checkpoints"
 
 # ------------------------------- CONFIG -------------------------------
 IMG_SIZE = (224, 224)
 BATCH_SIZE = 32
 EPOCHS = 20
+SEED = 123
+
+# Full-state checkpoint interval (in training batches) and retention
+CHECKPOINT_EVERY_STEPS = 200
+CHECKPOINTS_TO_KEEP = 3
+
+# Exit code after a SIGTERM-triggered checkpoint, so schedulers can requeue
+PREEMPTED_EXIT_CODE = 143
 
 
 # Enable GPU memory growth (optional)
@@ -31,16 +49,309 @@ def enable_gpu_memory_growth():
             print(e)
 
 
+# ------------------------------- DISTRIBUTION -------------------------------
+def get_strategy(mode="default"):
+    """
+    Pick the tf.distribute strategy for this process.
+
+    "multi_worker" reads the cluster layout from TF_CONFIG and uses ring
+    all-reduce, which is the collective implementation that works on CPU hosts.
+    """
+    if mode == "multi_worker":
+        communication = tf.distribute.experimental.CommunicationOptions(
+            implementation=tf.distribute.experimental.CommunicationImplementation.RING
+        )
+        return tf.distribute.MultiWorkerMirroredStrategy(communication_options=communication)
+
+    return tf.distribute.get_strategy()
+
+
+def get_task():
+    """Return (task_type, task_id) from TF_CONFIG, or (None, 0) on a single host."""
+    tf_config = json.loads(os.environ.get("TF_CONFIG", "{}"))
+    task = tf_config.get("task", {})
+    return task.get("type"), int(task.get("index", 0))
+
+
+def is_chief():
+    tf_config = json.loads(os.environ.get("TF_CONFIG", "{}"))
+    task_type, task_id = get_task()
+
+    if task_type is None:
+        return True
+    if "chief" in tf_config.get("cluster", {}):
+        return task_type == "chief"
+    return task_type == "worker" and task_id == 0
+
+
+def worker_path(path):
+    """
+    Every worker has to take part in saving, but only the chief should write
+    to the real location. Other workers write to a private scratch directory.
+    """
+    if is_chief():
+        return path
+
+    _, task_id = get_task()
+    dirname, basename = os.path.split(path)
+    scratch_dir = os.path.join(dirname, f"workertemp_{task_id}")
+    os.makedirs(scratch_dir, exist_ok=True)
+    return os.path.join(scratch_dir, basename)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+def launch_local_cluster(num_workers, manifest=None):
+    """
+    Run a multi-worker job on this machine for testing: one process per
+    worker, each with its own TF_CONFIG and no GPU.
+    """
+    workers = [f"localhost:{_free_port()}" for _ in range(num_workers)]
+
+    processes = []
+    for index in range(num_workers):
+        env = dict(os.environ)
+        env["CUDA_VISIBLE_DEVICES"] = "-1"
+        env["TF_CONFIG"] = json.dumps({
+            "cluster": {"worker": workers},
+            "task": {"type": "worker", "index": index},
+        })
+        command = [sys.executable, os.path.abspath(__file__), "--strategy", "multi_worker"]
+        if manifest:
+            command += ["--manifest", manifest]
+        processes.append(subprocess.Popen(command, env=env))
+
+    print(f"[INFO] Started {num_workers} local workers: {workers}")
+
+    exit_codes = [p.wait() for p in processes]
+    return max(exit_codes)
+
+
+# ------------------------------- CHECKPOINTING -------------------------------
+class Preempted(Exception):
+    """
+    Raised by TrainingState once the SIGTERM checkpoint is written, so fit()
+    stops right there: no validation pass over the partial epoch and no
+    on_epoch_end for EarlyStopping or ModelCheckpoint.
+    """
+
+
+class TrainingState(tf.keras.callbacks.Callback):
+    """
+    Full-state checkpointing for model.fit().
+
+    Each checkpoint holds the model weights, the optimizer slots, the epoch,
+    the number of batches already consumed in that epoch and the global RNG.
+    A checkpoint is written every `save_every` batches, at the end of every
+    epoch, and when the process receives SIGTERM, after which Preempted is
+    raised out of fit().
+
+    The progress of EarlyStopping (wait, best, best weights) and of the
+    best-model ModelCheckpoint (best) is saved too and handed back to those
+    callbacks at the start of every fit(), so a resumed run neither restarts
+    its patience nor overwrites the best .h5 with a worse epoch. The state
+    callback must come after them in the callbacks list.
+
+    All workers save (required under MultiWorkerMirroredStrategy), but every
+    worker restores from the chief's directory so they resume in lockstep.
+    A SIGTERM usually reaches a single worker, so the stop flag is summed
+    across workers after every batch and all of them stop on the same step.
+    """
+
+    def __init__(self, directory=CHECKPOINT_DIR, save_every=CHECKPOINT_EVERY_STEPS,
+                 max_to_keep=CHECKPOINTS_TO_KEEP):
+        super().__init__()
+        self.directory = directory
+        self.save_every = save_every
+        self.max_to_keep = max_to_keep
+
+        self._stop_requested = False
+        self._step_offset = 0
+
+    def attach(self, model, early_stopping=None, best_checkpoint=None):
+        """
+        Create the checkpoint for `model`, including the progress of the
+        given EarlyStopping and ModelCheckpoint callbacks. Call inside the
+        strategy scope.
+        """
+        # Optimizer slots are created lazily; build them now so a restore
+        # has somewhere to land
+        model.optimizer.build(model.trainable_variables)
+
+        self.strategy = tf.distribute.get_strategy()
+        self.early_stopping = early_stopping
+        self.best_checkpoint = best_checkpoint
+
+        self.epoch = tf.Variable(0, dtype=tf.int64, trainable=False)
+        self.step = tf.Variable(0, dtype=tf.int64, trainable=False)
+
+        # NaN means "nothing recorded yet": leave the callback's own default
+        self.es_wait = tf.Variable(0, dtype=tf.int64, trainable=False)
+        self.es_best = tf.Variable(np.nan, dtype=tf.float64, trainable=False)
+        self.es_best_epoch = tf.Variable(0, dtype=tf.int64, trainable=False)
+        self.es_has_best_weights = tf.Variable(False, trainable=False)
+        self.es_best_weights = [tf.Variable(w, trainable=False) for w in model.get_weights()]
+        self.checkpoint_best = tf.Variable(np.nan, dtype=tf.float64, trainable=False)
+
+        self.checkpoint = tf.train.Checkpoint(
+            model=model,
+            optimizer=model.optimizer,
+            epoch=self.epoch,
+            step=self.step,
+            rng=tf.random.get_global_generator(),
+            es_wait=self.es_wait,
+            es_best=self.es_best,
+            es_best_epoch=self.es_best_epoch,
+            es_has_best_weights=self.es_has_best_weights,
+            es_best_weights=self.es_best_weights,
+            checkpoint_best=self.checkpoint_best,
+        )
+        self.manager = tf.train.CheckpointManager(
+            self.checkpoint,
+            worker_path(self.directory),
+            max_to_keep=self.max_to_keep,
+        )
+
+    def restore(self):
+        """
+        Restore the latest chief checkpoint, if any.
+
+        Returns (epoch, step): the epoch to resume and how many of its
+        batches were already trained on.
+        """
+        latest = tf.train.latest_checkpoint(self.directory)
+        if latest is None:
+            return 0, 0
+
+        self.checkpoint.restore(latest).expect_partial()
+        epoch, step = int(self.epoch.numpy()), int(self.step.numpy())
+        print(f"[INFO] Resumed from {latest} (epoch {epoch}, step {step})")
+        return epoch, step
+
+    def _store_callback_state(self):
+        es = self.early_stopping
+        if es is not None and es.best is not None:
+            self.es_wait.assign(es.wait)
+            self.es_best.assign(float(es.best))
+            self.es_best_epoch.assign(es.best_epoch)
+            if es.best_weights is not None:
+                for variable, value in zip(self.es_best_weights, es.best_weights):
+                    variable.assign(value)
+                self.es_has_best_weights.assign(True)
+
+        mc = self.best_checkpoint
+        if mc is not None and mc.best is not None and np.isfinite(mc.best):
+            self.checkpoint_best.assign(float(mc.best))
+
+    def _load_callback_state(self):
+        es = self.early_stopping
+        if es is not None and not np.isnan(self.es_best.numpy()):
+            es.wait = int(self.es_wait.numpy())
+            es.best = float(self.es_best.numpy())
+            es.best_epoch = int(self.es_best_epoch.numpy())
+            if bool(self.es_has_best_weights.numpy()):
+                es.best_weights = [v.numpy() for v in self.es_best_weights]
+
+        mc = self.best_checkpoint
+        if mc is not None and not np.isnan(self.checkpoint_best.numpy()):
+            mc.best = float(self.checkpoint_best.numpy())
+
+    def save(self):
+        self._store_callback_state()
+        path = self.manager.save()
+        if is_chief():
+            print(f"[INFO] Checkpoint → {path}")
+
+    def install_signal_handler(self):
+        def on_sigterm(signum, frame):
+            print("[WARN] SIGTERM received, checkpointing after the current batch")
+            self._stop_requested = True
+
+        signal.signal(signal.SIGTERM, on_sigterm)
+
+    def skip(self, steps):
+        """Batch indices of the next fit() start `steps` into the epoch."""
+        self._step_offset = steps
+
+    def _stop_everywhere(self):
+        """True if any worker has been asked to stop. Every worker must call this on the same step."""
+        if not isinstance(self.strategy, tf.distribute.MultiWorkerMirroredStrategy):
+            return self._stop_requested
+
+        flag = tf.constant(int(self._stop_requested))
+        votes = self.strategy.run(lambda: tf.identity(flag))
+        return int(self.strategy.reduce(tf.distribute.ReduceOp.SUM, votes, axis=None)) > 0
+
+    def on_train_begin(self, logs=None):
+        # Runs after EarlyStopping.on_train_begin has reset its counters
+        self._load_callback_state()
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.epoch.assign(epoch)
+
+    def on_train_batch_end(self, batch, logs=None):
+        self.step.assign(self._step_offset + batch + 1)
+
+        if self._stop_everywhere():
+            self.save()
+            raise Preempted()
+        elif int(self.step.numpy()) % self.save_every == 0:
+            self.save()
+
+    def on_epoch_end(self, epoch, logs=None):
+        self._step_offset = 0
+        self.epoch.assign(epoch + 1)
+        self.step.assign(0)
+        self.save()
+
+
 # ------------------------------- DATA LOADING -------------------------------
-def load_data():
+def manifest_dataset(manifest, split, batch_size, shuffle):
+    """
+    Same element format as image_dataset_from_directory (float32 images in
+    [0, 255], int labels), built from the audited file list in the manifest.
+    """
+    paths, labels = manifest_split(manifest, split)
+    ds = tf.data.Dataset.from_tensor_slices((paths, labels))
+    if shuffle:
+        ds = ds.shuffle(len(paths), seed=SEED, reshuffle_each_iteration=True)
+
+    def read(path, label):
+        image = tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False)
+        image = tf.image.resize(image, IMG_SIZE)
+        image.set_shape((*IMG_SIZE, 3))
+        return image, label
+
+    return ds.map(read, num_parallel_calls=tf.data.AUTOTUNE).batch(batch_size)
+
+
+def load_data(batch_size=BATCH_SIZE, manifest=None):
+    """
+    Train/val datasets and class names. With `manifest` (a path written by
+    audit_dataset.py) the split comes from the manifest: corrupt files and
+    exact copies are left out, and near-duplicates never straddle the split.
+    Without it, the directory is listed and split 80/20 as before.
+    """
+    if manifest is not None:
+        manifest = load_manifest(manifest)
+        raw_train_ds = manifest_dataset(manifest, "train", batch_size, shuffle=True)
+        raw_val_ds = manifest_dataset(manifest, "val", batch_size, shuffle=False)
+        class_names = manifest["class_names"]
+        print(f"📋 Using manifest split: {manifest['summary']['train']} train / {manifest['summary']['val']} val")
+        return _finish_datasets(raw_train_ds, raw_val_ds, class_names)
+
     # Load raw datasets first (without mapping)
     raw_train_ds = tf.keras.preprocessing.image_dataset_from_directory(
         DATA_DIR,
         validation_split=0.2,
         subset="training",
-        seed=123,
+        seed=SEED,
         image_size=IMG_SIZE,
-        batch_size=BATCH_SIZE,
+        batch_size=batch_size,
         label_mode="int"
     )
 
@@ -48,22 +359,30 @@ def load_data():
         DATA_DIR,
         validation_split=0.2,
         subset="validation",
-        seed=123,
+        seed=SEED,
         image_size=IMG_SIZE,
-        batch_size=BATCH_SIZE,
+        batch_size=batch_size,
         label_mode="int"
     )
 
     # Extract class names BEFORE mapping
     class_names = raw_train_ds.class_names
 
+    return _finish_datasets(raw_train_ds, raw_val_ds, class_names)
+
+
+def _finish_datasets(raw_train_ds, raw_val_ds, class_names):
     # Preprocessing func
     def preprocess(image, label):
         return preprocess_input(image), label
 
+    # Shard by element so each worker reads its own slice of the batches
+    options = tf.data.Options()
+    options.experimental_distribute.auto_shard_policy = tf.data.experimental.AutoShardPolicy.DATA
+
     AUTOTUNE = tf.data.AUTOTUNE
-    train_ds = raw_train_ds.map(preprocess).cache().prefetch(AUTOTUNE)
-    val_ds = raw_val_ds.map(preprocess).cache().prefetch(AUTOTUNE)
+    train_ds = raw_train_ds.map(preprocess).cache().prefetch(AUTOTUNE).with_options(options)
+    val_ds = raw_val_ds.map(preprocess).cache().prefetch(AUTOTUNE).with_options(options)
 
     return train_ds, val_ds, class_names
 
@@ -97,12 +416,57 @@ def build_model(num_classes):
     return model
 
 
+# ------------------------------- CALIBRATION -------------------------------
+def calibrate(model, val_ds, path=CALIBRATION_PATH):
+    """
+    Fit temperature scaling and the OOD energy threshold on validation
+    logits, and save them next to class_indices.json. The logits are
+    rebuilt from the pooled features and the softmax Dense layer, the same
+    way the API server does at inference time.
+    """
+    pooling = [l for l in model.layers if isinstance(l, GlobalAveragePooling2D)][-1]
+    head = [l for l in model.layers if isinstance(l, Dense)][-1]
+    kernel, bias = head.get_weights()
+    features = Model(inputs=model.input, outputs=pooling.output)
+
+    logits, labels = [], []
+    for images, batch_labels in val_ds:
+        logits.append(features.predict_on_batch(images) @ kernel + bias)
+        labels.append(batch_labels.numpy())
+
+    calibration = Calibration.fit(np.concatenate(logits), np.concatenate(labels))
+    calibration.save(path)
+
+    report = calibration.report
+    print(f"🌡 Temperature {calibration.temperature:.3f}: "
+          f"NLL {report['nll_before']:.4f} → {report['nll_after']:.4f}, "
+          f"ECE {report['ece_before']:.4f} → {report['ece_after']:.4f}")
+    print(f"📁 Saved calibration → {path} (energy threshold {calibration.energy_threshold:.3f})")
+    return calibration
+
+
 # ------------------------------- TRAINING LOOP -------------------------------
-def train():
+def train(strategy="default", manifest=None):
+    """
+    Train (or resume training of) the classifier. `manifest` is an optional
+    audit_dataset.py manifest to take the file list and split from.
+
+    Returns the Keras History. If the run is stopped by SIGTERM, exits with
+    PREEMPTED_EXIT_CODE once the checkpoint is flushed.
+    """
     enable_gpu_memory_growth()
 
+    # Seeds Python, NumPy and TF so the batch order is the same after a
+    # restart, which is what makes the saved step a valid iterator position
+    tf.keras.utils.set_random_seed(SEED)
+
+    strategy = get_strategy(strategy)
+    global_batch_size = BATCH_SIZE * strategy.num_replicas_in_sync
+
+    print(f"[INFO] Replicas in sync: {strategy.num_replicas_in_sync}")
+
     # Load data (NOW returns 3 values)
-    train_ds, val_ds, class_names = load_data()
+    train_ds, val_ds, class_names = load_data(global_batch_size, manifest)
 
     # Detect number of classes
     num_classes = len(class_names)
@@ -113,46 +477,112 @@ def train():
     class_indices = {i: label for i, label in enumerate(class_names)}
     os.makedirs("model", exist_ok=True)
 
-    with open(CLASS_INDEX_PATH, "w") as f:
-        json.dump(class_indices, f, indent=4)
-
-    print("📁 Saved class_indices.json")
+    if is_chief():
+        with open(CLASS_INDEX_PATH, "w") as f:
+            json.dump(class_indices, f, indent=4)
 
-    # Build model
-    model = build_model(num_classes)
+        print("📁 Saved class_indices.json")
 
     # Callbacks
-    callbacks = [
-        tf.keras.callbacks.EarlyStopping(
-            monitor="val_loss",
-            patience=4,
-            restore_best_weights=True
-        ),
-        tf.keras.callbacks.ModelCheckpoint(
-            MODEL_SAVE_PATH_H5,
-            monitor="val_accuracy",
-            save_best_only=True
-        )
-    ]
-
-    # Train
-    history = model.fit(
-        train_ds,
-        validation_data=val_ds,
-        epochs=EPOCHS,
-        callbacks=callbacks
+    early_stopping = tf.keras.callbacks.EarlyStopping(
+        monitor="val_loss",
+        patience=4,
+        restore_best_weights=True
+    )
+    best_checkpoint = tf.keras.callbacks.ModelCheckpoint(
+        worker_path(MODEL_SAVE_PATH_H5),
+        monitor="val_accuracy",
+        save_best_only=True
     )
+    state = TrainingState()
+    callbacks = [early_stopping, best_checkpoint, state]
+
+    # Build model (variables must be created inside the strategy scope)
+    with strategy.scope():
+        model = build_model(num_classes)
+        state.attach(model, early_stopping, best_checkpoint)
+
+    initial_epoch, skip_steps = state.restore()
+    state.install_signal_handler()
+
+    try:
+        # Finish an interrupted epoch first, skipping the batches it already saw
+        history = None
+        if skip_steps and initial_epoch < EPOCHS:
+            state.skip(skip_steps)
+            history = model.fit(
+                train_ds.skip(skip_steps),
+                validation_data=val_ds,
+                initial_epoch=initial_epoch,
+                epochs=initial_epoch + 1,
+                callbacks=callbacks
+            )
+            initial_epoch += 1
+
+        # Train (fit() resets stop_training, so an early stop on the resumed
+        # epoch has to be checked here)
+        if early_stopping.stopped_epoch:
+            print(f"[INFO] Early stopping at epoch {early_stopping.stopped_epoch + 1}")
+        else:
+            history = model.fit(
+                train_ds,
+                validation_data=val_ds,
+                initial_epoch=initial_epoch,
+                epochs=EPOCHS,
+                callbacks=callbacks
+            )
+    except Preempted:
+        print("[INFO] Stopped on SIGTERM; rerun to resume from the last checkpoint.")
+        sys.exit(PREEMPTED_EXIT_CODE)
 
     # Save Keras model format
-    model.save(MODEL_SAVE_PATH_KERAS)
+    model.save(worker_path(MODEL_SAVE_PATH_KERAS))
+
+    if not is_chief():
+        return history
 
     print(f"[INFO] Saved H5 model → {MODEL_SAVE_PATH_H5}")
     print(f"[INFO] Saved Keras model → {MODEL_SAVE_PATH_KERAS}")
 
+    # Calibrate the weights that get served: ModelCheckpoint's best epoch by
+    # val_accuracy, not the val_loss epoch EarlyStopping left in `model`
+    calibrate(tf.keras.models.load_model(MODEL_SAVE_PATH_H5), val_ds)
+
     return history
 
 
 
 # ------------------------------- MAIN -------------------------------
 if __name__ == "__main__":
-    train()
+    parser = argparse.ArgumentParser(description="Train the plant disease classifier")
+    parser.add_argument(
+        "--strategy",
+        choices=["default", "multi_worker"],
+        default="default",
+        help="multi_worker expects TF_CONFIG to describe the cluster",
+    )
+    parser.add_argument(
+        "--local-workers",
+        type=int,
+        default=0,
+        help="spawn N multi-worker processes on this machine (testing)",
+    )
+    parser.add_argument(
+        "--calibrate-only",
+        action="store_true",
+        help="refit calibration.json for the saved model without training",
+    )
+    parser.add_argument(
+        "--manifest",
+        help="train on the split in this audit_dataset.py manifest (e.g. ../data/manifest.json)",
+    )
+    args = parser.parse_args()
+
+    if args.calibrate_only:
+        calibrate(tf.keras.models.load_model(MODEL_SAVE_PATH_H5), load_data(manifest=args.manifest)[1])
+        sys.exit(0)
+
+    if args.local_workers:
+        sys.exit(launch_local_cluster(args.local_workers, args.manifest))
+
+    train(strategy=args.strategy, manifest=args.manifest)
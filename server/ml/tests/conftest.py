@@ -0,0 +1,8 @@
+import os
+import sys
+
+ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The API server and the src scripts import their sibling modules by plain name;
+# the edge runtime is a package under ml/
+sys.path[:0] = [os.path.join(ML_DIR, "api"), os.path.join(ML_DIR, "src"), ML_DIR]
@@ -0,0 +1,116 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from admission import BULK, INTERACTIVE, PREDICT, AdmissionQueue, RateLimiter, Rejected
+
+
+# ------------------------------- RATE LIMIT -------------------------------
+def test_rate_limit_rejects_after_burst_with_retry_after():
+    limiter = RateLimiter(per_minute=60, burst=2)
+    limiter.check("a")
+    limiter.check("a")
+    with pytest.raises(Rejected) as e:
+        limiter.check("a")
+    assert e.value.status_code == 429
+    assert e.value.retry_after == 1
+
+    # Other clients have their own bucket
+    limiter.check("b")
+
+
+def test_bucket_refills_over_time():
+    limiter = RateLimiter(per_minute=60, burst=1)
+    limiter.check("a")
+    limiter.buckets["a"].updated -= 1.0  # one second later
+    limiter.check("a")
+
+
+def test_only_recent_clients_are_kept():
+    limiter = RateLimiter(per_minute=60, burst=5, max_clients=2)
+    for client in ("a", "b", "a", "c"):
+        limiter.check(client)
+    assert list(limiter.buckets) == ["a", "c"]
+
+
+# ------------------------------- ADMISSION -------------------------------
+def test_full_queue_is_rejected():
+    queue = AdmissionQueue(max_size=4, bulk_max_size=2)
+    queue.depth = [4, 0]
+    with pytest.raises(Rejected) as e:
+        queue.admit(INTERACTIVE)
+    assert e.value.status_code == 503
+
+
+def test_bulk_lane_is_capped_but_interactive_still_admitted():
+    queue = AdmissionQueue(max_size=4, bulk_max_size=2)
+    queue.depth = [0, 2]
+    queue.queued[BULK, PREDICT] = 2
+    with pytest.raises(Rejected):
+        queue.admit(BULK)
+    queue.admit(INTERACTIVE)
+
+
+def test_request_past_the_deadline_is_rejected():
+    queue = AdmissionQueue(max_size=32, max_wait=1.0)
+    queue.service_time[PREDICT] = 0.2
+    queue.queued[INTERACTIVE, PREDICT] = 4
+    queue.admit(INTERACTIVE)  # 4 ahead + itself = 1.0 s
+
+    queue.queued[INTERACTIVE, PREDICT] = 5
+    with pytest.raises(Rejected) as e:
+        queue.admit(INTERACTIVE)
+    assert (e.value.status_code, e.value.retry_after) == (503, 2)
+
+
+def test_interactive_jobs_are_served_before_bulk():
+    async def scenario():
+        queue = AdmissionQueue(max_size=10, bulk_max_size=5)
+        queue.start()
+        gate = threading.Event()
+        order = []
+
+        # Keep the inference thread busy until everything below is queued
+        first = asyncio.create_task(queue.submit(BULK, gate.wait))
+        await asyncio.sleep(0.05)
+        jobs = [
+            asyncio.create_task(queue.submit(lane, order.append, name))
+            for lane, name in ((BULK, "bulk1"), (INTERACTIVE, "scan1"), (BULK, "bulk2"), (INTERACTIVE, "scan2"))
+        ]
+        await asyncio.sleep(0.05)
+        assert queue.depth == [2, 2]
+
+        gate.set()
+        await asyncio.gather(first, *jobs)
+        await queue.stop()
+        return order
+
+    assert asyncio.run(scenario()) == ["scan1", "scan2", "bulk1", "bulk2"]
+
+
+# ------------------------------- JOB KINDS -------------------------------
+def test_wait_estimate_uses_each_kinds_service_time():
+    queue = AdmissionQueue()
+    queue.service_time = {PREDICT: 0.1, "explain": 1.0}
+    queue.queued[INTERACTIVE, "explain"] = 2
+    queue.queued[BULK, PREDICT] = 3
+
+    assert queue.estimated_wait(INTERACTIVE, PREDICT) == pytest.approx(2.1)
+    assert queue.estimated_wait(BULK, "explain") == pytest.approx(2.0 + 0.3 + 1.0)
+    # Kinds that haven't run yet are estimated like a prediction
+    assert queue.job_time("record") == 0.1
+
+
+def test_service_time_is_smoothed_per_kind():
+    async def scenario():
+        queue = AdmissionQueue()
+        queue.start()
+        await queue.submit(INTERACTIVE, time.sleep, 0.1, kind="explain")
+        await queue.stop()
+        return queue.service_time
+
+    service_time = asyncio.run(scenario())
+    assert service_time[PREDICT] == 0.2
+    assert service_time["explain"] == pytest.approx(0.1, abs=0.05)
@@ -0,0 +1,123 @@
+import os
+
+import numpy as np
+import pytest
+from PIL import Image, ImageEnhance
+
+from audit_dataset import (
+    NEAR_DUPLICATE_BITS, UnionFind, audit, dhash, group_split, manifest_split, near_duplicate_pairs,
+)
+
+
+def leaf(seed, size=128):
+    """A random smooth image: blurred noise, so dHash has real structure to pick up."""
+    noise = np.random.default_rng(seed).integers(0, 256, size=(16, 16, 3), dtype=np.uint8)
+    return Image.fromarray(noise).resize((size, size), Image.BICUBIC)
+
+
+def bits_apart(a, b):
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+# ------------------------------- DHASH -------------------------------
+def test_dhash_is_stable_under_resizing_and_brightness():
+    image = leaf(0)
+    h = dhash(image)
+    assert len(h) == 64  # 16x16 bits
+
+    assert bits_apart(h, dhash(image.resize((300, 300)))) <= NEAR_DUPLICATE_BITS
+    assert bits_apart(h, dhash(ImageEnhance.Brightness(image).enhance(1.2))) <= NEAR_DUPLICATE_BITS
+    assert bits_apart(h, dhash(leaf(1))) > NEAR_DUPLICATE_BITS
+
+
+# ------------------------------- NEAR DUPLICATES -------------------------------
+def test_near_duplicate_pairs_matches_brute_force():
+    rng = np.random.default_rng(0)
+    hashes = rng.integers(0, 256, size=(200, 32), dtype=np.uint8)
+    # Copies with up to max_bits (and one with max_bits + 1) flipped bits
+    for i, flips in enumerate((0, 1, 10, NEAR_DUPLICATE_BITS, NEAR_DUPLICATE_BITS + 1)):
+        bits = np.unpackbits(hashes[i])
+        bits[rng.choice(bits.size, flips, replace=False)] ^= 1
+        hashes[100 + i] = np.packbits(bits)
+
+    distance = np.unpackbits(hashes[:, None] ^ hashes[None, :], axis=-1).sum(axis=-1)
+    expected = {(i, j) for i, j in zip(*np.nonzero(np.triu(distance <= NEAR_DUPLICATE_BITS, k=1)))}
+
+    pairs = near_duplicate_pairs(hashes)
+    assert pairs == expected
+    assert {(0, 100), (1, 101), (2, 102), (3, 103)} <= pairs
+    assert (4, 104) not in pairs
+
+
+def test_union_find_joins_chains():
+    uf = UnionFind(6)
+    uf.union(4, 2)
+    uf.union(2, 5)
+    uf.union(0, 1)
+    assert [uf.find(i) for i in range(6)] == [0, 0, 2, 3, 2, 2]
+
+
+# ------------------------------- SPLITS -------------------------------
+def test_group_split_is_deterministic_and_close_to_the_fraction():
+    keys = [f"group-{i}" for i in range(5000)]
+    splits = [group_split(k, 0.2) for k in keys]
+    assert splits == [group_split(k, 0.2) for k in keys]
+    assert splits.count("val") / len(keys) == pytest.approx(0.2, abs=0.02)
+
+
+# ------------------------------- AUDIT -------------------------------
+@pytest.fixture
+def dataset(tmp_path):
+    data_dir = tmp_path / "PlantVillage"
+    for label, seeds in (("Potato___healthy", range(0, 12)), ("Tomato_healthy", range(12, 24))):
+        (data_dir / label).mkdir(parents=True)
+        for seed in seeds:
+            leaf(seed).save(data_dir / label / f"{seed}.png")
+
+    # An exact copy, a re-shot (brighter, resized) of leaf 3 filed under the other class, a broken file
+    (data_dir / "Potato___healthy" / "5_copy.png").write_bytes((data_dir / "Potato___healthy" / "5.png").read_bytes())
+    ImageEnhance.Brightness(leaf(3, size=160)).enhance(1.1).save(data_dir / "Tomato_healthy" / "3_reshot.png")
+    (data_dir / "Tomato_healthy" / "broken.jpg").write_bytes(b"\xff\xd8\xff not really a jpeg")
+    return str(data_dir), str(tmp_path / "manifest.json")
+
+
+def test_audit_keeps_duplicates_in_one_split(dataset):
+    data_dir, manifest_path = dataset
+    manifest = audit(data_dir, manifest_path, workers=1)
+    files = manifest["files"]
+
+    assert manifest["corrupt"] == ["Tomato_healthy/broken.jpg"]
+    assert files["Tomato_healthy/broken.jpg"]["split"] is None
+
+    assert files["Potato___healthy/5_copy.png"]["duplicate_of"] == "Potato___healthy/5.png"
+    assert files["Potato___healthy/5_copy.png"]["split"] is None
+
+    original, reshot = files["Potato___healthy/3.png"], files["Tomato_healthy/3_reshot.png"]
+    assert original["group"] is not None and original["group"] == reshot["group"]
+    assert original["split"] == reshot["split"]
+    assert original["label_conflict"] and reshot["label_conflict"]
+    assert manifest["summary"]["leaking_groups_manifest_split"] == 0
+
+    paths, labels = manifest_split(manifest, "train")
+    assert len(paths) == manifest["summary"]["train"]
+    assert set(labels) <= {0, 1}
+    assert all(os.path.isabs(p) for p in paths)
+
+
+def test_rerun_only_decodes_new_or_changed_files(dataset, capsys):
+    data_dir, manifest_path = dataset
+    audit(data_dir, manifest_path, workers=1)
+    capsys.readouterr()
+
+    audit(data_dir, manifest_path, workers=1)
+    assert "27 cached, 0 to decode" in capsys.readouterr().out
+
+    changed = os.path.join(data_dir, "Tomato_healthy", "12.png")
+    leaf(99).save(changed)
+    os.utime(changed, ns=(0, 10**18))
+    manifest = audit(data_dir, manifest_path, workers=1)
+    assert "26 cached, 1 to decode" in capsys.readouterr().out
+    assert manifest["files"]["Tomato_healthy/12.png"]["dhash"] == dhash(leaf(99))
+
+    audit(data_dir, manifest_path, workers=1, rescan=True)
+    assert "0 cached, 27 to decode" in capsys.readouterr().out
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from calibration import Calibration, energy, fit_temperature, softmax
+
+
+def overconfident(temperature=3.0, n=20000, classes=5, seed=0):
+    """Logits `temperature` times sharper than the distribution the labels were drawn from."""
+    rng = np.random.default_rng(seed)
+    true_logits = rng.normal(scale=2.0, size=(n, classes))
+    probs = softmax(true_logits)
+    labels = (rng.random((n, 1)) > probs.cumsum(axis=-1)).sum(axis=-1)
+    return true_logits * temperature, labels
+
+
+def test_fit_recovers_the_temperature():
+    logits, labels = overconfident(3.0)
+    assert fit_temperature(logits, labels) == pytest.approx(3.0, rel=0.1)
+
+
+def test_calibration_improves_nll_and_ece():
+    logits, labels = overconfident(3.0)
+    report = Calibration.fit(logits, labels).report
+    assert report["nll_after"] < report["nll_before"]
+    assert report["ece_after"] < report["ece_before"]
+    assert report["val_samples"] == len(labels)
+
+
+def test_ood_threshold_accepts_validation_quantile():
+    logits, labels = overconfident(3.0)
+    calibration = Calibration.fit(logits, labels, accept_quantile=0.95)
+    _, scores, unknown = calibration.apply(logits)
+    assert unknown.mean() == pytest.approx(0.05, abs=0.005)
+    np.testing.assert_allclose(scores, energy(logits))
+
+    # Uniformly low logits: no class responds, unlike anything in validation
+    _, _, unknown = calibration.apply(np.full((1, 5), -5.0))
+    assert unknown.all()
+
+
+def test_apply_without_threshold_never_rejects():
+    probs, _, unknown = Calibration(temperature=2.0).apply(np.array([[0.0, 0.0, 100.0]]))
+    assert not unknown.any()
+    np.testing.assert_allclose(probs.sum(axis=-1), 1.0)
+
+
+def test_save_and_load_round_trip(tmp_path):
+    logits, labels = overconfident(2.0, n=2000)
+    calibration = Calibration.fit(logits, labels)
+    path = str(tmp_path / "model" / "calibration.json")
+    calibration.save(path)
+
+    loaded = Calibration.load(path)
+    assert loaded.temperature == calibration.temperature
+    assert loaded.energy_threshold == calibration.energy_threshold
+    assert loaded.report == calibration.report
@@ -0,0 +1,190 @@
+import json
+import sqlite3
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from edge.__main__ import main
+from edge.outbox import MAX_ATTEMPTS, Outbox
+from edge.sync import SUBMIT_PATH, sync
+
+
+class StubServer:
+    """/api/submit_batch/ stand-in: stores uids like the Django view, rejecting diseases in `invalid`."""
+
+    def __init__(self):
+        self.stored = set()
+        self.invalid = set()
+        self.drop = set()  # uids left out without a reason
+        self.status = 201
+        self.requests = []
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                stub.requests.append((self.path, body))
+                status, reply = stub.respond(body)
+                data = json.dumps(reply).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def respond(self, body):
+        if self.status != 201:
+            return self.status, {"message": "Account does not exist"}
+
+        records = body["records"]
+        rejected = {r["uid"]: "disease: too long" for r in records if r["disease"] in self.invalid}
+        existing = {r["uid"] for r in records} & self.stored
+        new = {r["uid"] for r in records} - existing - set(rejected) - self.drop
+        self.stored |= new
+        return 201, {
+            "inserted": len(new),
+            "duplicates": len(existing),
+            "rejected": rejected,
+            "synced_uids": [r["uid"] for r in records if r["uid"] in self.stored],
+        }
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def server():
+    stub = StubServer()
+    yield stub
+    stub.close()
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    box = Outbox(str(tmp_path / "outbox.sqlite3"))
+    yield box
+    box.close()
+
+
+def queue(outbox, *diseases, start=0):
+    outbox.add_many([
+        {"path": f"/photos/{i}.jpg", "size": 100, "mtime_ns": i, "crop_type": "tomato", "class_id": 1,
+         "disease": disease, "confidence": 0.9, "captured_at": "2026-01-02T03:04:05+00:00",
+         "lat": None, "lon": None, "model": "teacher"}
+        for i, disease in enumerate(diseases, start)
+    ])
+
+
+# ------------------------------- OUTBOX -------------------------------
+def test_rescanned_files_are_known(outbox):
+    queue(outbox, "Blight", "Healthy")
+    assert outbox.known_files() == {("/photos/0.jpg", 100, 0), ("/photos/1.jpg", 100, 1)}
+    assert outbox.counts() == {"total": 2, "pending": 2, "failing": 0, "rejected": 0}
+
+
+def test_failed_scans_stay_queued_until_max_attempts(outbox):
+    queue(outbox, "Blight")
+    uid = outbox.pending(10)[0]["uid"]
+    outbox.mark_failed([uid], "offline")
+    assert outbox.counts()["failing"] == 1
+
+    for _ in range(MAX_ATTEMPTS - 1):
+        assert outbox.pending(10)
+        outbox.mark_failed([uid], "Not stored by the server", max_attempts=MAX_ATTEMPTS)
+    assert outbox.pending(10) == []
+    assert outbox.counts()["rejected"] == 1
+
+
+def test_old_outbox_gains_rejected_at(tmp_path):
+    path = str(tmp_path / "old.sqlite3")
+    db = sqlite3.connect(path)
+    db.executescript("""
+        CREATE TABLE scans (uid TEXT PRIMARY KEY, path TEXT NOT NULL, size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL, crop_type TEXT, class_id INTEGER NOT NULL, disease TEXT NOT NULL,
+            confidence REAL NOT NULL, captured_at TEXT NOT NULL, lat REAL, lon REAL, model TEXT NOT NULL,
+            created_at TEXT NOT NULL, synced_at TEXT, attempts INTEGER NOT NULL DEFAULT 0, last_error TEXT);
+        INSERT INTO scans VALUES ('u1', '/a.jpg', 1, 1, NULL, 0, 'Blight', 0.5, 'x', NULL, NULL, 'm', 'x', NULL, 0, NULL);
+    """)
+    db.close()
+
+    box = Outbox(path)
+    assert [r["uid"] for r in box.pending(10)] == ["u1"]
+    box.mark_rejected(["u1"], "bad")
+    assert box.counts()["rejected"] == 1
+    box.close()
+
+
+# ------------------------------- SYNC -------------------------------
+def test_sync_sends_everything_in_batches(outbox, server):
+    queue(outbox, *["Blight"] * 5)
+    assert sync(outbox, server.url, 7, batch_size=2) == (5, True)
+    assert [len(body["records"]) for _, body in server.requests] == [2, 2, 1]
+    assert {path for path, _ in server.requests} == {SUBMIT_PATH}
+    assert server.requests[0][1]["account_acno"] == 7
+    assert outbox.counts()["pending"] == 0
+
+    # Nothing left to send
+    assert sync(outbox, server.url, 7) == (0, True)
+    assert len(server.requests) == 3
+
+
+def test_resend_after_a_lost_response_is_a_no_op(outbox, server):
+    queue(outbox, "Blight", "Healthy")
+    # The server stored the batch, but the device never saw the reply
+    server.stored |= {r["uid"] for r in outbox.pending(10)}
+
+    assert sync(outbox, server.url, 7) == (2, True)
+    assert len(server.stored) == 2
+
+
+def test_rejected_scans_leave_the_queue(outbox, server, capsys):
+    server.invalid = {"x" * 60}
+    queue(outbox, "x" * 60, *["Blight"] * 4)
+
+    synced, complete = sync(outbox, server.url, 7, batch_size=2)
+    assert (synced, complete) == (4, False)
+    assert outbox.counts() == {"total": 5, "pending": 0, "failing": 0, "rejected": 1}
+    assert outbox.rejected()[0]["last_error"] == "disease: too long"
+
+    # The next run isn't held back by the rejected scan
+    queue(outbox, "Healthy", start=5)
+    assert sync(outbox, server.url, 7) == (1, True)
+
+    capsys.readouterr()
+    main(["status", "--outbox", outbox.db.execute("PRAGMA database_list").fetchone()["file"]])
+    out = capsys.readouterr().out
+    assert "1 rejected" in out
+    assert "/photos/0.jpg: disease: too long" in out
+
+
+def test_scans_left_out_without_a_reason_are_retried(outbox, server):
+    queue(outbox, "Blight", "Healthy")
+    server.drop = {outbox.pending(10)[0]["uid"]}
+
+    assert sync(outbox, server.url, 7) == (1, False)
+    assert outbox.counts() == {"total": 2, "pending": 1, "failing": 1, "rejected": 0}
+
+    server.drop = set()
+    assert sync(outbox, server.url, 7) == (1, True)
+
+
+def test_refused_batch_and_unreachable_server_keep_scans_queued(outbox, server):
+    queue(outbox, "Blight")
+    server.status = 400
+    assert sync(outbox, server.url, 7) == (0, False)
+    assert "HTTP 400" in outbox.pending(10)[0]["last_error"]
+
+    url = server.url
+    server.close()
+    assert sync(outbox, url, 7, timeout=2) == (0, False)
+    assert outbox.counts() == {"total": 1, "pending": 1, "failing": 1, "rejected": 0}
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+import embedding_store
+from embedding_store import ID_BLOCK, EmbeddingStore, scan_id_base
+
+DIM = 16
+
+
+def vectors(n, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, DIM)).astype(np.float32)
+
+
+@pytest.fixture(params=["hnsw", "brute_force"])
+def backend(request, monkeypatch):
+    if request.param == "hnsw":
+        pytest.importorskip("hnswlib")
+    else:
+        monkeypatch.setattr(embedding_store, "hnswlib", None)
+    return request.param
+
+
+def test_add_and_query(tmp_path, backend):
+    store = EmbeddingStore(str(tmp_path), DIM)
+    data = vectors(50)
+    ids = [store.add(v, label=i % 3) for i, v in enumerate(data)]
+    assert ids == list(range(50))
+    assert (store.index is None) == (backend == "brute_force")
+
+    # Scaling doesn't matter: vectors are normalised
+    nearest = store.query(data[7] * 10, k=3)
+    assert nearest[0][0] == 7
+    assert nearest[0][1] == pytest.approx(1.0, abs=1e-5)
+    assert nearest[0][2] == 7 % 3
+    assert [s for _, s, _ in nearest] == sorted((s for _, s, _ in nearest), reverse=True)
+
+
+def test_query_empty_store_and_small_k(tmp_path, backend):
+    store = EmbeddingStore(str(tmp_path), DIM)
+    assert store.query(vectors(1)[0]) == []
+    store.add(vectors(1)[0], label=1)
+    assert len(store.query(vectors(1, seed=1)[0], k=5)) == 1
+
+
+def test_grows_past_capacity(tmp_path, backend):
+    store = EmbeddingStore(str(tmp_path), DIM, initial_capacity=8)
+    data = vectors(30)
+    for v in data:
+        store.add(v, label=0)
+    assert (len(store), store.capacity) == (30, 32)
+    assert store.query(data[29], k=1)[0][0] == 29
+
+    store.save()
+    reopened = EmbeddingStore(str(tmp_path), DIM)
+    assert (len(reopened), reopened.capacity) == (30, 32)
+
+
+def test_reopen_after_crash_catches_up_from_meta(tmp_path, backend):
+    data = vectors(40)
+    store = EmbeddingStore(str(tmp_path), DIM, save_every=10)
+    for v in data[:25]:
+        store.add(v, label=0)
+    # Crash: rows 20..24 were never followed by a save(), only flushed by the OS
+    store.vectors.flush()
+    store.meta.flush()
+    del store
+
+    reopened = EmbeddingStore(str(tmp_path), DIM)
+    assert len(reopened) == 25
+    if reopened.index is not None:
+        assert reopened.index.get_current_count() == 25
+    assert reopened.query(data[23], k=1)[0][0] == 23
+    assert reopened.add(data[25], label=0) == 25
+
+
+def test_dim_mismatch_is_refused(tmp_path):
+    EmbeddingStore(str(tmp_path), DIM).save()
+    with pytest.raises(ValueError, match="dim"):
+        EmbeddingStore(str(tmp_path), DIM * 2)
+
+
+def test_each_model_has_its_own_scan_ids(tmp_path, backend):
+    root = str(tmp_path)
+    assert scan_id_base(root, "teacher") == 0
+    assert scan_id_base(root, "student") == ID_BLOCK
+    assert scan_id_base(root, "teacher") == 0
+
+    base = scan_id_base(root, "student")
+    store = EmbeddingStore(str(tmp_path / "student"), DIM, id_base=base)
+    data = vectors(3)
+    assert [store.add(v, label=0) for v in data] == [base, base + 1, base + 2]
+    assert store.query(data[1], k=1)[0][0] == base + 1
+
+    store.save()
+    with pytest.raises(ValueError, match="id base"):
+        EmbeddingStore(str(tmp_path / "student"), DIM, id_base=0)
@@ -0,0 +1,72 @@
+import time
+
+from router import FALLBACK, FULL, LoadRouter
+
+
+class FakeQueue:
+    size = 0
+
+
+def make_router(**kwargs):
+    return LoadRouter(FakeQueue(), max_depth=4, latency_slo=0.5, **kwargs)
+
+
+def test_full_tier_when_idle():
+    router = make_router()
+    assert router.choose() == FULL
+    assert router.metrics()["degraded"] == {}
+
+
+def test_deep_queue_switches_to_fallback():
+    router = make_router()
+    router.queue.size = 4
+    assert router.choose() == FALLBACK
+    assert router.degraded["queue_depth"] == 1
+
+
+def test_slow_p95_switches_to_fallback_and_back():
+    router = make_router()
+    for _ in range(20):
+        router.record(FULL, 0.1)
+    router.record(FULL, 2.0)
+    assert router.choose() == FULL  # one slow request is below the p95
+
+    for _ in range(5):
+        router.record(FULL, 2.0)
+    assert router.choose() == FALLBACK
+    assert router.degraded["latency"] == 1
+
+    # Fallback requests don't add full-tier samples, so the p95 only recovers by expiring
+    router.record(FALLBACK, 0.05)
+    assert router.choose() == FALLBACK
+
+
+def test_stale_latency_samples_expire():
+    router = make_router(window_seconds=0.05)
+    for _ in range(5):
+        router.record(FULL, 2.0)
+    assert router.choose() == FALLBACK
+
+    time.sleep(0.06)
+    assert router.p95() is None
+    assert router.choose() == FULL
+
+
+def test_no_fallback_model_always_serves_full():
+    router = make_router(fallback_available=False)
+    router.queue.size = 100
+    router.record(FULL, 5.0)
+    assert router.choose() == FULL
+
+
+def test_metrics():
+    router = make_router()
+    router.record(FULL, 0.2)
+    router.record(FALLBACK, 0.1)
+    router.reject(503)
+
+    metrics = router.metrics()
+    assert metrics["served"] == {FULL: 1, FALLBACK: 1}
+    assert metrics["degraded_ratio"] == 0.5
+    assert metrics["rejected"] == {"503": 1}
+    assert metrics["full_p95_ms"] == 200.0
@@ -0,0 +1,107 @@
+import json
+
+import numpy as np
+import pytest
+import yaml
+from PIL import Image
+
+from runtime_config import load_runtime_config
+from src.preprocessing import preprocess_image
+
+CLASSES = ["Potato___Early_blight", "Potato___healthy", "Tomato_Late_blight"]
+
+
+@pytest.fixture
+def write_config(tmp_path, monkeypatch):
+    """Writes config.yaml (and class_indices.json, unless None) and returns the config path."""
+    monkeypatch.delenv("SERVING_MODEL", raising=False)
+    load_runtime_config.cache_clear()
+
+    def write(config=None, class_indices=CLASSES, **overrides):
+        config = config or {
+            "serving": {"model": "teacher"},
+            "models": {"teacher": {"path": "model/teacher.h5", "img_size": [224, 224]}},
+            "class_names": list(CLASSES),
+        }
+        config.update(overrides)
+
+        index_path = tmp_path / "model" / "class_indices.json"
+        if class_indices is not None:
+            index_path.parent.mkdir(exist_ok=True)
+            mapping = class_indices if isinstance(class_indices, dict) else dict(enumerate(class_indices))
+            index_path.write_text(json.dumps({str(k): v for k, v in mapping.items()}))
+
+        path = tmp_path / "config.yaml"
+        path.write_text(yaml.safe_dump(config))
+        return str(path)
+
+    yield write
+    load_runtime_config.cache_clear()
+
+
+def test_valid_config(write_config, tmp_path):
+    config = load_runtime_config(write_config())
+    assert config.class_names == tuple(CLASSES)
+    assert config.serving.img_size == (224, 224)
+    # Paths are relative to the config file, wherever it is
+    assert config.serving.path == str(tmp_path / "model" / "teacher.h5")
+    assert list(config.crop_classes("POTATO")) == [0, 1]
+    assert config.crop_classes("") is None
+    assert (config.label(2), config.label(3)) == ("Tomato_Late_blight", "Unknown")
+    assert config.preprocess([0, 255]).tolist() == [-1.0, 1.0]
+    # The model file doesn't exist yet: a warning, not an error
+    assert any("does not exist yet" in w for w in config.warnings)
+
+    with pytest.raises(ValueError, match="3 classes"):
+        config.check_model_outputs(4)
+
+
+def test_config_class_names_must_match_training(write_config):
+    path = write_config(class_names=["Potato___Early_blight", "Tomato_Late_blight", "Potato___healthy"])
+    with pytest.raises(ValueError, match="disagree") as e:
+        load_runtime_config(path)
+    assert "1: config.yaml='Tomato_Late_blight'" in str(e.value)
+
+
+def test_class_indices_must_be_contiguous(write_config):
+    with pytest.raises(ValueError, match="0..N-1"):
+        load_runtime_config(write_config(class_indices={0: "a", 2: "b"}))
+
+
+def test_config_class_names_used_before_training(write_config):
+    config = load_runtime_config(write_config(class_indices=None))
+    assert config.class_names == tuple(CLASSES)
+    assert any("not found" in w for w in config.warnings)
+
+
+def test_no_class_names_at_all(write_config):
+    with pytest.raises(ValueError, match="No class names"):
+        load_runtime_config(write_config(class_indices=None, class_names=[]))
+
+
+def test_serving_model_must_be_listed(write_config, monkeypatch):
+    path = write_config()
+    monkeypatch.setenv("SERVING_MODEL", "student")
+    with pytest.raises(ValueError, match="serving.model 'student'"):
+        load_runtime_config(path)
+
+
+def test_bad_img_size(write_config):
+    path = write_config(models={"teacher": {"path": "model/teacher.h5", "img_size": [224]}})
+    with pytest.raises(ValueError, match="img_size"):
+        load_runtime_config(path)
+
+
+def test_bad_preprocessing_mode(write_config):
+    with pytest.raises(ValueError, match="preprocessing.mode"):
+        load_runtime_config(write_config(preprocessing={"mode": "caffe"}))
+
+
+def test_unknown_model_lookup(write_config):
+    with pytest.raises(KeyError, match="teacher"):
+        load_runtime_config(write_config()).model("student")
+
+
+def test_img_size_is_height_width():
+    image = Image.fromarray(np.zeros((50, 80, 3), dtype=np.uint8))
+    assert preprocess_image(image, (160, 224)).shape == (160, 224, 3)
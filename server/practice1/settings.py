@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -133,6 +134,65 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Response cache for read-heavy endpoints (api/http_cache.py).
+# Job workers (`manage.py run_workers`) invalidate entries too, so the
+# cache has to be shared between processes: file by default, redis when
+# the web and worker processes run on different hosts. locmem is per
+# process and only suitable when nothing else writes (e.g. tests).
+API_CACHE_BACKEND = os.environ.get('API_CACHE_BACKEND', 'file')
+API_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'api-responses',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache' / 'api',
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('API_CACHE_REDIS_URL', 'redis://127.0.0.1:6379/1'),
+    },
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'api': API_CACHE_BACKENDS[API_CACHE_BACKEND],
+}
+
+# Per-endpoint TTLs in seconds; writes invalidate entries before they expire
+API_CACHE_TTL = {
+    'history_list': 30,
+    'me': 30,
+    'regional_alerts': 300,
+}
+
+# Bodies at least this big are stored pre-compressed (gzip, and brotli if installed)
+API_CACHE_COMPRESS_MIN_BYTES = 1024
+
+# Hot/cold History storage (api/archive.py, `manage.py archive_history`):
+# rows older than HISTORY_HOT_DAYS move to Parquet files under HISTORY_ARCHIVE_DIR
+HISTORY_HOT_DAYS = 180
+HISTORY_ARCHIVE_DIR = BASE_DIR / 'archive' / 'history'
+# Only archive rows the analytics export has already written
+HISTORY_ARCHIVE_REQUIRES_EXPORT = True
+
+# Incremental Parquet export for analytics (api/analytics.py, `manage.py export_history`)
+ANALYTICS_EXPORT_DIR = BASE_DIR / 'exports' / 'history'
+ANALYTICS_EXPORT_LAG_MINUTES = 15
+
+# Largest batch accepted from an edge device by /api/submit_batch/
+EDGE_SYNC_MAX_RECORDS = 500
+
+# Background jobs (api/jobs.py, run with `manage.py run_workers`)
+OUTBREAK_WINDOW_DAYS = 7
+OUTBREAK_THRESHOLD = 5
+
+# Outbreak alerts are printed to the console until SMTP is configured
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",
     "http://127.0.0.1:5173",